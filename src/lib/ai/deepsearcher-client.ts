@@ -26,14 +26,23 @@ const HEALTH_TIMEOUT_MS  =  3_000;
 
 // ── Request / Response types (mirroring server.py Pydantic models) ────────────
 
-export interface DSSearchRequest {
+export interface DSSearchFilters {
+  source_filters?: string[];
+  categories?:     string[];
+  subcategories?:  string[];
+  year_from?:      number;
+  year_to?:        number;
+}
+
+export interface DSSearchRequest extends DSSearchFilters {
   query:          string;
   top_k?:         number;
   score_threshold?: number;
   category_filter?: string;
+  passage_chars?:  number;   // passage length around the match (0 = whole chunk)
 }
 
-export interface DSQueryRequest {
+export interface DSQueryRequest extends DSSearchFilters {
   query:         string;
   max_iterations?: number;
   top_k?:        number;
@@ -60,6 +69,7 @@ export interface DSChunk {
   filepath:   string;
   title:      string;
   date?:      string;
+  highlights?: [number, number][];   // query-term spans within the text
 }
 
 export interface DSSearchResponse {
@@ -79,6 +89,7 @@ export interface DSKAGResponse {
   found:    boolean;
   results:  DSChunk[];
   identifier: string;
+  cited_by?: { relativePath: string; title: string }[];   // documents citing the identifier
 }
 
 export interface DSHealthResponse {
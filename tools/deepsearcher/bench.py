@@ -0,0 +1,745 @@
+"""
+Offline benchmarks for the DeepSearcher sidecar.
+
+  python bench.py embed [--texts N] [--words W] [--batch B]
+      Fallback hashing embedder: original per-text loop vs the batched NumPy
+      version in server.py. Checks the default output matches the 256-dim
+      collection vectors, then reports texts/sec and speed-up.
+
+  python bench.py extract [--mb M] [--html PATH]
+      HTML extraction + chunking of one large synthetic (or given) decision:
+      BeautifulSoup + chunk_text vs the streaming extractor. Checks the chunks
+      are identical, then reports MB/s and peak traced memory.
+
+  python bench.py recall [--n N] [--dim D] [--queries Q] [--rerank R]
+      Compact vector store (int8 scan + fp16 re-score) vs a ChromaDB HNSW
+      collection on clustered synthetic vectors: recall@10 of each against
+      exact search, their top-10 overlap, query latency, and resident memory
+      of a fresh process that opens each index and answers the queries.
+
+  python bench.py pool [--workers 0,1,2,4] [--texts N] [--concurrency C]
+      Embedding worker pool (embed_pool.py) at each worker count, 0 being
+      the in-process embedder: bulk texts/s for indexing-sized batches, and
+      single-query requests/s from C concurrent callers with the average
+      micro-batch size they were packed into. Uses whatever model server.py
+      loads (the hashing fallback without pymilvus); scaling is bounded by
+      the cores available, which the report includes.
+
+  python bench.py retrieval [--docs N] [--concurrency C] [--out FILE]
+      End-to-end run against a real sidecar process: builds a synthetic
+      corpus in the data/legal-database layout, indexes it through
+      /index/batch with the fallback embedder, then replays generated query
+      sets against /search (each mode), /query (backed by a stub LLM server)
+      and /kag/lookup. Reports p50/p95/p99 latency, throughput under
+      concurrency, indexing docs/s, the server's peak RSS and recall@k.
+
+  python bench.py compare BASELINE.json CANDIDATE.json [--tolerance T]
+      Diff two retrieval runs; exits 1 if latency, throughput, memory or
+      relevance regressed beyond the tolerance.
+
+Results are printed as JSON.
+"""
+
+import os, re, sys, json, math, time, random, hashlib, argparse, tempfile, threading, subprocess, tracemalloc
+from typing import Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+_VOCAB = (
+    "court petitioner respondent decision resolution appeal certiorari republic act section article "
+    "employer employee dismissal illegal just cause authorized backwages reinstatement separation pay "
+    "protection order violence women children psychological abuse custody support marriage nullity "
+    "property contract obligation damages moral exemplary nominal estafa theft robbery homicide murder "
+    "rape qualified aggravating mitigating circumstance evidence testimony witness prosecution accused "
+    "constitution due process equal protection search seizure warrant jurisdiction venue prescription "
+    "tax assessment refund customs tariff land registration title torrens ejectment possession lease"
+).split()
+
+def _legacy_hash_embed(texts: List[str]) -> List[List[float]]:
+    """The original pure-Python fallback from embed_texts, kept as the baseline."""
+    results = []
+    for text in texts:
+        words = re.findall(r'\w+', text.lower())
+        freq: Dict[str, int] = {}
+        for w in words:
+            freq[w] = freq.get(w, 0) + 1
+        vec = [0.0] * 256
+        for w, cnt in freq.items():
+            h = int(hashlib.md5(w.encode()).hexdigest(), 16) % 256
+            vec[h] += cnt * math.log(1 + len(words))
+        norm = math.sqrt(sum(v*v for v in vec)) or 1.0
+        results.append([v/norm for v in vec])
+    return results
+
+def synthetic_texts(n: int, words: int, seed: int = 7) -> List[str]:
+    rng = random.Random(seed)
+    # Mix common legal vocabulary with a long tail of rarer tokens (names, numbers)
+    tail = [f"{w}{i}" for i, w in enumerate(rng.choices(_VOCAB, k=20000))]
+    return [" ".join(rng.choice(_VOCAB) if rng.random() < 0.8 else rng.choice(tail) for _ in range(words))
+            for _ in range(n)]
+
+def bench_embed(args) -> Dict:
+    import server
+    texts = synthetic_texts(args.texts, args.words)
+    batches = [texts[i:i+args.batch] for i in range(0, len(texts), args.batch)]
+
+    t0 = time.perf_counter()
+    legacy = [v for b in batches for v in _legacy_hash_embed(b)]
+    t_legacy = time.perf_counter() - t0
+
+    server._hash_memo.clear()
+    t0 = time.perf_counter()
+    cold = [v for b in batches for v in server._hash_embed(b)]
+    t_cold = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for b in batches:
+        server._hash_embed(b)
+    t_warm = time.perf_counter() - t0
+
+    max_diff = max(abs(a - b) for u, v in zip(legacy, cold) for a, b in zip(u, v))
+    return {
+        "benchmark":        "hash_embed",
+        "texts":            args.texts,
+        "words_per_text":   args.words,
+        "batch":            args.batch,
+        "bigrams":          server.HASH_EMBED_BIGRAMS,
+        "sublinear_tf":     server.HASH_EMBED_SUBLINEAR,
+        "max_abs_diff_vs_legacy": max_diff,
+        "legacy_texts_per_s":     round(args.texts / t_legacy, 1),
+        "numpy_cold_texts_per_s": round(args.texts / t_cold, 1),
+        "numpy_warm_texts_per_s": round(args.texts / t_warm, 1),
+        "speedup_cold":     round(t_legacy / t_cold, 2),
+        "speedup_warm":     round(t_legacy / t_warm, 2),
+    }
+
+def synthetic_decision(mb: float, seed: int = 11) -> str:
+    """A decision-shaped HTML page of roughly `mb` megabytes."""
+    rng = random.Random(seed)
+    paras, size = [], 0
+    while size < mb * 1_000_000:
+        words = synthetic_texts(1, rng.randint(40, 400), seed=rng.random())[0].split()
+        for _ in range(3):
+            i = rng.randrange(len(words))
+            words[i] = rng.choice(("<i>%s</i>", "<b>%s</b>", "Se&ntilde;or %s", "%s&nbsp;&amp;", "<br />%s")) % words[i]
+        p = "<p>" + " ".join(words) + "</p>\n"
+        paras.append(p)
+        size += len(p)
+    return ("<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"UTF-8\" />\n<title>G.R. No. 1</title>\n"
+            "<style>body { margin: 5px; }</style>\n</head>\n<body>\n<center><h2>EN BANC</h2></center>\n"
+            + "".join(paras) + "<script>var x = '<p>';</script>\n</body>\n</html>\n")
+
+def _measure(fn):
+    """(result, seconds, peak traced bytes); timed without tracing, which skews allocation-heavy code."""
+    t0 = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def bench_extract(args) -> Dict:
+    import server
+    from html_stream import extract_chunks
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.html or os.path.join(tmp, "decision.html")
+        if not args.html:
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(synthetic_decision(args.mb))
+        mb = os.path.getsize(path) / 1e6
+
+        def legacy():
+            with open(path, "r", encoding="utf-8") as f:
+                return server.chunk_text(server.html_to_text(f.read()))
+        ref, t_legacy, m_legacy = _measure(legacy)
+        got, t_stream, m_stream = _measure(lambda: extract_chunks(path))
+    return {
+        "benchmark":        "html_extract",
+        "file_mb":          round(mb, 2),
+        "chunks":           len(got),
+        "identical_chunks": ref == got,
+        "legacy_mb_per_s":  round(mb / t_legacy, 2),
+        "stream_mb_per_s":  round(mb / t_stream, 2),
+        "speedup":          round(t_legacy / t_stream, 2),
+        "legacy_peak_mb":   round(m_legacy / 1e6, 1),
+        "stream_peak_mb":   round(m_stream / 1e6, 1),
+    }
+
+def clustered_vectors(n: int, dim: int, clusters: int, seed: int = 3):
+    """Unit vectors drawn around random centres, a rough stand-in for embedding geometry."""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vecs = centres[rng.integers(0, clusters, n)] + 0.9 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+def _rss_mb() -> Dict[str, float]:
+    """Resident memory split into private (anonymous) and file-backed, reclaimable page-cache pages."""
+    out = {"total": 0.0, "anon": 0.0, "file": 0.0}
+    names = {"VmRSS:": "total", "RssAnon:": "anon", "RssFile:": "file"}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key = names.get(line.split(":")[0] + ":")
+            if key:
+                out[key] = int(line.split()[1]) / 1024
+    return out
+
+def _open_and_search(backend: str, path: str, dim: int, queries: np.ndarray, top_k: int, rerank: int):
+    """Open a persisted index and answer the queries; (ids per query, seconds, open index)."""
+    if backend == "compact":
+        from compact_store import CompactVectorStore
+        store = CompactVectorStore(path, dim, rerank=rerank)
+        t0 = time.perf_counter()
+        ids = [[cid for cid, _ in hits] for hits in store.search(queries, top_k)]
+        return ids, time.perf_counter() - t0, store
+    import chromadb
+    col = chromadb.PersistentClient(path=path).get_collection("bench")
+    t0 = time.perf_counter()
+    ids = col.query(query_embeddings=queries, n_results=top_k, include=[])["ids"]
+    return ids, time.perf_counter() - t0, col
+
+def bench_rss_child(args) -> Dict:
+    queries = np.load(args.query_file)
+    if args.backend == "chroma":
+        import chromadb     # count the index, not the library
+    base = _rss_mb()
+    # Measured while the index is still open, so its mappings still count
+    _, _, index = _open_and_search(args.backend, args.path, queries.shape[1], queries, args.top_k, args.rerank)
+    rss = {k: round(v - base[k], 1) for k, v in _rss_mb().items()}
+    del index
+    return {"rss_mb": rss}
+
+def _child_rss(backend: str, path: str, query_file: str, top_k: int, rerank: int) -> Dict[str, float]:
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "rss-child", "--backend", backend,
+                          "--path", path, "--query-file", query_file, "--top-k", str(top_k), "--rerank", str(rerank)],
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out[out.index("{"):])["rss_mb"]
+
+def _recall(got: List[List[str]], truth: List[List[str]]) -> float:
+    return round(sum(len(set(g) & set(t)) for g, t in zip(got, truth)) / sum(len(t) for t in truth), 4)
+
+def bench_recall(args) -> Dict:
+    import chromadb
+    from compact_store import CompactVectorStore
+    k = 10
+    vecs = clustered_vectors(args.n + args.queries, args.dim, args.clusters)
+    vecs, queries = vecs[:args.n], vecs[args.n:]
+    ids = [f"c{i}" for i in range(args.n)]
+    exact = np.argsort(-(queries @ vecs.T), axis=1)[:, :k]
+    truth = [[ids[i] for i in row] for row in exact]
+    with tempfile.TemporaryDirectory() as tmp:
+        query_file = os.path.join(tmp, "queries.npy")
+        np.save(query_file, queries)
+
+        t0 = time.perf_counter()
+        store = CompactVectorStore(os.path.join(tmp, "compact"), args.dim, rerank=args.rerank)
+        for i in range(0, args.n, 10000):
+            store.upsert(ids[i:i+10000], vecs[i:i+10000], ["supreme_court"] * len(ids[i:i+10000]),
+                         ["2000"] * len(ids[i:i+10000]))
+        t_compact_build = time.perf_counter() - t0
+        compact_stats = store.stats()
+        del store
+
+        t0 = time.perf_counter()
+        client = chromadb.PersistentClient(path=os.path.join(tmp, "chroma"))
+        col = client.get_or_create_collection("bench", metadata={"hnsw:space": "cosine"})
+        step = min(5000, client.get_max_batch_size())
+        for i in range(0, args.n, step):
+            col.add(ids=ids[i:i+step], embeddings=vecs[i:i+step])
+        t_chroma_build = time.perf_counter() - t0
+        del col, client
+
+        compact_ids, t_compact, _ = _open_and_search("compact", os.path.join(tmp, "compact"), args.dim,
+                                                  queries, k, args.rerank)
+        chroma_ids, t_chroma, _ = _open_and_search("chroma", os.path.join(tmp, "chroma"), args.dim, queries, k, args.rerank)
+        rss_compact = _child_rss("compact", os.path.join(tmp, "compact"), query_file, k, args.rerank)
+        rss_chroma = _child_rss("chroma", os.path.join(tmp, "chroma"), query_file, k, args.rerank)
+    return {
+        "benchmark":          "vector_store_recall",
+        "vectors":            args.n,
+        "dim":                args.dim,
+        "queries":            args.queries,
+        "rerank":             args.rerank,
+        "recall_at_10":       {"compact": _recall(compact_ids, truth), "chroma_hnsw": _recall(chroma_ids, truth)},
+        "compact_vs_chroma_top10_overlap": _recall(compact_ids, chroma_ids),
+        "build_s":            {"compact": round(t_compact_build, 2), "chroma_hnsw": round(t_chroma_build, 2)},
+        "ms_per_query":       {"compact": round(t_compact / args.queries * 1000, 2),
+                               "chroma_hnsw": round(t_chroma / args.queries * 1000, 2)},
+        "search_rss_mb":      {"compact": rss_compact, "chroma_hnsw": rss_chroma,
+                               "anon_reduction": round(rss_chroma["anon"] / max(rss_compact["anon"], 0.1), 2),
+                               "total_reduction": round(rss_chroma["total"] / max(rss_compact["total"], 0.1), 2)},
+        "compact_files_mb":   {"scan": round(compact_stats["scan_bytes"] / 1e6, 1),
+                               "rescore": round(compact_stats["rescore_bytes"] / 1e6, 1)},
+    }
+
+def _pool_round(embed, bulk: List[str], batch: int, queries: List[str], concurrency: int) -> Dict[str, float]:
+    from concurrent.futures import ThreadPoolExecutor
+    embed(bulk[:batch])                                 # first call pays any lazy setup
+    t0 = time.perf_counter()
+    for i in range(0, len(bulk), batch):
+        embed(bulk[i:i + batch])
+    bulk_s = time.perf_counter() - t0
+    lat: List[float] = []
+    def one(q):
+        t = time.perf_counter()
+        embed([q])
+        lat.append(time.perf_counter() - t)
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as ex:
+        list(ex.map(one, queries))
+    query_s = time.perf_counter() - t0
+    return {"bulk_texts_per_s": round(len(bulk) / bulk_s, 1),
+            "query_rps": round(len(queries) / query_s, 1), **_latency(lat)}
+
+def bench_pool(args) -> Dict:
+    import server
+    from embed_pool import EmbeddingPool
+    bulk = synthetic_texts(args.texts, args.words)
+    queries = [" ".join(q.split()[:8]) for q in synthetic_texts(args.queries, 8, seed=13)]
+    rounds = {}
+    for workers in [int(w) for w in args.workers.split(",")]:
+        if workers == 0:
+            server.ensure_model()
+            rounds["0"] = _pool_round(server.embed_texts, bulk, args.batch, queries, args.concurrency)
+            continue
+        pool = EmbeddingPool(workers, server._pool_worker_init, server._pool_worker_embed, server._pool_worker_info,
+                             init_args=(max(1, (os.cpu_count() or 1) // workers),), max_batch=args.max_batch,
+                             max_wait_ms=args.wait_ms)
+        try:
+            # Indexing hands the pool one batch per worker at a time (see run_index_pipeline)
+            res = _pool_round(pool.embed, bulk, args.batch * workers, queries, args.concurrency)
+            res["avg_batch"] = pool.stats()["avg_batch"]
+            rounds[str(workers)] = res
+        finally:
+            pool.close()
+    base = rounds.get("0") or next(iter(rounds.values()))
+    for res in rounds.values():
+        res["bulk_speedup"] = round(res["bulk_texts_per_s"] / base["bulk_texts_per_s"], 2)
+        res["query_speedup"] = round(res["query_rps"] / base["query_rps"], 2)
+    return {
+        "benchmark":   "embed_pool",
+        "cpu_count":   os.cpu_count(),
+        "model":       server._embed_model,
+        "texts":       args.texts,
+        "words_per_text": args.words,
+        "batch":       args.batch,
+        "queries":     args.queries,
+        "concurrency": args.concurrency,
+        "max_batch":   args.max_batch,
+        "wait_ms":     args.wait_ms,
+        "by_workers":  rounds,
+    }
+
+# ─── End-to-end retrieval harness ──────────────────────────────────────────────
+# Each synthetic document is written about one topic: about one word in eight comes
+# from that topic's vocabulary, some paragraphs stray into another topic and the rest
+# is shared legal filler. A query built from a topic's words should rank that
+# topic's documents first.
+_TOPICS = {
+    "illegal_dismissal": "illegal dismissal backwages reinstatement separation pay just cause authorized termination "
+                         "twin notice hearing labor arbiter nlrc regularization",
+    "vawc":              "violence against women children protection order psychological abuse battered syndrome "
+                         "economic abuse barangay custody support",
+    "nullity":           "nullity marriage psychological incapacity family code annulment conjugal partnership "
+                         "legitime spouse void bigamous",
+    "estafa":            "estafa deceit misappropriation abuse confidence swindling fraudulent representation "
+                         "bouncing checks trust receipt",
+    "land_registration": "land registration torrens title original certificate reconveyance cadastral alienable "
+                         "disposable public domain survey",
+    "tax":               "tax assessment deficiency refund commissioner internal revenue prescriptive withholding vat "
+                         "excise franchise",
+    "drugs":             "dangerous drugs buy bust chain custody marking inventory seized shabu poseur buyer "
+                         "forensic chemist",
+    "ejectment":         "ejectment unlawful detainer forcible entry lease demand vacate rentals lessor lessee "
+                         "tolerance possession",
+    "murder":            "murder homicide treachery evident premeditation self defense unlawful aggression "
+                         "qualifying reclusion perpetua",
+    "search_seizure":    "search warrant probable cause unreasonable seizure plain view warrantless arrest "
+                         "poisonous tree exclusionary",
+    "election":          "election protest comelec canvass ballots disqualification candidacy quo warranto "
+                         "precinct tribunal",
+    "contracts":         "contract rescission specific performance stipulation consent vitiated novation "
+                         "solidary obligor creditor",
+}
+_FILLER = (
+    "the of and to in that is was for by with as on court petitioner respondent decision resolution appeal "
+    "case ruling held trial regional filed assailed records evidence testimony witness facts issue whether "
+    "however thus hence accordingly therefore section article republic act law provision jurisprudence"
+).split()
+_MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August", "September",
+           "October", "November", "December"]
+_QUERY_FRAMES = ["{}", "what are the requisites of {}", "{} under philippine law", "is there {} when {}",
+                 "liability for {} and {}", "jurisprudence on {}"]
+
+def synthetic_corpus(root: str, docs: int, seed: int = 5) -> List[Dict]:
+    """Write `docs` HTML files under root in the legal-database layout; returns one record per file."""
+    rng = random.Random(seed)
+    topics = sorted(_TOPICS)
+    records = []
+    for i in range(docs):
+        topic = topics[i % len(topics)]
+        vocab = _TOPICS[topic].split()
+        year, month, day = 1990 + rng.randrange(35), rng.randrange(12), rng.randint(1, 28)
+        kind = rng.random()
+        if kind < 0.7:
+            number = f"G.R. No. {100000 + i}"
+            rel = f"Supreme Court/{year}/{_MONTHS[month][:3]}/{number}, {_MONTHS[month]} {day}, {year}.html"
+        elif kind < 0.9:
+            number = f"Republic Act No. {12000 + i}"
+            rel = f"Laws/Republic Acts/{number}.html"
+        else:
+            number = f"Executive Order No. {900 + i}"
+            rel = f"Executive Issuances/Executive Orders/{number}, s. {year}.html"
+        paras = []
+        for _ in range(rng.randint(3, 30)):
+            other = _TOPICS[rng.choice(topics)].split()
+            words = [rng.choice(vocab) if x < 0.12 else rng.choice(other) if x < 0.18 else rng.choice(_FILLER)
+                     for x in (rng.random() for _ in range(rng.randint(30, 120)))]
+            paras.append("<p>" + " ".join(words) + "</p>")
+        title = os.path.splitext(os.path.basename(rel))[0]
+        path = os.path.join(root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"<!DOCTYPE html>\n<html>\n<head>\n<meta charset=\"UTF-8\" />\n<title>{title}</title>\n"
+                    f"<style>body {{ margin: 5px; }}</style>\n</head>\n<body>\n<h2>{title}</h2>\n"
+                    + "\n".join(paras) + "\n</body>\n</html>\n")
+        records.append({"rel": rel, "topic": topic, "number": number})
+    return records
+
+def synthetic_queries(n: int, seed: int, long: bool = False) -> List[tuple]:
+    """(query, topic) pairs; long ones are questions of 6+ words, which /query decomposes."""
+    rng = random.Random(seed)
+    topics = sorted(_TOPICS)
+    out = []
+    for i in range(n):
+        topic = topics[i % len(topics)]
+        vocab = _TOPICS[topic].split()
+        if long:
+            frame = rng.choice(_QUERY_FRAMES[1:])
+            parts = [" ".join(rng.sample(vocab, 2)) for _ in range(frame.count("{}"))]
+            q = "what does the court hold on " + frame.format(*parts)
+        else:
+            q = " ".join(rng.sample(vocab, rng.randint(2, 4)))
+        out.append((q, topic))
+    return out
+
+class _StubLLM:
+    """OpenAI-compatible /v1/chat/completions answering instantly-ish, so /query latency is the sidecar's own."""
+
+    def __init__(self, delay_s: float):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                prompt = body["messages"][-1]["content"]
+                if prompt.startswith("Decompose this legal question:"):
+                    words = prompt.split(":", 1)[1].split()
+                    content = json.dumps([" ".join(words[-4:]), " ".join(words[-7:-3])])
+                else:
+                    content = "**Legal Context** Stub answer. **Detailed Analysis** [1] **Sources Referenced** [1]"
+                time.sleep(stub.delay_s)
+                out = json.dumps({"choices": [{"message": {"content": content}}]}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+        self.delay_s = delay_s
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, name="stub-llm", daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def _free_port() -> int:
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def _proc_status_mb(pid: int, field: str) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+def _latency(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {"n": len(samples), "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2), "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "mean_ms": round(float(ms.mean()), 2)}
+
+def _relevance(ranked: List[List[str]], topics: List[str], topic_of: Dict[str, str], k: int) -> Dict[str, float]:
+    """
+    recall@k: share of the top-k slots holding a document of the query's topic, out of
+    min(k, documents on that topic); mrr: mean reciprocal rank of the first such document.
+    """
+    per_topic = {}
+    for t in topic_of.values():
+        per_topic[t] = per_topic.get(t, 0) + 1
+    recall, rr = [], []
+    for paths, topic in zip(ranked, topics):
+        hits = [topic_of.get(p) == topic for p in paths[:k]]
+        recall.append(sum(hits) / min(k, per_topic.get(topic, 0) or 1))
+        rr.append(next((1.0 / (i + 1) for i, h in enumerate(hits) if h), 0.0))
+    return {f"recall_at_{k}": round(float(np.mean(recall)), 4), "mrr": round(float(np.mean(rr)), 4)}
+
+def _replay(client, path: str, bodies: List[Dict], concurrency: int = 1) -> tuple:
+    """POST every body; returns (responses, per-request seconds, wall seconds)."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def one(body):
+        t0 = time.perf_counter()
+        resp = client.post(path, json=body)
+        resp.raise_for_status()
+        return resp.json(), time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    if concurrency <= 1:
+        results = [one(b) for b in bodies]
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, bodies))
+    wall = time.perf_counter() - t0
+    return [r for r, _ in results], [t for _, t in results], wall
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def bench_retrieval(args) -> Dict:
+    import httpx
+    work = args.workdir or tempfile.mkdtemp(prefix="deepsearcher-bench-")
+    corpus_root = os.path.join(work, "legal-database")
+    if os.path.exists(corpus_root):
+        raise SystemExit(f"{corpus_root} already exists; point --workdir at an empty directory")
+    t0 = time.perf_counter()
+    records = synthetic_corpus(corpus_root, args.docs, args.seed)
+    corpus_s = time.perf_counter() - t0
+    topic_of = {r["rel"]: r["topic"] for r in records}
+
+    llm = _StubLLM(args.llm_ms / 1000)
+    port = _free_port()
+    env = dict(os.environ, DEEPSEARCHER_DATA_DIR=os.path.join(work, "state"), DEEPSEARCHER_LEGAL_DB_ROOT=corpus_root,
+               DEEPSEARCHER_PORT=str(port), LLM_BASE_URL=llm.url, LLM_API_KEY="bench", PYTHONUNBUFFERED="1")
+    log = open(os.path.join(work, "server.log"), "w")
+    server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "server.py")],
+                              env=env, stdout=log, stderr=subprocess.STDOUT)
+    client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=600,
+                          limits=httpx.Limits(max_connections=args.concurrency * 2))
+    try:
+        deadline = time.time() + args.startup_timeout
+        while True:
+            try:
+                if client.get("/health/ready").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if server.poll() is not None or time.time() > deadline:
+                raise SystemExit(f"sidecar did not start; see {log.name}")
+            time.sleep(0.25)
+        startup_rss = _proc_status_mb(server.pid, "VmRSS")
+
+        # Indexing, through the job API the app uses
+        t0 = time.perf_counter()
+        job_id = client.post("/index/batch", json={}).json()["job_id"]
+        while True:
+            job = client.get(f"/index/jobs/{job_id}").json()
+            if job["status"] in ("completed", "failed", "cancelled"):
+                break
+            time.sleep(0.2)
+        index_s = time.perf_counter() - t0
+        if job["status"] != "completed":
+            raise SystemExit(f"index job {job['status']}: {job['errors'][:3]}")
+        index_rss = _proc_status_mb(server.pid, "VmHWM")
+
+        k = args.k
+        report: Dict = {
+            "benchmark": "retrieval",
+            "meta": {"revision": _git_revision(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                     "docs": args.docs, "queries": args.queries, "concurrency": args.concurrency, "k": k,
+                     "seed": args.seed, "llm_ms": args.llm_ms, "embed_model": client.get("/stats").json().get("embed_model"),
+                     "vector_store": os.environ.get("DEEPSEARCHER_VECTOR_STORE", "chroma"), "workdir": work},
+            "indexing": {"docs": job["files_done"], "chunks": job["chunks_indexed"], "wall_s": round(index_s, 2),
+                         "docs_per_s": round(job["files_done"] / index_s, 2),
+                         "chunks_per_s": round(job["chunks_indexed"] / index_s, 2),
+                         "corpus_build_s": round(corpus_s, 2), "errors": job["error_count"]},
+        }
+
+        # Sequential replays: each mode gets the same queries, and the search cache keys on mode
+        queries = synthetic_queries(args.queries, args.seed + 1)
+        topics = [t for _, t in queries]
+        report["search"] = {}
+        for mode in args.modes.split(","):
+            bodies = [{"query": q, "top_k": k, "mode": mode} for q, _ in queries]
+            resps, lat, _ = _replay(client, "/search", bodies)
+            ranked = [[r["relativePath"] for r in resp["results"]] for resp in resps]
+            report["search"][mode] = {**_latency(lat), **_relevance(ranked, topics, topic_of, k)}
+
+        long_queries = synthetic_queries(max(args.queries // 4, 1), args.seed + 2, long=True)
+        resps, lat, _ = _replay(client, "/query", [{"query": q} for q, _ in long_queries])
+        ranked = [[r["relativePath"] for r in resp["sources"]] for resp in resps]
+        report["query"] = {**_latency(lat), **_relevance(ranked, [t for _, t in long_queries], topic_of, 8)}
+
+        kag = random.Random(args.seed).sample(records, min(args.queries, len(records)))
+        resps, lat, _ = _replay(client, "/kag/lookup", [{"identifier": r["number"]} for r in kag])
+        found = [any(m["relativePath"] == r["rel"] for m in resp["results"]) for r, resp in zip(kag, resps)]
+        report["kag"] = {**_latency(lat), "hit_rate": round(sum(found) / len(found), 4)}
+
+        # Throughput under concurrency, on fresh queries so no response comes from the cache
+        report["concurrency"] = {}
+        fresh = synthetic_queries(args.queries, args.seed + 3)
+        _, lat, wall = _replay(client, "/search", [{"query": q, "top_k": k} for q, _ in fresh], args.concurrency)
+        report["concurrency"]["search"] = {**_latency(lat), "rps": round(len(lat) / wall, 2)}
+        fresh_long = synthetic_queries(max(args.queries // 4, 1), args.seed + 4, long=True)
+        _, lat, wall = _replay(client, "/query", [{"query": q} for q, _ in fresh_long], args.concurrency)
+        report["concurrency"]["query"] = {**_latency(lat), "rps": round(len(lat) / wall, 2)}
+
+        report["memory"] = {"startup_rss_mb": startup_rss, "peak_rss_after_index_mb": index_rss,
+                            "peak_rss_mb": _proc_status_mb(server.pid, "VmHWM")}
+        return report
+    finally:
+        client.close()
+        server.terminate()
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        log.close()
+        llm.close()
+        if not args.workdir and not args.keep:
+            import shutil
+            shutil.rmtree(work, ignore_errors=True)
+
+# Metric name → (higher is better, absolute tolerance or None for relative)
+_COMPARE_RULES = {
+    "p50_ms": (False, None), "p95_ms": (False, None), "p99_ms": (False, None), "mean_ms": (False, None),
+    "rps": (True, None), "docs_per_s": (True, None), "chunks_per_s": (True, None),
+    "startup_rss_mb": (False, None), "peak_rss_after_index_mb": (False, None), "peak_rss_mb": (False, None),
+    "mrr": (True, 0.02), "hit_rate": (True, 0.0),
+}
+
+def _flatten(d: Dict, prefix: str = "") -> Dict[str, float]:
+    out = {}
+    for key, v in d.items():
+        if isinstance(v, dict):
+            out.update(_flatten(v, f"{prefix}{key}."))
+        elif isinstance(v, (int, float)) and not isinstance(v, bool):
+            out[prefix + key] = v
+    return out
+
+def bench_compare(args) -> Dict:
+    with open(args.baseline) as f:
+        base_report = json.load(f)
+    with open(args.candidate) as f:
+        cand_report = json.load(f)
+    base, cand = _flatten(base_report), _flatten(cand_report)
+    settings = ("docs", "queries", "concurrency", "k", "seed", "llm_ms", "embed_model", "vector_store")
+    mismatched = [key for key in settings
+                  if base_report.get("meta", {}).get(key) != cand_report.get("meta", {}).get(key)]
+    changes, regressions = {}, []
+    for key in sorted(base.keys() & cand.keys()):
+        metric = key.rsplit(".", 1)[-1]
+        rule = (True, 0.02) if metric.startswith("recall_at_") else _COMPARE_RULES.get(metric)
+        if rule is None or key.startswith("meta."):
+            continue
+        higher_better, abs_tol = rule
+        old, new = base[key], cand[key]
+        delta = new - old
+        worse = -delta if higher_better else delta
+        limit = abs_tol if abs_tol is not None else abs(old) * args.tolerance
+        changes[key] = {"baseline": old, "candidate": new,
+                        "change_pct": round(delta / old * 100, 1) if old else None}
+        if worse > limit:
+            regressions.append(key)
+    return {"benchmark": "compare", "tolerance": args.tolerance,
+            "settings_differ": mismatched,      # runs with different settings are not comparable
+            "regressions": regressions, "metrics": changes}
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("embed", help="fallback hashing embedder throughput")
+    p.add_argument("--texts", type=int, default=2000)
+    p.add_argument("--words", type=int, default=600)
+    p.add_argument("--batch", type=int, default=64)
+    p.set_defaults(fn=bench_embed)
+    p = sub.add_parser("extract", help="streaming HTML extraction and chunking")
+    p.add_argument("--mb", type=float, default=8.0)
+    p.add_argument("--html", help="benchmark this file instead of a synthetic one")
+    p.set_defaults(fn=bench_extract)
+    p = sub.add_parser("recall", help="compact vector store vs ChromaDB HNSW: recall@10 and memory")
+    p.add_argument("--n", type=int, default=50000)
+    p.add_argument("--dim", type=int, default=1024)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--clusters", type=int, default=200)
+    p.add_argument("--rerank", type=int, default=300)
+    p.set_defaults(fn=bench_recall)
+    p = sub.add_parser("pool", help="embedding worker pool throughput by worker count")
+    p.add_argument("--workers", default="0,1,2,4", help="comma-separated worker counts; 0 = in-process")
+    p.add_argument("--texts", type=int, default=2000)
+    p.add_argument("--words", type=int, default=300)
+    p.add_argument("--batch", type=int, default=64)
+    p.add_argument("--queries", type=int, default=2000)
+    p.add_argument("--concurrency", type=int, default=16)
+    p.add_argument("--max-batch", type=int, default=64)
+    p.add_argument("--wait-ms", type=float, default=5.0)
+    p.set_defaults(fn=bench_pool)
+    p = sub.add_parser("retrieval", help="end-to-end sidecar latency, throughput, memory and relevance")
+    p.add_argument("--docs", type=int, default=600)
+    p.add_argument("--queries", type=int, default=120)
+    p.add_argument("--k", type=int, default=10)
+    p.add_argument("--modes", default="dense,lexical,hybrid")
+    p.add_argument("--concurrency", type=int, default=8)
+    p.add_argument("--llm-ms", type=float, default=20.0, help="stub LLM response delay")
+    p.add_argument("--seed", type=int, default=5)
+    p.add_argument("--startup-timeout", type=float, default=120.0)
+    p.add_argument("--workdir", help="keep corpus, index and server.log here (must not hold a corpus yet)")
+    p.add_argument("--keep", action="store_true", help="keep the temporary work directory")
+    p.add_argument("--out", help="also write the JSON report to this file")
+    p.set_defaults(fn=bench_retrieval)
+    p = sub.add_parser("compare", help="diff two retrieval reports and flag regressions")
+    p.add_argument("baseline")
+    p.add_argument("candidate")
+    p.add_argument("--tolerance", type=float, default=0.15, help="relative slack for latency/throughput/memory")
+    p.set_defaults(fn=bench_compare)
+    p = sub.add_parser("rss-child", help="(internal) open one index and report its resident memory")
+    p.add_argument("--backend", choices=("compact", "chroma"), required=True)
+    p.add_argument("--path", required=True)
+    p.add_argument("--query-file", required=True)
+    p.add_argument("--top-k", type=int, default=10)
+    p.add_argument("--rerank", type=int, default=300)
+    p.set_defaults(fn=bench_rss_child)
+    args = ap.parse_args()
+    result = args.fn(args)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if getattr(args, "out", None):
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    if result.get("regressions"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
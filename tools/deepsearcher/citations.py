@@ -0,0 +1,92 @@
+"""
+Single-pass citation and date extraction for the DeepSearcher sidecar.
+
+One compiled alternation finds, in a single left-to-right scan, every
+G.R. / R.A. / Act / B.P. / E.O. / P.D. / A.O. citation, every written date
+("August 8, 1901", "Jan. 5, 2004") and every bare 19xx/20xx year. A citation
+normalizes to a key such as "gr:12" or "ra:9262" (the kind and its first
+number), the form the identifier index and the citation graph are keyed by.
+
+A text's own number (primary()) follows the original parse_meta rule: the
+kind listed first in PATTERNS wins, then the leftmost match of that kind.
+Years also follow parse_meta: every 19xx/20xx standing as a word counts, in
+text order, including one inside a citation ("Republic Act No. 2000"). A
+number ends at its last digit group joined by a comma or dash, so a year after
+a plain space ("G.R. No. 12345 2004") is not read as part of the number.
+"""
+
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# (kind, pattern) in priority order; both R.A. spellings are kind "ra"
+_NUM = r'\d+(?:[,-]\s?\d+)*'           # "12", "1,234", "123-45", "123, 124"
+PATTERNS: List[Tuple[str, str]] = [
+    ("gr",  r'\bG\.?R\.?\s*Nos?\.?\s*(?:L-?\s*)?\d+(?:[,-]\s?(?:L-?\s*)?\d+)*'),
+    ("ra",  r'\bR\.?A\.?\s*(?:No\.?\s*)?' + _NUM),
+    ("ra",  r'\bRepublic Act\s+(?:No\.?\s*)?' + _NUM),
+    ("act", r'\bAct\s+No\.?\s*' + _NUM),
+    ("bp",  r'\bB\.?P\.?\s*(?:Blg\.?\s*)?' + _NUM),
+    ("eo",  r'\bE\.?O\.?\s*(?:No\.?\s*)?' + _NUM),
+    ("pd",  r'\bP\.?D\.?\s*(?:No\.?\s*)?' + _NUM),
+    ("ao",  r'\bA\.?O\.?\s*(?:No\.?\s*)?' + _NUM),
+]
+KINDS = list(dict.fromkeys(kind for kind, _ in PATTERNS))
+
+_MONTHS = {m[:3].lower(): i for i, m in enumerate(
+    "January February March April May June July August September October November December".split(), start=1)}
+_DATE = (r'\b(?:Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|June?|July?|Aug(?:ust)?|'
+         r'Sept?(?:ember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)\.?\s+\d{1,2},?\s+(?:19|20)\d{2}\b')
+_YEAR = r'\b(?:19|20)\d{2}\b'
+
+# Every alternative starts at a word boundary with one of these characters; checking
+# that first keeps the engine from trying all of them at every position
+_SCAN = re.compile(r"\b(?=[abdefgjmnoprs12])(?:" + "|".join(
+    [f"(?P<c{i}>{p})" for i, (_, p) in enumerate(PATTERNS)] + [f"(?P<date>{_DATE})", f"(?P<year>{_YEAR})"]) + ")", re.I)
+_NUMBER = re.compile(r'\d+(?:-\d+)*')
+_YEAR_IN = re.compile(_YEAR)
+_DATE_PARTS = re.compile(r'([A-Za-z]{3})[A-Za-z]*\.?\s+(\d{1,2}),?\s+(\d{4})')
+
+class Citation(NamedTuple):
+    key: str            # "ra:9262"
+    text: str           # the citation as written, e.g. "Republic Act No. 9262"
+    priority: int       # index into PATTERNS
+    start: int
+
+class Scan(NamedTuple):
+    citations: List[Citation]
+    dates: List[str]        # ISO yyyy-mm-dd, in text order
+    years: List[str]        # from dates and bare years, in text order
+
+def scan(text: str) -> Scan:
+    citations, dates, years = [], [], []
+    for m in _SCAN.finditer(text):
+        group = m.lastgroup
+        if group == "year":
+            years.append(m.group())
+        elif group == "date":
+            mon, day, year = _DATE_PARTS.match(m.group()).groups()
+            dates.append(f"{year}-{_MONTHS[mon.lower()]:02d}-{int(day):02d}")
+            years.append(year)
+        else:
+            years.extend(_YEAR_IN.findall(m.group()))
+            num = _NUMBER.search(m.group())
+            if num:
+                priority = int(group[1:])
+                citations.append(Citation(f"{PATTERNS[priority][0]}:{num.group()}", m.group().rstrip(", -\t\n"),
+                                          priority, m.start()))
+    return Scan(citations, dates, years)
+
+def primary(citations: List[Citation]) -> Optional[Citation]:
+    """The citation a text is about: first kind in PATTERNS order, then leftmost."""
+    return min(citations, key=lambda c: (c.priority, c.start)) if citations else None
+
+def citation_keys(citations: List[Citation], exclude: Optional[str] = None) -> List[str]:
+    """Distinct keys in text order, without `exclude` (a document's own key)."""
+    return [k for k in dict.fromkeys(c.key for c in citations) if k != exclude]
+
+def parse_name(name: str) -> Dict[str, str]:
+    """number / key / year / promulgated from a file name (without extension); empty strings when absent."""
+    sc = scan(name)
+    own = primary(sc.citations)
+    return {"number": own.text if own else "", "key": own.key if own else "",
+            "year": sc.years[0] if sc.years else "", "promulgated": sc.dates[0] if sc.dates else ""}
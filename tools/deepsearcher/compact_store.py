@@ -0,0 +1,327 @@
+"""
+Compact vector store for the DeepSearcher sidecar.
+
+Vectors are kept in append-only, memory-mapped files instead of ChromaDB's
+in-RAM HNSW index:
+  codes.i8    — int8 codes, one row per chunk (symmetric per-vector scale)
+  factors.f32 — scale / L2 norm per row, so codes · q × factor ≈ cosine(v, q)
+  full.f16    — the original vectors as float16, only touched for re-scoring
+  attrs.u16   — (category code, year) per row, for filtering in the scan
+  subcats.u16 — subcategory code per row (0 = not recorded yet, see below)
+  deleted.u8  — tombstones (an upsert tombstones the old row and appends)
+  ids.txt     — chunk id per row; categories.json — code table for both
+
+Search is two-stage: a blocked int8 scan over every live row keeps the best
+`rerank` candidates per query, which are then re-scored exactly from the fp16
+copy. Only the int8 codes are streamed through memory on each query.
+Filters are applied to the attribute columns before scoring, so a filtered
+search is exact over the rows that pass it, however few they are.
+
+The trade-off: resident memory is a quarter of float32 (the codes are memory-
+mapped and paged in by the OS), but there is no graph index, so every query
+costs O(rows × dim) — each matching row's codes are converted and multiplied.
+Latency grows linearly with the corpus; past a few million chunks at 1024 dims
+an ANN index (ChromaDB's HNSW) is the better fit.
+
+Deletes only set tombstones. Once more than `compact_ratio` of the rows are
+tombstoned, compact() rewrites the files without them, so deleted rows do not
+keep costing disk and scan time. Column files live in a generation directory
+(gen_NNNNNN; generation 0 is the store root, the original layout) named by the
+`generation` file. A compaction writes a new generation and then repoints that
+file, so files never move while mapped, which Windows refuses. A retired
+generation is deleted once no search is still reading it; one the OS will not
+release yet is retried on later compactions and on load, which also drops a
+generation left half-written by a crash.
+
+Stores written before subcategories were tracked get a zero-filled
+subcats.u16 and a subcats.pending marker; the server fills the codes in from
+the collection's metadata (set_subcategories) and then clears the marker.
+"""
+
+import os, json, shutil, threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SCAN_BLOCK_ROWS = 16384
+COMPACT_RATIO = 0.25
+COMPACT_MIN_ROWS = 1024         # never compact for fewer tombstones than this
+_COLUMNS = ("codes.i8", "factors.f32", "full.f16", "attrs.u16", "subcats.u16", "deleted.u8", "ids.txt")
+
+class CompactVectorStore:
+    def __init__(self, root: str, dim: int, rerank: int = 300, compact_ratio: float = COMPACT_RATIO):
+        self.dim, self.rerank, self.compact_ratio = dim, rerank, compact_ratio
+        self.dir = Path(root)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._gen_path = self.dir / "generation"
+        self._readers: Dict[int, int] = {}     # searches in progress per generation
+        self._cat_path = self.dir / "categories.json"
+        self._pending_path = self.dir / "subcats.pending"
+        self._categories: List[str] = json.loads(self._cat_path.read_text()) if self._cat_path.exists() else []
+        self._load()
+
+    # ── files ────────────────────────────────────────────────────────────────
+    def _row_bytes(self) -> Dict[str, int]:
+        return {"codes.i8": self.dim, "factors.f32": 4, "full.f16": 2 * self.dim, "attrs.u16": 4, "subcats.u16": 2,
+                "deleted.u8": 1}
+
+    def _gen_dir(self, gen: int) -> Path:
+        return self.dir if gen == 0 else self.dir / f"gen_{gen:06d}"
+
+    def _load(self):
+        self._gen = int(self._gen_path.read_text()) if self._gen_path.exists() else 0
+        self._paths = {name: self._gen_dir(self._gen) / name for name in _COLUMNS}
+        self._sweep()
+        ids = self._paths["ids.txt"].read_text(encoding="utf-8").splitlines() if self._paths["ids.txt"].exists() else []
+        rows = len(ids)
+        if ids and not self._paths["subcats.u16"].exists():
+            self._pending_path.touch()
+            with open(self._paths["subcats.u16"], "wb") as f:
+                f.truncate(2 * len(ids))
+        for name, width in self._row_bytes().items():
+            path = self._paths[name]
+            size = path.stat().st_size if path.exists() else 0
+            rows = min(rows, size // width)
+        # Cut every file back to the rows all of them hold (a crash can leave a torn append)
+        for name, width in self._row_bytes().items():
+            path = self._paths[name]
+            if path.exists() and path.stat().st_size != rows * width:
+                with open(path, "r+b") as f:
+                    f.truncate(rows * width)
+        if len(ids) != rows:
+            ids = ids[:rows]
+            self._paths["ids.txt"].write_text("".join(i + "\n" for i in ids), encoding="utf-8")
+        self._ids = ids
+        self._rows = rows
+        self._maps: Dict[str, np.ndarray] = {}
+        self._remap()
+        deleted = self._maps["deleted.u8"]
+        self._index: Dict[str, int] = {cid: r for r, cid in enumerate(ids) if not deleted[r]}
+
+    def _sweep(self):
+        """Delete generations other than the current one that no search is reading (caller holds _lock)."""
+        try:
+            for path in self.dir.glob("gen_*"):
+                gen = int(path.name[4:]) if path.name[4:].isdigit() else -1
+                if gen != self._gen and not self._readers.get(gen):
+                    shutil.rmtree(path)
+            if self._gen and not self._readers.get(0):
+                for name in _COLUMNS:
+                    (self.dir / name).unlink(missing_ok=True)
+        except OSError:
+            pass                        # still mapped somewhere (Windows); the next sweep retries
+
+    def _set_generation(self, gen: int):
+        tmp = self._gen_path.with_name("generation.tmp")
+        tmp.write_text(str(gen))
+        os.replace(tmp, self._gen_path)
+        self._maps = {}                 # drop this store's maps of the old generation
+        self._load()
+
+    def _new_generation(self) -> Tuple[int, Path]:
+        gens = [int(p.name[4:]) for p in self.dir.glob("gen_*") if p.name[4:].isdigit()]
+        gen = max(gens + [self._gen]) + 1
+        path = self._gen_dir(gen)
+        path.mkdir()
+        return gen, path
+
+    def _remap(self):
+        shapes = {"codes.i8": (np.int8, (self._rows, self.dim)), "factors.f32": (np.float32, (self._rows,)),
+                  "full.f16": (np.float16, (self._rows, self.dim)), "attrs.u16": (np.uint16, (self._rows, 2)),
+                  "subcats.u16": (np.uint16, (self._rows,)), "deleted.u8": (np.uint8, (self._rows,))}
+        for name, (dtype, shape) in shapes.items():
+            path = self._paths[name]
+            if self._rows == 0:
+                self._maps[name] = np.zeros(shape, dtype=dtype)
+            else:
+                mode = "r+" if name in ("deleted.u8", "subcats.u16") else "r"
+                self._maps[name] = np.memmap(path, dtype=dtype, mode=mode, shape=shape)
+
+    def _cat_code(self, category: str) -> int:
+        if category not in self._categories:
+            self._categories.append(category)
+            self._cat_path.write_text(json.dumps(self._categories))
+        return self._categories.index(category) + 1
+
+    @property
+    def count(self) -> int:
+        return len(self._index)
+
+    @property
+    def subcategories_pending(self) -> bool:
+        return self._pending_path.exists()
+
+    # ── writes ───────────────────────────────────────────────────────────────
+    def upsert(self, ids: Sequence[str], vectors, categories: Sequence[str], years: Sequence[str],
+               subcategories: Optional[Sequence[str]] = None):
+        vecs = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dim)
+        norms = np.linalg.norm(vecs, axis=1)
+        scales = np.abs(vecs).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(vecs / scales[:, None]), -127, 127).astype(np.int8)
+        factors = (scales / np.where(norms > 0, norms, 1.0)).astype(np.float32)
+        with self._lock:
+            attrs = np.array([(self._cat_code(c or ""), int(y) if str(y).isdigit() else 0)
+                              for c, y in zip(categories, years)], dtype=np.uint16).reshape(len(ids), 2)
+            subcats = np.array([self._cat_code(s or "") for s in subcategories] if subcategories is not None
+                               else [0] * len(ids), dtype=np.uint16)
+            self.delete(ids)
+            for name, data in (("codes.i8", codes), ("factors.f32", factors), ("full.f16", vecs.astype(np.float16)),
+                               ("attrs.u16", attrs), ("subcats.u16", subcats),
+                               ("deleted.u8", np.zeros(len(ids), dtype=np.uint8))):
+                with open(self._paths[name], "ab") as f:
+                    f.write(data.tobytes())
+            with open(self._paths["ids.txt"], "a", encoding="utf-8") as f:
+                f.write("".join(i + "\n" for i in ids))
+            # Publish only after every file holds the new rows
+            for r, cid in enumerate(ids, start=self._rows):
+                self._index[cid] = r
+            self._ids.extend(ids)
+            self._rows += len(ids)
+            self._remap()
+
+    def delete(self, ids: Iterable[str]) -> int:
+        with self._lock:
+            rows = [r for r in (self._index.pop(i, None) for i in ids) if r is not None]
+            if rows:
+                deleted = self._maps["deleted.u8"]
+                deleted[rows] = 1
+                deleted.flush()
+                tombstones = self._rows - len(self._index)
+                if tombstones >= max(COMPACT_MIN_ROWS, self.compact_ratio * self._rows):
+                    self.compact()
+            return len(rows)
+
+    def compact(self) -> int:
+        """Rewrite the files without their tombstoned rows; returns the rows dropped."""
+        with self._lock:
+            dropped = self._rows - len(self._index)
+            if not dropped:
+                return 0
+            keep = np.flatnonzero(self._maps["deleted.u8"] == 0)
+            gen, path = self._new_generation()
+            for name in self._row_bytes():
+                with open(path / name, "wb") as f:
+                    for lo in range(0, len(keep), SCAN_BLOCK_ROWS):
+                        f.write(np.ascontiguousarray(self._maps[name][keep[lo:lo + SCAN_BLOCK_ROWS]]).tobytes())
+            (path / "ids.txt").write_text("".join(self._ids[r] + "\n" for r in keep), encoding="utf-8")
+            self._set_generation(gen)
+        return dropped
+
+    def set_subcategories(self, ids: Sequence[str], subcategories: Sequence[str], done: bool = False) -> int:
+        """Record subcategories for existing rows; done=True clears the pending marker."""
+        with self._lock:
+            pairs = [(self._index[i], self._cat_code(s or "")) for i, s in zip(ids, subcategories) if i in self._index]
+            if pairs:
+                subcats = self._maps["subcats.u16"]
+                rows, codes = zip(*pairs)
+                subcats[list(rows)] = codes
+                subcats.flush()
+            if done:
+                self._pending_path.unlink(missing_ok=True)
+            return len(pairs)
+
+    def clear(self):
+        with self._lock:
+            self._cat_path.unlink(missing_ok=True)
+            self._pending_path.unlink(missing_ok=True)
+            self._categories = []
+            self._set_generation(self._new_generation()[0])     # an empty one
+
+    # ── reads ────────────────────────────────────────────────────────────────
+    def _codes(self, values: List[str]) -> List[int]:
+        return [self._categories.index(v) + 1 for v in values if v in self._categories]
+
+    def vectors(self, ids: Sequence[str]) -> np.ndarray:
+        """The stored (fp16) vectors of live ids as float32; KeyError for an unknown id."""
+        with self._lock:
+            rows = [self._index[i] for i in ids]
+            return self._maps["full.f16"][rows].astype(np.float32) if rows else np.zeros((0, self.dim), dtype=np.float32)
+
+    def _row_mask(self, maps: Dict[str, np.ndarray], lo: int, hi: int, categories: Optional[List[str]],
+                  year_range: Optional[Tuple[int, int]], subcategories: Optional[List[str]]) -> np.ndarray:
+        mask = maps["deleted.u8"][lo:hi] == 0
+        attrs = maps["attrs.u16"][lo:hi]
+        if categories is not None:
+            mask &= np.isin(attrs[:, 0], self._codes(categories))
+        if subcategories is not None:
+            mask &= np.isin(maps["subcats.u16"][lo:hi], self._codes(subcategories))
+        if year_range is not None:
+            mask &= (attrs[:, 1] >= year_range[0]) & (attrs[:, 1] <= year_range[1])
+        return mask
+
+    def search(self, queries, top_k: int = 10, categories: Optional[Iterable[str]] = None,
+               year_range: Optional[Tuple[int, int]] = None,
+               subcategories: Optional[Iterable[str]] = None) -> List[List[Tuple[str, float]]]:
+        """Per query, the top_k (chunk_id, cosine similarity) pairs, best first."""
+        q = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        q_norms = np.linalg.norm(q, axis=1, keepdims=True)
+        q = q / np.where(q_norms > 0, q_norms, 1.0)
+        categories = list(categories) if categories is not None else None
+        subcategories = list(subcategories) if subcategories is not None else None
+        with self._lock:
+            gen = self._gen
+            self._readers[gen] = self._readers.get(gen, 0) + 1
+            view = (self._rows, dict(self._maps), self._ids)
+        try:
+            return self._search(q, top_k, categories, year_range, subcategories, *view)
+        finally:
+            del view                    # the last reference to a retired generation's maps
+            with self._lock:
+                self._readers[gen] -= 1
+                if gen != self._gen and not self._readers[gen]:
+                    del self._readers[gen]
+                    self._sweep()
+
+    def _search(self, q: np.ndarray, top_k: int, categories: Optional[List[str]],
+                year_range: Optional[Tuple[int, int]], subcategories: Optional[List[str]],
+                rows: int, maps: Dict[str, np.ndarray], ids: List[str]) -> List[List[Tuple[str, float]]]:
+        n_cand = max(self.rerank, top_k)
+        best_s = np.full((len(q), 0), -np.inf, dtype=np.float32)
+        best_r = np.zeros((len(q), 0), dtype=np.int64)
+        qt = q.T.copy()
+        for lo in range(0, rows, SCAN_BLOCK_ROWS):
+            hi = min(lo + SCAN_BLOCK_ROWS, rows)
+            mask = self._row_mask(maps, lo, hi, categories, year_range, subcategories)
+            if not mask.any():
+                continue
+            live = np.flatnonzero(mask)
+            codes = maps["codes.i8"][lo:hi]
+            # Only live, matching rows are gathered and converted; a block without tombstones is used as is
+            block = (codes if len(live) == hi - lo else codes[live]).astype(np.float32)
+            scores = (block @ qt).T * maps["factors.f32"][lo:hi][live]
+            cand_s = np.concatenate((best_s, scores), axis=1)
+            cand_r = np.concatenate((best_r, np.broadcast_to(live + lo, scores.shape)), axis=1)
+            if cand_s.shape[1] > n_cand:
+                keep = np.argpartition(-cand_s, n_cand - 1, axis=1)[:, :n_cand]
+                cand_s = np.take_along_axis(cand_s, keep, axis=1)
+                cand_r = np.take_along_axis(cand_r, keep, axis=1)
+            best_s, best_r = cand_s, cand_r
+        out = []
+        for qi in range(len(q)):
+            cand = np.unique(best_r[qi][np.isfinite(best_s[qi])])
+            if not len(cand):
+                out.append([])
+                continue
+            full = maps["full.f16"][cand].astype(np.float32)
+            norms = np.linalg.norm(full, axis=1)
+            exact = (full @ q[qi]) / np.where(norms > 0, norms, 1.0)
+            order = np.argsort(-exact)[:top_k]
+            out.append([(ids[cand[i]], float(exact[i])) for i in order])
+        return out
+
+    def stats(self) -> Dict:
+        files = {name: path.stat().st_size if path.exists() else 0 for name, path in self._paths.items()}
+        return {
+            "rows":           self._rows,
+            "live":           self.count,
+            "dim":            self.dim,
+            "rerank":         self.rerank,
+            "tombstones":     self._rows - self.count,
+            "scan_bytes":     files["codes.i8"] + files["factors.f32"] + files["attrs.u16"] + files["subcats.u16"]
+                              + files["deleted.u8"],
+            "rescore_bytes":  files["full.f16"],
+            "subcategories_pending": self.subcategories_pending,
+        }
@@ -0,0 +1,175 @@
+"""
+Persistent, content-addressed embedding cache for the DeepSearcher sidecar.
+
+Vectors are keyed by (model name, dim, blake2b-128 of the chunk text). Each
+model/dim pair gets its own directory of generations (gen_NNNNNN), each holding
+two append-only files:
+  vectors.<dtype> — row-major float32 (default) matrix, read through a numpy memmap
+  keys.bin        — 16-byte text digests; row i of the matrix belongs to digest i
+
+The cache is bounded by max_bytes: new vectors go to the current generation,
+and once it holds half of max_bytes the previous generation is deleted and a
+new one started. A hit in the previous generation is copied forward, so
+vectors in use survive a rotation and the cache approximates LRU at the cost
+of at most one extra copy per vector per rotation.
+
+put_many returns the vectors as a later get_many will (rounded to `dtype`), so
+a caller sees the same values for a text whether it was a hit or a miss.
+
+The digest → row maps are rebuilt in memory on open. A single process should
+own a cache directory for writing.
+"""
+
+import re, shutil, hashlib, threading
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+_KEY_BYTES = 16
+
+class _Generation:
+    """One (keys.bin, vectors.<dtype>) pair."""
+    def __init__(self, path: Path, dim: int, dtype: np.dtype):
+        self.path, self.dim, self.dtype = path, dim, dtype
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.vec_path = path / f"vectors.{dtype.name}"
+        self.key_path = path / "keys.bin"
+        self.row_bytes = dim * dtype.itemsize
+        self.mm: Optional[np.memmap] = None
+        keys = self.key_path.read_bytes() if self.key_path.exists() else b""
+        vec_size = self.vec_path.stat().st_size if self.vec_path.exists() else 0
+        rows = min(len(keys) // _KEY_BYTES, vec_size // self.row_bytes)
+        # Drop any half-written tail left by a crash so appends stay aligned
+        for p, size in ((self.key_path, rows * _KEY_BYTES), (self.vec_path, rows * self.row_bytes)):
+            if p.exists() and p.stat().st_size != size:
+                with open(p, "r+b") as f:
+                    f.truncate(size)
+        self.index: Dict[bytes, int] = {keys[i * _KEY_BYTES:(i + 1) * _KEY_BYTES]: i for i in range(rows)}
+        self.rows = rows
+        self.vec_f = open(self.vec_path, "ab")
+        self.key_f = open(self.key_path, "ab")
+
+    def matrix(self, need_rows: int) -> np.memmap:
+        if self.mm is None or self.mm.shape[0] < need_rows:
+            self.mm = np.memmap(self.vec_path, dtype=self.dtype, mode="r", shape=(self.rows, self.dim))
+        return self.mm
+
+    def append(self, keys: List[bytes], vecs: np.ndarray):
+        self.vec_f.write(vecs.tobytes())
+        self.vec_f.flush()
+        self.key_f.write(b"".join(keys))
+        self.key_f.flush()
+        # Publish rows only once they are on disk, so readers never map past EOF
+        self.index.update((k, self.rows + i) for i, k in enumerate(keys))
+        self.rows += len(keys)
+
+    def close(self):
+        self.vec_f.close()
+        self.key_f.close()
+        self.mm = None
+
+class EmbeddingCache:
+    def __init__(self, root: str, model: str, dim: int, dtype: str = "float32", max_bytes: int = 2 << 30):
+        self.model, self.dim = model, dim
+        self.dtype = np.dtype(dtype)
+        self.max_bytes = max_bytes
+        self.dir = Path(root) / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', model)}_{dim}"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.row_bytes = dim * self.dtype.itemsize
+        # Each generation takes half the budget; at least one row so tiny caps still work
+        self.gen_rows = max(1, max_bytes // 2 // (self.row_bytes + _KEY_BYTES))
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # Files of the single-generation layout (and of another dtype) are dropped
+        for stale in [self.dir / "keys.bin", *self.dir.glob("vectors.*")]:
+            stale.unlink(missing_ok=True)
+        gens = sorted(p for p in self.dir.glob("gen_*") if p.name[4:].isdigit())
+        for old in gens[:-2]:
+            shutil.rmtree(old, ignore_errors=True)
+        gens = gens[-2:] or [self.dir / "gen_000001"]
+        self._gens = [_Generation(p, dim, self.dtype) for p in gens]   # oldest first, current last
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=_KEY_BYTES).digest()
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        """Cached float32 vectors for each text, None where missing."""
+        keys = [self.digest(t) for t in texts]
+        out: List[Optional[np.ndarray]] = [None] * len(texts)
+        promote: Dict[bytes, np.ndarray] = {}
+        with self._lock:
+            found = 0
+            for gen in reversed(self._gens):
+                rows = {i: gen.index[k] for i, k in enumerate(keys) if out[i] is None and k in gen.index}
+                if not rows:
+                    continue
+                mm = gen.matrix(max(rows.values()) + 1)
+                vecs = np.asarray(mm[list(rows.values())], dtype=np.float32)
+                for i, vec in zip(rows, vecs):
+                    out[i] = vec
+                    if gen is not self._gens[-1]:
+                        promote[keys[i]] = vec
+                found += len(rows)
+            self.hits += found
+            self.misses += len(texts) - found
+            if promote:
+                self._append(list(promote), np.asarray(list(promote.values()), dtype=self.dtype))
+        return out
+
+    def put_many(self, texts: Sequence[str], vectors: Sequence[Sequence[float]]) -> np.ndarray:
+        """Store vectors for texts; returns them as float32, rounded as get_many will return them."""
+        vecs = np.asarray(vectors, dtype=self.dtype).reshape(len(texts), self.dim)
+        with self._lock:
+            new: Dict[bytes, int] = {}
+            for i, text in enumerate(texts):
+                key = self.digest(text)
+                if key not in new and not any(key in gen.index for gen in self._gens):
+                    new[key] = i
+            if new:
+                self._append(list(new), vecs[list(new.values())])
+        return vecs.astype(np.float32)
+
+    def _append(self, keys: List[bytes], vecs: np.ndarray):
+        """Append rows to the current generation, rotating when it is full (caller holds _lock)."""
+        while keys:
+            cur = self._gens[-1]
+            room = self.gen_rows - cur.rows
+            if room <= 0:
+                self._rotate()
+                continue
+            cur.append(keys[:room], vecs[:room])
+            keys, vecs = keys[room:], vecs[room:]
+
+    def _rotate(self):
+        cur = self._gens[-1]
+        if len(self._gens) == 2:
+            old = self._gens.pop(0)
+            self.evictions += old.rows
+            old.close()
+            shutil.rmtree(old.path, ignore_errors=True)
+        self._gens.append(_Generation(cur.path.with_name(f"gen_{int(cur.path.name[4:]) + 1:06d}"), self.dim, self.dtype))
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        entries = sum(gen.rows for gen in self._gens)
+        return {
+            "model":     self.model,
+            "dim":       self.dim,
+            "dtype":     self.dtype.name,
+            "entries":   entries,
+            "hits":      self.hits,
+            "misses":    self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "disk_bytes": entries * (self.row_bytes + _KEY_BYTES),
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            for gen in self._gens:
+                gen.close()
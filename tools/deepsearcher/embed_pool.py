@@ -0,0 +1,191 @@
+"""
+Embedding worker pool for the DeepSearcher sidecar.
+
+Model inference runs in a pool of spawned worker processes, each holding its
+own copy of the model, so concurrent requests are not serialised on one
+interpreter's GIL. Callers block on embed(); a dispatcher thread coalesces
+whatever requests arrive within `max_wait_ms` (up to `max_batch` texts) into a
+single forward pass. A new batch is only cut when a worker is free, so under
+load requests queue up and batches grow on their own.
+
+Requests larger than `max_batch` are split and spread over the workers.
+Backpressure: at most `max_pending` texts may wait; beyond that embed() blocks,
+and raises EmbeddingQueueFull if `timeout` runs out first.
+
+The worker functions are passed in (init, embed, info) and must be picklable
+module-level callables; see _pool_worker_* in server.py. The server leaves the
+pool off (DEEPSEARCHER_EMBED_WORKERS=0): on a single core it only adds IPC to
+each batch, so enable it where there are cores to spread the model over.
+"""
+
+import time, threading, multiprocessing as mp
+from collections import deque
+from concurrent.futures import CancelledError, Future, InvalidStateError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+class EmbeddingQueueFull(RuntimeError):
+    """The pool's pending queue stayed full for longer than the caller's timeout."""
+
+class EmbeddingPool:
+    def __init__(self, workers: int, init: Callable, embed: Callable, info: Callable, init_args: tuple = (),
+                 max_batch: int = 64, max_wait_ms: float = 5.0, max_pending: int = 8192,
+                 on_batch: Optional[Callable[[int, float], None]] = None):
+        self.workers, self.max_batch, self.max_pending = workers, max_batch, max_pending
+        self.max_wait = max_wait_ms / 1000
+        self._init, self._init_args, self._embed, self._on_batch = init, init_args, embed, on_batch
+        self._executor = self._new_executor()
+        self._cond = threading.Condition()
+        self._pending: deque = deque()          # (texts, future, enqueued_at)
+        self._pending_texts = 0
+        self._slots = threading.Semaphore(workers)
+        self._in_flight = 0
+        self.batches = self.texts = 0
+        self._closed = False
+        # Every worker loads the model in its initializer. Workers are spawned on demand,
+        # so one call per worker (submitted together) brings them all up before serving.
+        self._info = [f.result() for f in [self._executor.submit(info) for _ in range(workers)]][0]
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name="embed-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the parent runs threads (and possibly torch) that must not be forked
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context("spawn"),
+                                   initializer=self._init, initargs=self._init_args)
+
+    def _replace_executor(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Swap a fresh executor in for `broken` unless another thread already has; returns the current one."""
+        with self._cond:
+            if self._executor is broken and not self._closed:
+                self._executor = self._new_executor()
+                broken.shutdown(wait=False, cancel_futures=True)
+            return self._executor
+
+    def model_info(self):
+        """Whatever the pool's `info` function returned in a worker."""
+        return self._info
+
+    # ── callers ──────────────────────────────────────────────────────────────
+    def embed(self, texts: Sequence[str], timeout: Optional[float] = None) -> np.ndarray:
+        """Embed texts in the pool; returns a float32 (len(texts), dim) array."""
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        parts = [list(texts[i:i + self.max_batch]) for i in range(0, len(texts), self.max_batch)]
+        futures = [Future() for _ in parts]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            for part, fut in zip(parts, futures):
+                # A lone request bigger than the whole queue is still let through
+                while self._pending_texts and self._pending_texts + len(part) > self.max_pending:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._withdraw(futures)
+                        raise EmbeddingQueueFull(f"{self._pending_texts} texts already waiting")
+                    self._cond.wait(remaining)
+                self._pending.append((part, fut, time.monotonic()))
+                self._pending_texts += len(part)
+                self._cond.notify_all()
+        return np.concatenate([f.result() for f in futures])
+
+    __call__ = embed
+
+    def _withdraw(self, futures: List[Future]):
+        """Take a request's parts that are still queued back out and cancel them all (caller holds _cond)."""
+        mine = set(map(id, futures))
+        kept = deque(item for item in self._pending if id(item[1]) not in mine)
+        self._pending_texts -= sum(len(item[0]) for item in self._pending if id(item[1]) in mine)
+        self._pending = kept
+        for f in futures:
+            f.cancel()              # parts already in a batch are skipped by _finish
+        self._cond.notify_all()
+
+    # ── dispatcher ───────────────────────────────────────────────────────────
+    def _dispatch_loop(self):
+        while True:
+            self._slots.acquire()           # cut a batch only when a worker can take it
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                # Give requests arriving right behind the first one a moment to join
+                deadline = self._pending[0][2] + self.max_wait
+                while self._pending_texts < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, n = [], 0
+                while self._pending and (not batch or n + len(self._pending[0][0]) <= self.max_batch):
+                    item = self._pending.popleft()
+                    batch.append(item)
+                    n += len(item[0])
+                if not batch:               # the queue was withdrawn while we waited
+                    self._slots.release()
+                    continue
+                self._pending_texts -= n
+                self._in_flight += 1
+                self._cond.notify_all()     # wake callers blocked on backpressure
+            self._submit(batch, n)
+
+    def _submit(self, batch: List[tuple], n: int):
+        texts = [t for part, _, _ in batch for t in part]
+        waited = time.monotonic() - batch[0][2]
+        executor = self._executor
+        try:
+            fut = executor.submit(self._embed, texts)
+        except BrokenProcessPool:
+            # A worker died (OOM, segfault in the model): start a fresh pool and retry once
+            executor = self._replace_executor(executor)
+            fut = executor.submit(self._embed, texts)
+        fut.add_done_callback(lambda f: self._finish(batch, f, executor))
+        self.batches += 1
+        self.texts += n
+        if self._on_batch:
+            self._on_batch(n, waited)
+
+    def _finish(self, batch: List[tuple], fut: Future, executor: Optional[ProcessPoolExecutor] = None):
+        with self._cond:
+            self._in_flight -= 1
+        self._slots.release()
+        exc = CancelledError() if fut.cancelled() else fut.exception()
+        if isinstance(exc, BrokenProcessPool):
+            # Every batch in flight on the dead pool lands here; only the first replaces it
+            self._replace_executor(executor)
+        out, i = (None, 0) if exc is not None else (fut.result(), 0)
+        # One caller's future may already be cancelled; every other caller in the batch still gets its result
+        for part, f, _ in batch:
+            try:
+                if not f.done():
+                    if exc is not None:
+                        f.set_exception(exc)
+                    else:
+                        f.set_result(out[i:i + len(part)])
+            except InvalidStateError:
+                pass
+            i += len(part)
+
+    # ── introspection ────────────────────────────────────────────────────────
+    def stats(self) -> Dict:
+        with self._cond:
+            pending_requests, pending_texts, in_flight = len(self._pending), self._pending_texts, self._in_flight
+        return {
+            "workers":          self.workers,
+            "max_batch":        self.max_batch,
+            "max_wait_ms":      self.max_wait * 1000,
+            "pending_requests": pending_requests,
+            "pending_texts":    pending_texts,
+            "in_flight_batches": in_flight,
+            "batches":          self.batches,
+            "texts":            self.texts,
+            "avg_batch":        round(self.texts / self.batches, 2) if self.batches else 0.0,
+        }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._slots.release()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,152 @@
+"""
+Streaming HTML → text extraction and chunking for the DeepSearcher sidecar.
+
+The file is read in fixed-size blocks and fed to the stdlib incremental
+tokenizer (html.parser, the same one BeautifulSoup uses in server.py), so
+neither the whole document nor a parse tree is held in memory. Text inside
+<head>, <script> and <style> is dropped, mirroring html_to_text's decompose
+step, and each text node is split into words on its own, mirroring
+get_text(separator=' ').
+
+Overlapping word windows are cut as words arrive and match
+chunk_text(html_to_text(html), size, overlap) exactly.
+"""
+
+import codecs
+from collections import Counter
+from html.parser import HTMLParser
+from typing import Iterator, List
+
+BLOCK_BYTES = 1 << 20
+_SKIP_TAGS = frozenset(("head", "script", "style"))
+# Void elements BeautifulSoup closes immediately, so they never enclose text
+_VOID_TAGS = frozenset((
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "keygen", "link", "menuitem",
+    "meta", "param", "source", "track", "wbr", "basefont", "bgsound", "command", "frame",
+    "image", "isindex", "nextid", "spacer",
+))
+
+class _WordParser(HTMLParser):
+    """Collects visible words; consecutive data events form one text node, as in bs4."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.words: List[str] = []
+        self._pending: List[str] = []
+        self._stack: List[str] = []
+        self._open = Counter()
+        self._skip = 0
+
+    def updatepos(self, i, j):
+        # Line/column tracking is only used for getpos(); skip the newline counting
+        return j
+
+    def _end_node(self):
+        if self._pending:
+            if not self._skip:
+                self.words.extend("".join(self._pending).split())
+            self._pending.clear()
+
+    def handle_data(self, data):
+        self._pending.append(data)
+
+    def handle_starttag(self, tag, attrs):
+        self._end_node()
+        if tag in _VOID_TAGS:
+            return
+        self._stack.append(tag)
+        self._open[tag] += 1
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._end_node()
+
+    def handle_endtag(self, tag):
+        self._end_node()
+        # Like bs4, close back to the most recent open tag of this name; stray end tags are ignored
+        if not self._open[tag]:
+            return
+        while True:
+            name = self._stack.pop()
+            self._open[name] -= 1
+            if name in _SKIP_TAGS:
+                self._skip -= 1
+            if name == tag:
+                return
+
+    def handle_comment(self, data):
+        self._end_node()
+
+    def handle_decl(self, decl):
+        self._end_node()
+
+    def handle_pi(self, data):
+        self._end_node()
+
+    def unknown_decl(self, data):
+        self._end_node()
+        # bs4 keeps <![CDATA[...]]> sections as text nodes of their own
+        if data.upper().startswith("CDATA[") and not self._skip:
+            self.words.extend(data[6:].split())
+
+    def close(self):
+        super().close()
+        self._end_node()
+
+def iter_words(path: str, encoding: str = "utf-8", errors: str = "strict") -> Iterator[List[str]]:
+    """Yield lists of visible words from an HTML file, one block at a time."""
+    parser = _WordParser()
+    decoder = codecs.getincrementaldecoder(encoding)(errors)
+    with open(path, "rb") as f:
+        while True:
+            block = f.read(BLOCK_BYTES)
+            text = decoder.decode(block, final=not block)
+            if text:
+                parser.feed(text)
+            if not block:
+                parser.close()
+            if parser.words:
+                yield parser.words
+                parser.words = []
+            if not block:
+                return
+
+def iter_chunks(path: str, size: int = 600, overlap: int = 100,
+                encoding: str = "utf-8", errors: str = "strict") -> Iterator[str]:
+    """Yield overlapping word windows as the file is parsed; '' for a document with no text."""
+    step = size - overlap
+    window: List[str] = []
+    emitted = False
+    for words in iter_words(path, encoding, errors):
+        window.extend(words)
+        start = 0
+        while len(window) - start >= size:
+            yield " ".join(window[start:start + size])
+            start += step
+        if start:
+            emitted = True
+            del window[:start]
+    for start in range(0, len(window), step):
+        yield " ".join(window[start:start + size])
+        emitted = True
+    if not emitted:
+        yield ""
+
+def extract_chunks(path: str, size: int = 600, overlap: int = 100) -> List[str]:
+    """Chunk a file as UTF-8, falling back to latin-1 if it does not decode."""
+    try:
+        return list(iter_chunks(path, size, overlap))
+    except UnicodeDecodeError:
+        return list(iter_chunks(path, size, overlap, encoding="latin-1"))
+
+def extract_prefix(path: str, limit: int, errors: str = "replace") -> str:
+    """The first `limit` characters of the whitespace-collapsed text, reading only as far as needed."""
+    out, length = [], 0
+    for words in iter_words(path, errors=errors):
+        for w in words:
+            out.append(w)
+            length += len(w) + 1
+            if length > limit:
+                return " ".join(out)[:limit]
+    return " ".join(out)[:limit]
@@ -0,0 +1,353 @@
+"""
+Persistent BM25 inverted index over the chunks stored in ChromaDB.
+
+The index is a list of immutable segments (log-structured, like Lucene). Each
+segment directory holds numpy arrays that are memory-mapped on load:
+  terms.txt      — sorted vocabulary, one term per line
+  offsets.npy    — int64[T+1], posting list bounds per term
+  deltas.npy     — uint16/uint32 doc-id gaps (first entry of a list is absolute)
+  tfs.npy        — uint8 term frequencies (clipped at 255; BM25 saturates long before)
+  doc_len.npy    — uint32 tokens per chunk
+  ids.npy        — chunk ids (bytes); ids_order.npy sorts them for deletes
+  cats.npy       — uint16 category code per chunk; years.npy — uint16 year (0 = unknown)
+  deleted.npy    — bool tombstones, rewritten when chunks are removed
+
+New chunks are buffered in memory and written as a segment on flush(); segments
+of similar size are merged four at a time (up to max_merge_docs chunks, which
+bounds merge memory), so the segment count stays logarithmic in corpus size.
+Segments that are mostly tombstones are rewritten on their own, and past
+max_segments the smallest ones are merged regardless of level.
+
+A query only touches the posting lists of its terms: scores are accumulated
+over the doc rows those lists name, never over a dense per-segment array.
+"""
+
+import os, re, json, math, shutil, threading
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r'\w+')
+_MAX_TOKEN = 32
+_STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this to was were will with
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) <= _MAX_TOKEN and t not in _STOPWORDS]
+
+class _Segment:
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.name
+        self.terms = path.joinpath("terms.txt").read_text(encoding="utf-8").split("\n")
+        self.term_index = {t: i for i, t in enumerate(self.terms)}
+        load = lambda n: np.load(path / f"{n}.npy", mmap_mode="r")
+        self.offsets, self.deltas, self.tfs = load("offsets"), load("deltas"), load("tfs")
+        self.doc_len, self.ids, self.ids_order = load("doc_len"), load("ids"), load("ids_order")
+        self.cats, self.years = load("cats"), load("years")
+        self.deleted = np.load(path / "deleted.npy")
+        self.size = len(self.doc_len)
+        self.live = int(self.size - self.deleted.sum())
+        self.live_len = int(self.doc_len[~self.deleted].sum())
+        self._sorted_ids: Optional[np.ndarray] = None
+
+    def postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        ti = self.term_index.get(term)
+        if ti is None:
+            return None
+        lo, hi = int(self.offsets[ti]), int(self.offsets[ti + 1])
+        return np.cumsum(self.deltas[lo:hi], dtype=np.int64), self.tfs[lo:hi]
+
+    def decode_all(self) -> Tuple[np.ndarray, np.ndarray]:
+        """(term index, doc row) for every posting, in storage order."""
+        counts = np.diff(self.offsets)
+        cs = np.cumsum(self.deltas, dtype=np.int64)
+        starts = self.offsets[:-1]
+        before = cs[starts] - self.deltas[starts]
+        return (np.repeat(np.arange(len(self.terms), dtype=np.int32), counts),
+                (cs - np.repeat(before, counts)).astype(np.int32))
+
+    def rows_for(self, ids: Sequence[bytes]) -> np.ndarray:
+        """Distinct rows holding any of ids (exact match)."""
+        # Ids wider than the segment's fixed-width dtype cannot be in it, and casting
+        # them would truncate them onto a shorter id ("X_10" -> "X_1")
+        width = self.ids.dtype.itemsize
+        ids = [i for i in ids if len(i) <= width]
+        if not ids or not self.size:
+            return np.zeros(0, dtype=np.int64)
+        if self._sorted_ids is None:          # segments are immutable, so build it once
+            self._sorted_ids = self.ids[self.ids_order]
+        sorted_ids = self._sorted_ids
+        wanted = np.array(ids, dtype=self.ids.dtype)
+        pos = np.clip(np.searchsorted(sorted_ids, wanted), 0, self.size - 1)
+        hit = sorted_ids[pos] == wanted
+        return np.unique(self.ids_order[pos[hit]])
+
+def _write_segment(path: Path, terms: np.ndarray, term_idx: np.ndarray, docs: np.ndarray, tfs: np.ndarray,
+                   doc_len: np.ndarray, ids: np.ndarray, cats: np.ndarray, years: np.ndarray):
+    """Write postings (term_idx, docs, tfs — any order) as a segment directory."""
+    order = np.lexsort((docs, term_idx))
+    term_idx, docs, tfs = term_idx[order], docs[order], tfs[order]
+    offsets = np.searchsorted(term_idx, np.arange(len(terms) + 1)).astype(np.int64)
+    deltas = docs.copy()
+    deltas[1:] -= docs[:-1]
+    deltas[offsets[:-1]] = docs[offsets[:-1]]
+    dtype = np.uint16 if len(deltas) == 0 or deltas.max() <= np.iinfo(np.uint16).max else np.uint32
+
+    tmp = path.with_name(path.name + ".tmp")
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    tmp.joinpath("terms.txt").write_text("\n".join(terms.tolist()), encoding="utf-8")
+    np.save(tmp / "offsets.npy", offsets)
+    np.save(tmp / "deltas.npy", deltas.astype(dtype))
+    np.save(tmp / "tfs.npy", np.minimum(tfs, 255).astype(np.uint8))
+    np.save(tmp / "doc_len.npy", doc_len.astype(np.uint32))
+    np.save(tmp / "ids.npy", ids)
+    np.save(tmp / "ids_order.npy", np.argsort(ids, kind="stable").astype(np.int64))
+    np.save(tmp / "cats.npy", cats.astype(np.uint16))
+    np.save(tmp / "years.npy", years.astype(np.uint16))
+    np.save(tmp / "deleted.npy", np.zeros(len(doc_len), dtype=bool))
+    os.replace(tmp, path)
+
+class LexicalIndex:
+    def __init__(self, root: str, k1: float = 1.2, b: float = 0.75, flush_docs: int = 4096,
+                 max_merge_docs: int = 131072, max_segments: int = 16, expunge_ratio: float = 0.5):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.k1, self.b = k1, b
+        self.flush_docs, self.max_merge_docs = flush_docs, max_merge_docs
+        self.max_segments, self.expunge_ratio = max_segments, expunge_ratio
+        self._lock = threading.RLock()
+        state = self._read_state()
+        self._next = state.get("next", 0)
+        self._categories: List[str] = state.get("categories", [])
+        self._segments: List[_Segment] = [_Segment(self.root / n) for n in state.get("segments", [])]
+        live = {s.name for s in self._segments}
+        for stale in self.root.glob("seg_*"):      # merged-away or half-written segments
+            if stale.name not in live:
+                shutil.rmtree(stale, ignore_errors=True)
+        self._buffer: Dict[str, Tuple[str, Counter, int, int, int]] = {}
+        self._refresh_stats()
+
+    # ── persistence ──────────────────────────────────────────────────────────
+    def _read_state(self) -> Dict:
+        p = self.root / "index.json"
+        return json.loads(p.read_text()) if p.exists() else {}
+
+    def _write_state(self):
+        tmp = self.root / "index.json.tmp"
+        tmp.write_text(json.dumps({"next": self._next, "categories": self._categories,
+                                   "segments": [s.name for s in self._segments]}))
+        os.replace(tmp, self.root / "index.json")
+
+    def _refresh_stats(self):
+        self._df: Dict[str, int] = {}
+        live = sum(s.live for s in self._segments)
+        total_len = sum(s.live_len for s in self._segments)
+        self.doc_count = live
+        self.avgdl = total_len / live if live else 0.0
+
+    def _df_of(self, term: str) -> int:
+        df = self._df.get(term)
+        if df is None:
+            df = 0
+            for s in self._segments:
+                ti = s.term_index.get(term)
+                if ti is not None:
+                    df += int(s.offsets[ti + 1] - s.offsets[ti])
+            self._df[term] = df
+        return df
+
+    def _cat_code(self, category: str) -> int:
+        if category not in self._categories:
+            self._categories.append(category)
+        return self._categories.index(category) + 1
+
+    # ── writes ───────────────────────────────────────────────────────────────
+    def add(self, ids: Sequence[str], texts: Sequence[str], categories: Sequence[str], years: Sequence[str]):
+        with self._lock:
+            for cid, text, cat, year in zip(ids, texts, categories, years):
+                terms = tokenize(text)
+                y = int(year) if str(year).isdigit() else 0
+                self._buffer[cid] = (cid, Counter(terms), len(terms), self._cat_code(cat or ""), y)
+            if len(self._buffer) >= self.flush_docs:
+                self.flush()
+
+    def flush(self):
+        """Write buffered chunks as a new segment, then merge same-sized segments."""
+        with self._lock:
+            if not self._buffer:
+                return
+            buf, self._buffer = list(self._buffer.values()), {}
+            vocab = sorted({t for _, c, _, _, _ in buf for t in c})
+            tindex = {t: i for i, t in enumerate(vocab)}
+            term_idx, docs, tfs = [], [], []
+            for row, (_, counts, _, _, _) in enumerate(buf):
+                for t, n in counts.items():
+                    term_idx.append(tindex[t]); docs.append(row); tfs.append(n)
+            seg = self._new_segment_path()
+            _write_segment(seg, np.array(vocab, dtype=str), np.array(term_idx, dtype=np.int64),
+                           np.array(docs, dtype=np.int64), np.array(tfs, dtype=np.int64),
+                           np.array([b[2] for b in buf]), np.array([b[0] for b in buf], dtype="S"),
+                           np.array([b[3] for b in buf]), np.array([b[4] for b in buf]))
+            self._segments.append(_Segment(seg))
+            self._maybe_merge()
+            self._write_state()
+            self._refresh_stats()
+
+    def delete(self, ids: Iterable[str]) -> int:
+        """Tombstone chunks by id; buffered (not yet flushed) chunks are just dropped."""
+        ids = list(ids)
+        if not ids:
+            return 0
+        targets = [i.encode() for i in ids]
+        with self._lock:
+            removed = sum(self._buffer.pop(i, None) is not None for i in set(ids))
+            touched = False
+            for seg in self._segments:
+                rows = seg.rows_for(targets)
+                rows = rows[~seg.deleted[rows]]
+                if len(rows):
+                    seg.deleted[rows] = True
+                    np.save(seg.path / "deleted.npy", seg.deleted)
+                    seg.live -= len(rows)
+                    seg.live_len -= int(seg.doc_len[rows].sum())
+                    removed += len(rows)
+                    touched = True
+            if touched:
+                self._refresh_stats()
+            return removed
+
+    def clear(self):
+        with self._lock:
+            for seg in self._segments:
+                shutil.rmtree(seg.path, ignore_errors=True)
+            self._segments, self._buffer = [], {}
+            self._write_state()
+            self._refresh_stats()
+
+    def _new_segment_path(self) -> Path:
+        self._next += 1
+        return self.root / f"seg_{self._next:06d}"
+
+    def _maybe_merge(self):
+        while True:
+            group = self._pick_merge()
+            if not group:
+                return
+            merged = self._merge(group)
+            keep = [s for s in self._segments if s not in group]
+            self._segments = keep + ([merged] if merged else [])
+            for s in group:
+                shutil.rmtree(s.path, ignore_errors=True)
+
+    def _pick_merge(self) -> List[_Segment]:
+        """Next segments to merge: four of a level, a mostly-deleted one, or the smallest past the cap."""
+        by_level: Dict[int, List[_Segment]] = {}
+        for s in self._segments:
+            by_level.setdefault(int(math.log(max(s.live, 1) / self.flush_docs + 1, 4)), []).append(s)
+        group = next((g[:4] for g in by_level.values()
+                      if len(g) >= 4 and sum(s.live for s in g[:4]) <= self.max_merge_docs), None)
+        if group:
+            return group
+        for s in self._segments:            # reclaim tombstones (and their postings) from one segment
+            if s.size and (s.size - s.live) / s.size >= self.expunge_ratio:
+                return [s]
+        if len(self._segments) > self.max_segments:
+            smallest = sorted(self._segments, key=lambda s: s.live)[:4]
+            if sum(s.live for s in smallest) <= self.max_merge_docs:
+                return smallest
+        return []
+
+    def _merge(self, segs: List[_Segment]) -> Optional[_Segment]:
+        vocab = np.unique(np.concatenate([np.array(s.terms, dtype=str) for s in segs]))
+        parts = {k: [] for k in ("t", "d", "f", "len", "ids", "cats", "years")}
+        base = 0
+        for s in segs:
+            keep = ~s.deleted
+            remap = np.full(s.size, -1, dtype=np.int64)
+            remap[keep] = np.arange(int(keep.sum())) + base
+            t, d = s.decode_all()
+            d = remap[d]
+            ok = d >= 0
+            parts["t"].append(np.searchsorted(vocab, np.array(s.terms, dtype=str)).astype(np.int32)[t[ok]])
+            parts["d"].append(d[ok])
+            parts["f"].append(np.asarray(s.tfs)[ok])
+            for k, arr in (("len", s.doc_len), ("ids", s.ids), ("cats", s.cats), ("years", s.years)):
+                parts[k].append(np.asarray(arr)[keep])
+            base += int(keep.sum())
+        if base == 0:
+            return None
+        cat = {k: np.concatenate(v) for k, v in parts.items()}
+        used, t_idx = np.unique(cat["t"], return_inverse=True)   # drop terms only held by deleted chunks
+        seg = self._new_segment_path()
+        _write_segment(seg, vocab[used], t_idx.astype(np.int64), cat["d"], cat["f"].astype(np.int64),
+                       cat["len"], cat["ids"], cat["cats"], cat["years"])
+        return _Segment(seg)
+
+    # ── reads ────────────────────────────────────────────────────────────────
+    def search(self, query: str, top_k: int = 10, categories: Optional[Iterable[str]] = None,
+               year_range: Optional[Tuple[int, int]] = None) -> List[Tuple[str, float]]:
+        """BM25 top-k as (chunk_id, score), filters applied before ranking."""
+        q_terms = Counter(tokenize(query))
+        segments, n, avgdl = self._segments, self.doc_count, self.avgdl
+        if not q_terms or not n:
+            return []
+        cat_codes = None
+        if categories is not None:
+            cat_codes = np.array([self._categories.index(c) + 1 for c in categories if c in self._categories])
+            if not len(cat_codes):
+                return []
+
+        hits: List[Tuple[float, str]] = []
+        for seg in segments:
+            rows, parts = [], []
+            for term, qtf in q_terms.items():
+                post = seg.postings(term)
+                if post is None:
+                    continue
+                docs, tf = post
+                df = self._df_of(term)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                tf = tf.astype(np.float32)
+                norm = self.k1 * (1 - self.b + self.b * seg.doc_len[docs].astype(np.float32) / avgdl)
+                rows.append(docs)
+                parts.append(qtf * idf * tf * (self.k1 + 1) / (tf + norm))
+            if not rows:
+                continue
+            if len(rows) == 1:              # a posting list names each row once
+                docs, scores = rows[0], parts[0]
+            elif sum(len(r) for r in rows) * 8 < seg.size:
+                docs, inv = np.unique(np.concatenate(rows), return_inverse=True)
+                scores = np.bincount(inv, weights=np.concatenate(parts))
+            else:                           # common terms: scattering beats sorting the postings
+                acc = np.zeros(seg.size, dtype=np.float32)
+                for r, part in zip(rows, parts):
+                    acc[r] += part
+                docs = np.flatnonzero(acc)
+                scores = acc[docs]
+            keep = ~seg.deleted[docs]
+            if cat_codes is not None:
+                keep &= np.isin(seg.cats[docs], cat_codes)
+            if year_range is not None:
+                y = seg.years[docs]
+                keep &= (y >= year_range[0]) & (y <= year_range[1])
+            docs, scores = docs[keep], scores[keep]
+            if len(docs) > top_k:
+                top = np.argpartition(-scores, top_k)[:top_k]
+                docs, scores = docs[top], scores[top]
+            hits.extend((float(sc), seg.ids[r].decode()) for r, sc in zip(docs, scores))
+        hits.sort(reverse=True)
+        return [(cid, score) for score, cid in hits[:top_k]]
+
+    def stats(self) -> Dict:
+        return {
+            "chunks":     self.doc_count,
+            "segments":   len(self._segments),
+            "buffered":   len(self._buffer),
+            "avg_tokens": round(self.avgdl, 1),
+            "disk_bytes": sum(f.stat().st_size for s in self._segments for f in s.path.iterdir()),
+        }
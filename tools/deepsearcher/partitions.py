@@ -0,0 +1,98 @@
+"""
+Materialized search partitions for filtered dense retrieval in the DeepSearcher sidecar.
+
+ChromaDB answers a `where`-filtered query by walking its HNSW graph and skipping
+rows that fail the filter, so a selective filter (one subcategory, a few years)
+leaves the graph walk with few reachable matches and recall drops. A Partition
+is instead a small, exact copy of the rows behind one filter: the chunk ids,
+their unit-normalized vectors, the document each belongs to, and year /
+subcategory codes for narrowing it further. Searching it is a brute-force
+matrix product over the partition only, so its cost grows with the partition
+and not with the collection.
+
+Search ranks documents, not chunks: every chunk is scored and each document
+contributes its best chunk, so the top documents are exact however many
+chunks the leading documents have. With per_doc > 1 those documents also bring
+their next best chunks, wherever those rank, for scoring documents over several
+chunks.
+
+The server decides which filters are materialized (PARTITION_MAX_ROWS) and
+merges results across partitions; this module only holds and scans them.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+def _take(taken: Dict[int, int], doc: int, limit: int) -> bool:
+    taken[doc] += 1
+    return taken[doc] <= limit
+
+class Partition:
+    def __init__(self, ids: Sequence[str], vectors, documents: Sequence[str], years: Sequence[str],
+                 subcategories: Sequence[str]):
+        self.ids = list(ids)
+        vecs = np.asarray(vectors, dtype=np.float32).reshape(len(self.ids), -1 if self.ids else 0)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        self.vectors = vecs / np.where(norms > 0, norms, 1.0)
+        self.years = np.array([int(y) if str(y).isdigit() else 0 for y in years], dtype=np.uint16)
+        docs: Dict[str, int] = {}
+        self.docs = np.array([docs.setdefault(d, len(docs)) for d in documents], dtype=np.int64)
+        self._subcats: Dict[str, int] = {}
+        self.subcats = np.array([self._subcats.setdefault(s or "", len(self._subcats)) for s in subcategories],
+                                dtype=np.uint16)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.vectors.nbytes + self.docs.nbytes + self.years.nbytes + self.subcats.nbytes
+
+    def _mask(self, subcategories: Optional[Sequence[str]], year_range: Optional[Tuple[int, int]]) -> Optional[np.ndarray]:
+        if subcategories is None and year_range is None:
+            return None
+        mask = np.ones(len(self.ids), dtype=bool)
+        if subcategories is not None:
+            mask &= np.isin(self.subcats, [self._subcats[s] for s in subcategories if s in self._subcats])
+        if year_range is not None:
+            mask &= (self.years >= year_range[0]) & (self.years <= year_range[1])
+        return mask
+
+    def search(self, queries, top_docs: int, subcategories: Optional[Sequence[str]] = None,
+               year_range: Optional[Tuple[int, int]] = None, per_doc: int = 1) -> List[List[Tuple[str, float]]]:
+        """
+        Per query, the best chunk (best `per_doc` chunks) of each of the `top_docs`
+        best documents among rows passing the filter, as (chunk_id, cosine
+        similarity) pairs, best first.
+        """
+        q = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        mask = self._mask(subcategories, year_range)
+        rows = np.arange(len(self.ids)) if mask is None else np.flatnonzero(mask)
+        if not len(rows):
+            return [[] for _ in q]
+        q_norms = np.linalg.norm(q, axis=1, keepdims=True)
+        q = q / np.where(q_norms > 0, q_norms, 1.0)
+        vecs = self.vectors if mask is None else self.vectors[rows]
+        scores = q @ vecs.T
+        docs = self.docs[rows]
+        out = []
+        for qi in range(len(q)):
+            # The best few chunks usually cover enough documents; sort everything only when they do not
+            k = min(len(rows), top_docs * 8)
+            order = np.argpartition(-scores[qi], k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            order = order[np.argsort(-scores[qi, order], kind="stable")]
+            _, first = np.unique(docs[order], return_index=True)
+            if len(first) < top_docs and k < len(rows):
+                order = np.argsort(-scores[qi], kind="stable")
+                _, first = np.unique(docs[order], return_index=True)
+            best = order[np.sort(first)[:top_docs]]
+            if per_doc > 1:
+                # Further chunks of those documents, from all their rows: the candidates above
+                # may hold only each document's best chunk
+                own = np.flatnonzero(np.isin(docs, docs[best]))
+                own = own[np.argsort(-scores[qi, own], kind="stable")]
+                taken = dict.fromkeys(docs[best].tolist(), 0)
+                best = [i for i in own.tolist() if _take(taken, docs[i], per_doc)]
+            out.append([(self.ids[rows[i]], float(scores[qi, i])) for i in best])
+        return out
@@ -0,0 +1,115 @@
+"""
+Sentence segmentation and query-focused passages for the DeepSearcher sidecar.
+
+At index time every chunk gets its segment end offsets (sentence_ends, stored in
+the chunk metadata as encode_offsets()). At query time best_passage() picks the
+run of consecutive segments that covers the most query terms within a character
+budget and returns it with the character spans of the matched terms, so results
+carry a few hundred characters around the match instead of the whole chunk and
+nothing has to be re-read or re-parsed.
+
+Segments are sentences, split at . ! ? followed by an upper-case start, except
+after the abbreviations legal text is full of (No., Art., Sec., G.R., ...);
+runs longer than SEGMENT_CHARS (unpunctuated text) are cut at word boundaries.
+"""
+
+import re
+from typing import List, Optional, Sequence, Tuple
+
+SEGMENT_CHARS = 300
+
+_ABBREVIATIONS = frozenset((
+    "no", "nos", "art", "arts", "sec", "secs", "par", "pars", "p", "pp", "vol", "ch", "id", "cf", "vs", "v",
+    "jr", "sr", "inc", "co", "corp", "ltd", "phil", "rep", "gen", "hon", "atty", "dr", "mr", "mrs", "ms", "st",
+    "r.a", "p.d", "b.p", "e.o", "a.o", "g.r", "a.m", "c.a", "s.c", "i.e", "e.g", "et", "al", "rev", "supp",
+))
+_BOUNDARY = re.compile(r'[.!?]["\')\]]*\s+(?=["\'(\[]?[A-Z0-9])')
+_WORD = re.compile(r'\w+')
+_STOPWORDS = frozenset("a an and are as at be by for from in is it of on or the to was what when where which who "
+                       "with under into than that this these those".split())
+
+def sentence_ends(text: str) -> List[int]:
+    """End offset (exclusive) of each segment of text; the last one is len(text)."""
+    ends: List[int] = []
+    start = 0
+    for m in _BOUNDARY.finditer(text):
+        word = text[start:m.start()].rsplit(None, 1)[-1] if text[start:m.start()].strip() else ""
+        if word.lower().rstrip(".") in _ABBREVIATIONS or (len(word) == 1 and word.isupper()):
+            continue
+        _split_long(text, start, m.end(), ends)
+        start = m.end()
+    if start < len(text):
+        _split_long(text, start, len(text), ends)
+    return ends
+
+def _split_long(text: str, start: int, end: int, ends: List[int]) -> None:
+    while end - start > SEGMENT_CHARS:
+        cut = text.rfind(" ", start + 1, start + SEGMENT_CHARS)
+        cut = cut + 1 if cut > start else start + SEGMENT_CHARS
+        ends.append(cut)
+        start = cut
+    ends.append(end)
+
+def encode_offsets(ends: Sequence[int]) -> str:
+    return ",".join(map(str, ends))
+
+def decode_offsets(value: Optional[str], text: str) -> List[int]:
+    """Offsets stored at index time, or freshly computed for chunks indexed before they were stored."""
+    if value:
+        try:
+            ends = [int(x) for x in value.split(",")]
+            if ends and ends[-1] == len(text):
+                return ends
+        except ValueError:
+            pass
+    return sentence_ends(text)
+
+def query_terms(query: str) -> List[str]:
+    terms = [w for w in _WORD.findall(query.lower()) if w not in _STOPWORDS and (len(w) > 1 or w.isdigit())]
+    return list(dict.fromkeys(terms))
+
+def best_passage(text: str, terms: Sequence[str], max_chars: int,
+                 ends: Optional[List[int]] = None) -> Tuple[str, List[List[int]]]:
+    """
+    (passage, highlights): the consecutive segments of text within max_chars that
+    cover the most distinct query terms (then the most term hits; earliest wins
+    ties), and the [start, end) spans of the terms inside it.
+    """
+    if ends is None:
+        ends = sentence_ends(text)
+    if not text:
+        return "", []
+    term_set = set(terms)
+    starts = [0] + ends[:-1]
+    seg_terms = []
+    for s, e in zip(starts, ends):
+        words = [w for w in _WORD.findall(text[s:e].lower()) if w in term_set]
+        seg_terms.append(words)
+    best, best_score = (0, 0), None
+    counts: dict = {}
+    hits = 0
+    lo = 0
+    for hi in range(len(ends)):
+        for w in seg_terms[hi]:
+            counts[w] = counts.get(w, 0) + 1
+        hits += len(seg_terms[hi])
+        while lo < hi and ends[hi] - starts[lo] > max_chars:
+            for w in seg_terms[lo]:
+                counts[w] -= 1
+                if not counts[w]:
+                    del counts[w]
+            hits -= len(seg_terms[lo])
+            lo += 1
+        score = (len(counts), hits)
+        if best_score is None or score > best_score:
+            best, best_score = (lo, hi), score
+    p_start, p_end = starts[best[0]], ends[best[1]]
+    if p_end - p_start > max_chars:              # one segment over budget (a very long word run)
+        p_end = p_start + max_chars
+    passage = text[p_start:p_end].strip()
+    highlights = []
+    if term_set:
+        for m in _WORD.finditer(passage):
+            if m.group(0).lower() in term_set:
+                highlights.append([m.start(), m.end()])
+    return passage, highlights
@@ -0,0 +1,110 @@
+"""
+Second-stage reranking for the DeepSearcher /query pipeline.
+
+A reranker scores (query, result row) pairs; rows are the dicts vector_search
+returns (title, relevantText, date, score, ...). Two are provided:
+  keyword        — the original heuristic: first-stage score plus a bonus per
+                   query word found in the text (+1) or title (+2), +2 from 2020 on
+  cross-encoder  — a local cross-encoder (pymilvus BGERerankFunction, default
+                   BAAI/bge-reranker-base) reading query and passage together
+build_reranker() picks one from its name and falls back to keyword when the
+model cannot be loaded.
+
+rerank() runs a reranker over a candidate list in batches, best first-stage
+candidates first, and does not start a batch that the last batch's duration
+says would overrun the time budget; candidates it did not reach keep their
+first-stage order (and score) behind the scored ones. Model scores are cached
+per (reranker, query, passage); keyword scores depend on the first-stage score
+and are cheap, so they are not.
+"""
+
+import re, time, hashlib
+from typing import Dict, List, Optional, Sequence
+
+PASSAGE_CHARS = 2000        # cross-encoders truncate at ~512 tokens anyway
+
+class KeywordReranker:
+    name = "keyword"
+    is_model = False
+
+    def score(self, query: str, rows: Sequence[Dict]) -> List[float]:
+        query_kws = set(re.findall(r'\w+', query.lower()))
+        out = []
+        for r in rows:
+            text, title = r.get("relevantText", "").lower(), r.get("title", "").lower()
+            bonus = sum(1 for kw in query_kws if kw in text)
+            bonus += sum(2 for kw in query_kws if kw in title)
+            if str(r.get("date", "")).isdigit() and int(r["date"]) >= 2020:
+                bonus += 2
+            out.append(round(r["score"] + bonus, 2))
+        return out
+
+class CrossEncoderReranker:
+    is_model = True
+
+    def __init__(self, model_name: str = "BAAI/bge-reranker-base"):
+        from pymilvus.model.reranker import BGERerankFunction
+        self.name = model_name
+        self._fn = BGERerankFunction(model_name=model_name, device="cpu")
+
+    def score(self, query: str, rows: Sequence[Dict]) -> List[float]:
+        passages = [f"{r.get('title', '')}\n{r.get('relevantText', '')[:PASSAGE_CHARS]}" for r in rows]
+        results = self._fn(query, passages, top_k=len(passages))
+        scores = [0.0] * len(passages)
+        for res in results:
+            scores[res.index] = round(float(res.score) * 100, 2)
+        return scores
+
+def build_reranker(kind: str, model_name: Optional[str] = None):
+    """'keyword' or 'cross-encoder'; a model that cannot be loaded falls back to keyword."""
+    if kind == "cross-encoder":
+        try:
+            reranker = CrossEncoderReranker(model_name) if model_name else CrossEncoderReranker()
+            print(f"[DeepSearcher] Using cross-encoder reranker {reranker.name}")
+            return reranker
+        except Exception as e:
+            print(f"[DeepSearcher] Cross-encoder reranker unavailable ({e}), using keyword reranking")
+    elif kind != "keyword":
+        print(f"[DeepSearcher] Unknown reranker {kind!r}, using keyword reranking")
+    return KeywordReranker()
+
+def _cache_key(reranker, query: str, row: Dict) -> tuple:
+    digest = hashlib.blake2b(row.get("relevantText", "").encode("utf-8"), digest_size=8).hexdigest()
+    return (reranker.name, query, row.get("relativePath", ""), digest)
+
+def rerank(reranker, query: str, rows: List[Dict], budget_s: Optional[float] = None, batch_size: int = 16,
+           cache=None) -> Dict:
+    """
+    Reorder rows (best first-stage score first) by reranker score. Returns
+    {"rows": reordered rows, "scored": n, "cached": n, "exhausted": bool}; scored
+    rows get their reranker score as "score".
+    """
+    rows = sorted(rows, key=lambda r: -r["score"])
+    scores: List[Optional[float]] = [None] * len(rows)
+    cache = cache if reranker.is_model else None
+    keys = [_cache_key(reranker, query, r) for r in rows] if cache is not None else None
+    cached = 0
+    if cache is not None:
+        for i, key in enumerate(keys):
+            scores[i] = cache.get(key)
+            cached += scores[i] is not None
+    todo = [i for i, s in enumerate(scores) if s is None]
+    deadline = None if budget_s is None else time.perf_counter() + budget_s
+    exhausted, last = False, 0.0
+    for start in range(0, len(todo), batch_size):
+        t0 = time.perf_counter()
+        if deadline is not None and t0 + last > deadline:
+            exhausted = True
+            break
+        idx = todo[start:start + batch_size]
+        batch_scores = reranker.score(query, [rows[i] for i in idx])
+        last = time.perf_counter() - t0
+        for i, s in zip(idx, batch_scores):
+            scores[i] = s
+            if cache is not None:
+                cache.set(keys[i], s, tags=())
+    scored = [i for i, s in enumerate(scores) if s is not None]
+    order = sorted(scored, key=lambda i: -scores[i]) + [i for i, s in enumerate(scores) if s is None]
+    for i in scored:
+        rows[i]["score"] = scores[i]
+    return {"rows": [rows[i] for i in order], "scored": len(scored), "cached": cached, "exhausted": exhausted}
@@ -3,39 +3,135 @@ JusConsultus DeepSearcher + ChromaDB sidecar service.
 
 Exposes a FastAPI REST interface consumed by the Next.js app:
   POST /search           — vector similarity search
+  POST /search/batch     — several searches in one round-trip
   POST /query            — full agentic DeepSearcher pipeline
+  POST /query/stream     — same pipeline, streamed as Server-Sent Events
   POST /kag/lookup       — exact entity / law-number lookup
-  POST /index/batch      — bulk-index HTML legal documents
-  GET  /health           — liveness check
+  POST /index/batch      — queue a bulk-index job over HTML legal documents
+  GET  /index/jobs/{id}  — job progress (files/s, chunks/s, ETA, errors)
+  POST /index/jobs/{id}/pause|resume|cancel
+  GET  /health           — liveness (plus model load state)
+  GET  /health/ready     — readiness: 503 until the model is loaded and warmed up
+  GET  /metrics          — Prometheus metrics (per-stage latency histograms, in-flight, caches, LLM errors)
   GET  /stats            — collection statistics
 
+/search and /query take categories, subcategories and a year_from/year_to range
+(any source_filters are mapped to categories); filters apply before ranking.
+Set DEEPSEARCHER_EMBED_WORKERS=N to run the embedding model in N worker processes
+(embed_pool.py) that micro-batch concurrent requests into shared forward passes.
+Set DEEPSEARCHER_VECTOR_STORE=compact to keep vectors in int8/fp16 memory-mapped
+files (compact_store.py) instead of ChromaDB's in-memory HNSW index.
+DEEPSEARCHER_DATA_DIR and DEEPSEARCHER_LEGAL_DB_ROOT relocate the sidecar's state
+and the corpus it indexes (bench.py retrieval runs against a throwaway pair).
+
+The sidecar is single-process: run `python server.py` (or uvicorn without
+--workers). The index writer, job runner and lexical index live in the process,
+so a second server on the same data directory refuses to start; scale with
+DEEPSEARCHER_EMBED_WORKERS and DEEPSEARCHER_QUERY_CONCURRENCY instead.
+
 Depends on:
   pip install chromadb fastapi uvicorn beautifulsoup4
 """
 
-import os, re, json, time, hashlib
+import os, re, json, math, time, shutil, hashlib, bisect, sqlite3, threading, asyncio
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal, NamedTuple, Tuple, Union
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from bs4 import BeautifulSoup
-import chromadb
+import httpx
+import numpy as np
+
+from metrics import (REGISTRY, Counter, Gauge, Histogram, MetricsMiddleware, current_timings, observe_stage, span)
+from embed_pool import EmbeddingPool, EmbeddingQueueFull
 
 # ─── Config ────────────────────────────────────────────────────────────────────
-CHROMA_DB_PATH = str(Path(__file__).parent / "chroma_db")
+# Everything the sidecar writes lives under DATA_DIR (default: next to this file)
+DATA_DIR       = Path(os.environ.get("DEEPSEARCHER_DATA_DIR") or Path(__file__).parent)
+CHROMA_DB_PATH = str(DATA_DIR / "chroma_db")
 COLLECTION     = "legal_documents"
 EMBED_DIM      = 768            # will be overridden by model dim
-LEGAL_DB_ROOT  = str(Path(__file__).parent.parent.parent / "data" / "legal-database")
+LEGAL_DB_ROOT  = os.environ.get("DEEPSEARCHER_LEGAL_DB_ROOT") or str(Path(__file__).parent.parent.parent / "data" / "legal-database")
+STATE_DB_PATH  = str(DATA_DIR / "deepsearcher_state.db")
+EMBED_CACHE_DIR = str(DATA_DIR / "embed_cache")
+LEXICAL_INDEX_DIR = str(DATA_DIR / "lexical_index")
+COMPACT_STORE_DIR = str(DATA_DIR / "compact_store")
+
+# "chroma" keeps vectors in the collection's HNSW index; "compact" keeps them in
+# int8 + fp16 memory-mapped files (compact_store.py) and the collection only holds
+# documents and metadata.
+VECTOR_STORE   = os.environ.get("DEEPSEARCHER_VECTOR_STORE", "chroma")
+COMPACT_RERANK = int(os.environ.get("DEEPSEARCHER_COMPACT_RERANK", "300"))
+# The compact store rewrites its files without deleted rows once they exceed this share
+COMPACT_TOMBSTONE_RATIO = float(os.environ.get("DEEPSEARCHER_COMPACT_TOMBSTONE_RATIO", "0.25"))
+
+# DEEPSEARCHER_EMBED_WORKERS > 0 runs the model in that many worker processes
+# (embed_pool.py) instead of in the server process; concurrent requests are
+# micro-batched into shared forward passes. At most EMBED_QUEUE_MAX texts wait for
+# a worker; a query that cannot get into the queue within EMBED_QUEUE_TIMEOUT
+# seconds is answered 503.
+EMBED_WORKERS       = int(os.environ.get("DEEPSEARCHER_EMBED_WORKERS", "0"))
+EMBED_POOL_BATCH    = int(os.environ.get("DEEPSEARCHER_EMBED_POOL_BATCH", "64"))
+EMBED_POOL_WAIT_MS  = float(os.environ.get("DEEPSEARCHER_EMBED_POOL_WAIT_MS", "5"))
+EMBED_QUEUE_MAX     = int(os.environ.get("DEEPSEARCHER_EMBED_QUEUE_MAX", "4096"))
+EMBED_QUEUE_TIMEOUT = float(os.environ.get("DEEPSEARCHER_EMBED_QUEUE_TIMEOUT", "10"))
+# Model vectors are cached on disk (embed_cache.py) up to EMBED_CACHE_MB; past that
+# the least recently used half is dropped.
+EMBED_CACHE_MB      = float(os.environ.get("DEEPSEARCHER_EMBED_CACHE_MB", "2048"))
+
+# Filtered dense search on ChromaDB: a filter matching at most PARTITION_MAX_ROWS
+# chunks is materialized as an exact partition (partitions.py) and brute-forced;
+# larger ones use the collection's filtered HNSW search.
+# Materialized partitions stay cached up to PARTITION_CACHE_MB in total (one is up
+# to PARTITION_MAX_ROWS × dim float32: ~80 MB at 1024 dims), least recently used out first.
+PARTITION_MAX_ROWS   = int(os.environ.get("DEEPSEARCHER_PARTITION_MAX_ROWS", "20000"))
+PARTITION_CACHE_MB   = float(os.environ.get("DEEPSEARCHER_PARTITION_CACHE_MB", "256"))
+
+# /query step 3. "keyword" is the original bonus heuristic; "cross-encoder" scores
+# the top RERANK_CANDIDATES against the query with a local model (rerank.py), in
+# RERANK_BATCH batches for at most RERANK_BUDGET_MS, and then only the best
+# RERANK_SOURCES go to the LLM.
+RERANKER          = os.environ.get("DEEPSEARCHER_RERANKER", "keyword")
+RERANK_MODEL      = os.environ.get("DEEPSEARCHER_RERANK_MODEL") or None
+RERANK_CANDIDATES = int(os.environ.get("DEEPSEARCHER_RERANK_CANDIDATES", "40"))
+RERANK_BATCH      = int(os.environ.get("DEEPSEARCHER_RERANK_BATCH", "16"))
+RERANK_BUDGET_MS  = float(os.environ.get("DEEPSEARCHER_RERANK_BUDGET_MS", "250"))
+RERANK_SOURCES    = int(os.environ.get("DEEPSEARCHER_RERANK_SOURCES", "5"))
+
+# Document scores from their chunks: "max" (best chunk), "sum" or "decay" (best
+# DOC_AGGREGATION_CHUNKS chunks, the i-th weighted DOC_AGGREGATION_DECAY**i). Results
+# carry the best chunk's PASSAGE_CHARS-long passage around the query terms
+# (passages.py, from sentence offsets stored at index time) rather than the chunk.
+DOC_AGGREGATION        = os.environ.get("DEEPSEARCHER_DOC_AGGREGATION", "max")
+DOC_AGGREGATION_CHUNKS = int(os.environ.get("DEEPSEARCHER_DOC_AGGREGATION_CHUNKS", "3"))
+DOC_AGGREGATION_DECAY  = float(os.environ.get("DEEPSEARCHER_DOC_AGGREGATION_DECAY", "0.5"))
+PASSAGE_CHARS          = int(os.environ.get("DEEPSEARCHER_PASSAGE_CHARS", "600"))
+
+# /query adds CITATION_BOOST × ln(1 + documents citing it) to each source's score,
+# and CITATION_MATCH_BOOST to the documents a citation in the query names.
+CITATION_BOOST       = float(os.environ.get("DEEPSEARCHER_CITATION_BOOST", "2"))
+CITATION_MATCH_BOOST = float(os.environ.get("DEEPSEARCHER_CITATION_MATCH_BOOST", "10"))
+
+# Collection snapshots (snapshot.py): /snapshots endpoints read and write under
+# SNAPSHOT_DIR. A sidecar started with DEEPSEARCHER_SNAPSHOT_IMPORT and an empty
+# collection loads that snapshot before reporting ready.
+SNAPSHOT_DIR    = Path(os.environ.get("DEEPSEARCHER_SNAPSHOT_DIR") or DATA_DIR / "snapshots")
+SNAPSHOT_IMPORT = os.environ.get("DEEPSEARCHER_SNAPSHOT_IMPORT") or None
+
+HASH_EMBED_BIGRAMS   = os.environ.get("DEEPSEARCHER_HASH_BIGRAMS", "") == "1"
+HASH_EMBED_SUBLINEAR = os.environ.get("DEEPSEARCHER_HASH_SUBLINEAR", "") == "1"
 
 LLM_API_KEY    = os.environ.get("LLM_API_KEY", "")
 LLM_BASE_URL   = os.environ.get("LLM_BASE_URL", "https://api.deepseek.com")
 LLM_MODEL      = os.environ.get("LLM_MODEL", "deepseek-chat")
+LLM_MAX_CONNECTIONS = int(os.environ.get("DEEPSEARCHER_LLM_CONNECTIONS", "32"))
+QUERY_CONCURRENCY   = int(os.environ.get("DEEPSEARCHER_QUERY_CONCURRENCY", "32"))
 
 # ChromaDB persistent client
-_chroma_client: Optional[chromadb.PersistentClient] = None
+_chroma_client = None      # chromadb.PersistentClient, imported on first use (it is slow to import)
 _collection = None
 
 # ─── Embedding ─────────────────────────────────────────────────────────────────
@@ -45,40 +141,245 @@ def _build_embedding_fn():
         from pymilvus.model.hybrid import BGEM3EmbeddingFunction
         ef = BGEM3EmbeddingFunction(model_name="BAAI/bge-m3", use_fp16=False, device="cpu")
         print("[DeepSearcher] Using BAAI/bge-m3 embeddings (dim=1024)")
-        return ef, 1024
+        return ef, 1024, "BAAI/bge-m3"
     except Exception as e:
         print(f"[DeepSearcher] BGE-M3 unavailable ({e}), falling back to bge-small")
     try:
         from pymilvus.model.dense import SentenceTransformerEmbeddingFunction
         ef = SentenceTransformerEmbeddingFunction(model_name="BAAI/bge-small-en-v1.5", device="cpu")
         print("[DeepSearcher] Using bge-small-en-v1.5 embeddings (dim=384)")
-        return ef, 384
+        return ef, 384, "BAAI/bge-small-en-v1.5"
     except Exception as e2:
         print(f"[DeepSearcher] SentenceTransformer unavailable ({e2}), using fallback TF-IDF embed")
-        return None, 256
-
-_embed_fn, _embed_dim = _build_embedding_fn()
+        return None, 256, _hash_model_name()
+
+def _hash_model_name() -> str:
+    """v1 = the original unigram/raw-count hashing; other feature sets are a new vector space."""
+    if not (HASH_EMBED_BIGRAMS or HASH_EMBED_SUBLINEAR):
+        return "hash-tfidf"
+    return "hash-tfidf-v2" + ("-bigram" if HASH_EMBED_BIGRAMS else "") + ("-sublinear" if HASH_EMBED_SUBLINEAR else "")
+
+# The model is loaded on first use, not at import: importing this module (parse
+# workers, scripts, tests) stays cheap, and the server loads it in the background
+# during startup (see _load_and_warm). The collection name depends on the model,
+# so COLLECTION and DENSE_COLLECTION are only final once ensure_model() has run.
+_embed_fn = None
+_embed_dim: Optional[int] = None
+_embed_model: Optional[str] = None
+_model_lock = threading.Lock()
+_COLLECTION_BASE = COLLECTION
+DENSE_COLLECTION = COLLECTION
+
+def ensure_model():
+    """Load the embedding model if it is not loaded yet (blocking). Returns (fn, dim, name)."""
+    global _embed_fn, _embed_dim, _embed_model, COLLECTION, DENSE_COLLECTION
+    if _embed_model is None:
+        with _model_lock:
+            if _embed_model is None:
+                with span("model_load"):
+                    if EMBED_WORKERS > 0:
+                        fn, dim, name = _start_embed_pool()
+                    else:
+                        fn, dim, name = _build_embedding_fn()
+                dense = _COLLECTION_BASE
+                if fn is None and name != "hash-tfidf":
+                    dense = f"{dense}_{name.replace('-', '_')}"
+                DENSE_COLLECTION = dense
+                COLLECTION = f"{dense}_compact" if VECTOR_STORE == "compact" else dense
+                _embed_fn, _embed_dim = fn, dim
+                _embed_model = name         # published last: readers check it without the lock
+    return _embed_fn, _embed_dim, _embed_model
+
+# ─── Embedding worker pool ─────────────────────────────────────────────────────
+# Each worker process imports this module and loads its own model through
+# _pool_worker_init; the server process then only holds the pool. With the
+# hashing fallback the workers run _hash_embed, so _embed_fn stays None and
+# _embed_pool is what embed_texts submits to.
+_embed_pool: Optional[EmbeddingPool] = None
+
+EMBED_POOL_BATCHES = REGISTRY.register(Histogram(
+    "deepsearcher_embed_pool_batch_texts", "Texts per forward pass sent to an embedding worker.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)))
+
+def _pool_worker_init(threads: int):
+    global _embed_fn, _embed_dim, _embed_model
+    # Split the cores between workers before torch is imported and sizes its thread pool
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    _embed_fn, _embed_dim, _embed_model = _build_embedding_fn()
+
+def _pool_worker_info():
+    return _embed_fn is not None, _embed_dim, _embed_model
+
+def _pool_worker_embed(texts: List[str]) -> np.ndarray:
+    if _embed_fn is None:
+        return np.asarray(_hash_embed(texts, _embed_dim), dtype=np.float32)
+    return np.asarray(_model_embed(texts), dtype=np.float32)
+
+def _on_pool_batch(texts: int, waited: float) -> None:
+    EMBED_POOL_BATCHES.observe(texts)
+    observe_stage("embed_queue_wait", waited)
+
+def _start_embed_pool():
+    global _embed_pool
+    threads = max(1, (os.cpu_count() or 1) // EMBED_WORKERS)
+    _embed_pool = EmbeddingPool(EMBED_WORKERS, _pool_worker_init, _pool_worker_embed, _pool_worker_info,
+                                init_args=(threads,), max_batch=EMBED_POOL_BATCH, max_wait_ms=EMBED_POOL_WAIT_MS,
+                                max_pending=EMBED_QUEUE_MAX, on_batch=_on_pool_batch)
+    has_model, dim, name = _embed_pool.model_info()
+    print(f"[DeepSearcher] Embedding pool: {EMBED_WORKERS} worker(s) × {threads} thread(s), "
+          f"batches of up to {EMBED_POOL_BATCH} within {EMBED_POOL_WAIT_MS:g} ms")
+    return (_embed_pool if has_model else None), dim, name
+
+_embed_cache = None
+
+def _get_embed_cache():
+    global _embed_cache
+    ensure_model()
+    if _embed_cache is None:
+        from embed_cache import EmbeddingCache
+        _embed_cache = EmbeddingCache(EMBED_CACHE_DIR, _embed_model, _embed_dim,
+                                      max_bytes=int(EMBED_CACHE_MB * 1024 * 1024))
+    return _embed_cache
+
+# Byte table mapping ASCII non-word characters to spaces (re's \w for ASCII is
+# [A-Za-z0-9_]) and folding A-Z to lower case; bytes >= 0x80 are left alone because
+# non-ASCII texts are lower-cased and stripped of non-word characters beforehand.
+_HASH_TRANSLATE = bytes(c if c >= 128 else ord(chr(c).lower()) if chr(c).isalnum() or c == 95 else 32
+                        for c in range(256))
+_NON_WORD_UNICODE = re.compile(r'[^\w\x00-\x7f]')
+_HASH_P = np.uint64(1099511628211)                       # odd, so invertible mod 2**64
+_hash_pow = np.ones(1, dtype=np.uint64)                  # P**i and P**-i, grown on demand
+_hash_inv = np.ones(1, dtype=np.uint64)
+# Token hash → md5 bucket memo per dim: sorted token hashes and their buckets,
+# swapped in whole so lookups need no lock
+_HASH_MEMO_MAX = 1 << 20
+_HASH_MEMO_EMPTY = (np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.int64))
+_hash_memo: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+_hash_lock = threading.Lock()
+
+def _hash_powers(n: int):
+    global _hash_pow, _hash_inv
+    if len(_hash_pow) < n:
+        size = max(n, 2 * len(_hash_pow))
+        inv_p = np.uint64(pow(int(_HASH_P), -1, 2**64))
+        one = np.ones(1, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            _hash_pow = np.concatenate((one, np.cumprod(np.full(size - 1, _HASH_P, dtype=np.uint64))))
+            _hash_inv = np.concatenate((one, np.cumprod(np.full(size - 1, inv_p, dtype=np.uint64))))
+    return _hash_pow[:n], _hash_inv[:n]
+
+def _sorted_find(keys: np.ndarray, values: np.ndarray):
+    """(found mask, insertion position) of each value in the sorted array keys."""
+    pos = np.searchsorted(keys, values)
+    found = pos < len(keys)
+    found[found] = keys[pos[found]] == values[found]
+    return found, pos
+
+def _hash_lookup(hashes: np.ndarray, feature, dim: int) -> np.ndarray:
+    """md5 bucket per feature hash; feature(i) gives feature i's bytes and only runs for unseen hashes."""
+    order = np.argsort(hashes)              # sorted needles keep the binary searches cache-friendly
+    hashes = hashes[order]
+    keys, values = _hash_memo.get(dim, _HASH_MEMO_EMPTY)
+    hit, pos = _sorted_find(keys, hashes)
+    buckets = np.zeros(len(hashes), dtype=np.int64)
+    buckets[hit] = values[pos[hit]]
+    miss = np.flatnonzero(~hit)
+    if len(miss):
+        new, first, inverse = np.unique(hashes[miss], return_index=True, return_inverse=True)
+        found = np.array([int(hashlib.md5(feature(i)).hexdigest(), 16) % dim for i in order[miss[first]].tolist()],
+                         dtype=np.int64)
+        buckets[miss] = found[inverse.ravel()]
+        with _hash_lock:
+            keys, values = _hash_memo.get(dim, _HASH_MEMO_EMPTY)   # another batch may have added some
+            known, at = _sorted_find(keys, new)
+            if len(keys) + len(new) <= _HASH_MEMO_MAX:
+                _hash_memo[dim] = (np.insert(keys, at[~known], new[~known]), np.insert(values, at[~known], found[~known]))
+    out = np.empty_like(buckets)
+    out[order] = buckets
+    return out
+
+def _hash_embed(texts: List[str], dim: int = 256) -> List[List[float]]:
+    """
+    Fallback: deterministic feature-hashing vectors, computed for the whole batch
+    with NumPy. The batch is lower-cased and joined into one UTF-8 buffer; token
+    boundaries come from array ops and each token gets a 64-bit polynomial hash
+    from one prefix sum. The batch's distinct hashes are looked up in a sorted
+    table of md5 buckets, so Python only runs md5 on unseen vocabulary. With
+    default settings the output matches the original per-text loop (its
+    log(1 + len) factor cancels under normalisation). Optional bigrams and
+    sublinear TF (1 + log tf) produce a separate, versioned vector space.
+    """
+    n = len(texts)
+    parts = [t if t.isascii() else _NON_WORD_UNICODE.sub(' ', t.lower()) for t in texts]
+    data = (" " + " ".join(parts) + " ").encode("utf-8").translate(_HASH_TRANSLATE)
+    out = np.zeros((n, dim), dtype=np.float64)
+
+    buf = np.frombuffer(data, dtype=np.uint8)
+    word = buf != 32
+    edges = np.flatnonzero(word[1:] != word[:-1]) + 1
+    starts, ends = edges[0::2], edges[1::2]
+    if len(starts):
+        lengths = (ends - starts).astype(np.uint64)
+        pw, inv = _hash_powers(len(buf) + 1)
+        with np.errstate(over="ignore"):
+            prefix = np.concatenate((np.zeros(1, np.uint64), np.cumsum(buf * pw[:len(buf)], dtype=np.uint64)))
+            hashes = (prefix[ends] - prefix[starts]) * inv[starts] + lengths * np.uint64(0x9E3779B97F4A7C15)
+        text_ends = np.cumsum([len(p) if p.isascii() else len(p.encode("utf-8")) for p in parts]) + np.arange(1, n + 1)
+        rows = np.searchsorted(text_ends, starts, side="right")
+        pair_left = np.zeros(0, dtype=np.int64)
+        if HASH_EMBED_BIGRAMS:
+            pair_left = np.flatnonzero(rows[1:] == rows[:-1])
+            with np.errstate(over="ignore"):
+                pair = hashes[pair_left] * np.uint64(0x100000001B3) + hashes[pair_left + 1] + np.uint64(1)
+            hashes = np.concatenate((hashes, pair))
+            rows = np.concatenate((rows, rows[pair_left]))
+        def feature(i: int) -> bytes:           # a token, or two tokens for a bigram
+            if i < len(starts):
+                return data[starts[i]:ends[i]]
+            k = pair_left[i - len(starts)]
+            return data[starts[k]:ends[k]] + b" " + data[starts[k + 1]:ends[k + 1]]
+        buckets = _hash_lookup(hashes, feature, dim)
+        if HASH_EMBED_SUBLINEAR:
+            uniq, feat = np.unique(hashes, return_inverse=True)
+            _, first, counts = np.unique(rows * len(uniq) + feat.ravel(), return_index=True, return_counts=True)
+            cells = rows[first] * dim + buckets[first]
+            weights = 1.0 + np.log(counts)
+        else:
+            cells, weights = rows * dim + buckets, None
+        out = np.bincount(cells, weights=weights, minlength=n * dim).reshape(n, dim).astype(np.float64)
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (out / norms).tolist()
 
-def embed_texts(texts: List[str]) -> List[List[float]]:
-    """Embed a list of texts → list of float vectors."""
+def embed_texts(texts: List[str], timeout: Optional[float] = None) -> List[List[float]]:
+    """
+    Embed a list of texts → list of float vectors.
+    Model vectors go through the content-addressed embedding cache; only
+    distinct cache misses reach the model. With a worker pool, `timeout` bounds
+    the wait for queue space (EmbeddingQueueFull after that); None waits.
+    """
+    ensure_model()
     if _embed_fn is None:
-        # Fallback: deterministic TF-IDF style 256-dim vector
-        import math
-        results = []
-        for text in texts:
-            words = re.findall(r'\w+', text.lower())
-            freq: Dict[str, int] = {}
-            for w in words:
-                freq[w] = freq.get(w, 0) + 1
-            vec = [0.0] * 256
-            for w, cnt in freq.items():
-                h = int(hashlib.md5(w.encode()).hexdigest(), 16) % 256
-                vec[h] += cnt * math.log(1 + len(words))
-            norm = math.sqrt(sum(v*v for v in vec)) or 1.0
-            results.append([v/norm for v in vec])
-        return results
-
-    # Use real embedding function
+        # The hashing fallback is cheaper than a cache lookup
+        if _embed_pool is not None:
+            return _embed_pool.embed(texts, timeout).tolist()
+        return _hash_embed(texts)
+
+    cache = _get_embed_cache()
+    cached = cache.get_many(texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+    fresh: Dict[str, List[float]] = {}
+    if missing:
+        if _embed_pool is not None:
+            vectors = _embed_pool.embed(missing, timeout).tolist()
+        else:
+            vectors = _model_embed(missing)
+        # As stored: a text gets the same vector whether it hit the cache or not
+        fresh = dict(zip(missing, cache.put_many(missing, vectors)))
+    return [(v if v is not None else fresh[t]).tolist() for t, v in zip(texts, cached)]
+
+def _model_embed(texts: List[str]) -> List[List[float]]:
     if hasattr(_embed_fn, 'encode_documents'):
         out = _embed_fn.encode_documents(texts)
         # BGEM3 returns dict with 'dense' key
@@ -90,23 +391,200 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
         return [v.tolist() if hasattr(v, 'tolist') else list(v) for v in out]
 
 # ─── ChromaDB helpers ─────────────────────────────────────────────────────────
+_collection_lock = threading.Lock()
+
 def get_collection():
     global _chroma_client, _collection
     if _collection is None:
-        _chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
-        _collection = _chroma_client.get_or_create_collection(
-            name=COLLECTION,
-            metadata={"hnsw:space": "cosine"},
-        )
+        # First use can race between the startup thread and an index job; chromadb's
+        # client construction is not safe to run twice at once
+        with _collection_lock:
+            if _collection is None:
+                import chromadb
+                ensure_model()
+                _chroma_client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+                _collection = _chroma_client.get_or_create_collection(
+                    name=COLLECTION,
+                    metadata={"hnsw:space": "cosine"},
+                )
     return _collection
 
+_compact_store = None
+
+def get_compact_store():
+    global _compact_store
+    ensure_model()
+    if _compact_store is None:
+        from compact_store import CompactVectorStore
+        _compact_store = CompactVectorStore(str(_compact_store_dir()), _embed_dim, rerank=COMPACT_RERANK,
+                                            compact_ratio=COMPACT_TOMBSTONE_RATIO)
+    return _compact_store
+
+def _compact_store_dir() -> Path:
+    return Path(COMPACT_STORE_DIR) / f"{re.sub(r'[^A-Za-z0-9_.-]+', '_', _embed_model)}_{_embed_dim}"
+
+def _index_signature() -> str:
+    """What the manifest records a document as indexed with; switching vector store forces a re-index."""
+    ensure_model()
+    return _embed_model + ("+compact" if VECTOR_STORE == "compact" else "")
+
+def store_chunks(col, ids: List[str], embeddings, docs: List[str], metas: List[Dict], compact=None) -> None:
+    """col.upsert, routing the vectors to the compact store (or `compact`) when it is enabled."""
+    if VECTOR_STORE == "compact":
+        (compact or get_compact_store()).upsert(ids, embeddings, [m["category"] for m in metas], [m["year"] for m in metas],
+                                   [m.get("subcategory", "") for m in metas])
+        embeddings = [[1.0]] * len(ids)     # placeholder: the collection is only a document store here
+    col.upsert(ids=ids, embeddings=embeddings, documents=docs, metadatas=metas)
+
+def migrate_to_compact_store(page: int = 2000) -> int:
+    """
+    Copy vectors, documents and metadata from the dense collection into the compact
+    store, then mark their manifest rows as compact-indexed so nothing is re-embedded.
+    Runs on startup when VECTOR_STORE is "compact"; returns chunks copied.
+    """
+    if VECTOR_STORE != "compact":
+        return 0
+    get_collection()
+    try:
+        dense = _chroma_client.get_collection(DENSE_COLLECTION)
+    except Exception:
+        return 0
+    with _writer_lock:
+        conn = _state_db()
+        try:
+            _manifest_schema(conn)
+            pending = conn.execute("SELECT 1 FROM manifest WHERE embed_model = ? LIMIT 1", (_embed_model,)).fetchone()
+            if dense.count() == 0 or (get_compact_store().count and not pending):
+                return 0
+            col, copied, offset = get_collection(), 0, 0
+            print(f"[DeepSearcher] Migrating '{DENSE_COLLECTION}' into the compact vector store...")
+            while True:
+                batch = dense.get(include=["embeddings", "documents", "metadatas"], limit=page, offset=offset)
+                if not batch["ids"]:
+                    break
+                store_chunks(col, batch["ids"], batch["embeddings"], batch["documents"], batch["metadatas"])
+                copied += len(batch["ids"])
+                offset += len(batch["ids"])
+            with conn:
+                conn.execute("UPDATE manifest SET embed_model = ? WHERE embed_model = ?", (_index_signature(), _embed_model))
+        finally:
+            conn.close()
+    print(f"[DeepSearcher] Compact store migration done: {copied} chunks")
+    return copied
+
+def backfill_compact_subcategories(page: int = 5000) -> int:
+    """Copy subcategories from the collection's metadata into a compact store written before it tracked them."""
+    store = get_compact_store()
+    if not store.subcategories_pending:
+        return 0
+    col, done, offset = get_collection(), 0, 0
+    with _writer_lock:
+        while True:
+            batch = col.get(include=["metadatas"], limit=page, offset=offset)
+            if not batch["ids"]:
+                break
+            done += store.set_subcategories(batch["ids"], [m.get("subcategory", "") for m in batch["metadatas"]])
+            offset += len(batch["ids"])
+        store.set_subcategories([], [], done=True)
+    print(f"[DeepSearcher] Compact store subcategories backfilled: {done} chunks")
+    return done
+
+def _prepare_compact_store() -> None:
+    migrate_to_compact_store()
+    backfill_compact_subcategories()
+
 def ensure_collection(dim: int = None):
     """Ensure the ChromaDB collection exists."""
     get_collection()
     print(f"[DeepSearcher] ChromaDB collection '{COLLECTION}' ready at {CHROMA_DB_PATH}")
 
+# ─── Lexical (BM25) index ──────────────────────────────────────────────────────
+_lexical = None
+_lexical_lock = threading.Lock()
+
+def get_lexical_index():
+    global _lexical
+    with _lexical_lock:
+        if _lexical is None:
+            from lexical_index import LexicalIndex
+            _lexical = LexicalIndex(LEXICAL_INDEX_DIR)
+    return _lexical
+
+def rebuild_lexical_index(page: int = 5000) -> int:
+    """(Re)build the BM25 index from the documents already stored in ChromaDB."""
+    col, lex = get_collection(), get_lexical_index()
+    lex.clear()
+    total, offset = 0, 0
+    while True:
+        batch = col.get(include=["documents", "metadatas"], limit=page, offset=offset)
+        ids = batch.get("ids") or []
+        if not ids:
+            break
+        metas = batch["metadatas"]
+        lex.add(ids, batch["documents"], [m.get("category", "") for m in metas], [m.get("year", "") for m in metas])
+        total += len(ids)
+        offset += len(ids)
+    lex.flush()
+    print(f"[DeepSearcher] Lexical index rebuilt: {total} chunks")
+    return total
+
+def _ensure_lexical_index():
+    # Chunks still buffered when a run died are in ChromaDB but not the index
+    with _writer_lock:
+        if get_lexical_index().doc_count != get_collection().count():
+            rebuild_lexical_index()
+
+# ─── Data directory lock ───────────────────────────────────────────────────────
+# A running sidecar holds an exclusive lock on DATA_DIR/sidecar.lock (released by
+# the OS when the process exits). Writes are only serialised inside one process
+# (_writer_lock, the job runner), so this is what keeps a second server — e.g. a
+# uvicorn --workers sibling — and snapshot.py export/import off a live directory.
+_data_dir_lock = None
+
+def lock_data_dir() -> bool:
+    """Take the data directory's lock for this process; False when another process holds it."""
+    global _data_dir_lock
+    if _data_dir_lock is not None:
+        return True
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    f = open(DATA_DIR / "sidecar.lock", "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    _data_dir_lock = f
+    return True
+
+def data_dir_owner() -> Optional[str]:
+    """PID recorded by the process holding the data directory's lock (if any has run)."""
+    try:
+        return (DATA_DIR / "sidecar.lock").read_text().strip() or None
+    except OSError:
+        return None
+
+# ─── Sidecar state (SQLite) ────────────────────────────────────────────────────
+def _state_db() -> sqlite3.Connection:
+    """Open a connection to the sidecar's local state database (one per thread)."""
+    os.makedirs(os.path.dirname(STATE_DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(STATE_DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
 # ─── Text helpers ──────────────────────────────────────────────────────────────
 def html_to_text(html: str) -> str:
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
     for tag in soup(["script", "style", "head"]):
         tag.decompose()
@@ -121,63 +599,75 @@ def chunk_text(text: str, size: int = 600, overlap: int = 100) -> List[str]:
         i += size - overlap
     return chunks or [text[:1200]]
 
-_NUMBER_PATTERNS = [
-    (r'\bG\.?R\.?\s*No\.?\s*[\d,\s-]+', 'gr'),
-    (r'\bR\.?A\.?\s*(?:No\.?\s*)?\d[\d,\s]*', 'ra'),
-    (r'\bRepublic Act\s+(?:No\.?\s*)?\d[\d,\s]*', 'ra'),
-    (r'\bAct\s+No\.?\s*\d[\d,\s]*', 'act'),
-    (r'\bB\.?P\.?\s*(?:Blg\.?\s*)?\d[\d,\s]*', 'bp'),
-    (r'\bE\.?O\.?\s*(?:No\.?\s*)?\d[\d,\s]*', 'eo'),
-    (r'\bP\.?D\.?\s*(?:No\.?\s*)?\d[\d,\s]*', 'pd'),
-    (r'\bA\.?O\.?\s*(?:No\.?\s*)?\d[\d,\s]*', 'ao'),
-]
+def identifier_key(text: str, lookup_type: str = "auto") -> Optional[str]:
+    """
+    Normalize a law/case number to an index key such as 'gr:12' or 'ra:9262'
+    (citations.py, same precedence as parse_meta); bare numbers need an explicit lookup_type.
+    """
+    from citations import primary, scan
+    own = primary(scan(text).citations)
+    if own:
+        return own.key
+    num = re.fullmatch(r'\s*(?:No\.?\s*)?(\d+(?:-\d+)*)\s*', text, re.I)
+    if num and lookup_type != "auto":
+        return f"{lookup_type.lower()}:{num.group(1)}"
+    return None
 
 def parse_meta(filename: str) -> Dict[str, str]:
+    """title / number / key / year / promulgated from a file name, in one citations.scan pass."""
+    from citations import parse_name
     name = re.sub(r'\.html?$', '', filename, flags=re.I)
-    for pattern, kind in _NUMBER_PATTERNS:
-        m = re.search(pattern, name, re.I)
-        if m:
-            year_m = re.search(r'\b(19|20)\d{2}\b', name)
-            return {"title": name, "number": m.group(0).strip(), "year": year_m.group(0) if year_m else ""}
-    year_m = re.search(r'\b(19|20)\d{2}\b', name)
+    meta = parse_name(name)
+    if meta["number"]:
+        return {"title": name, **meta}
     humanized = re.sub(r'[_-]\d{4}.*', '', name).replace('_', ' ').replace('-', ' ').title()
-    return {"title": humanized.strip() or name, "number": "", "year": year_m.group(0) if year_m else ""}
+    return {"title": humanized.strip() or name, **meta}
 
 # ─── Indexing ──────────────────────────────────────────────────────────────────
-def index_html_file(abs_path: str, relative_path: str, category: str, subcategory: str) -> int:
-    """Index a single HTML file into Milvus. Returns number of chunks inserted."""
-    try:
-        try:
-            with open(abs_path, 'r', encoding='utf-8') as f:
-                html = f.read()
-        except UnicodeDecodeError:
-            with open(abs_path, 'r', encoding='latin-1') as f:
-                html = f.read()
-    except Exception:
-        return 0
+INDEX_WORKERS    = int(os.environ.get("DEEPSEARCHER_INDEX_WORKERS", "0")) or max(1, (os.cpu_count() or 2) - 1)
+EMBED_BATCH_SIZE = int(os.environ.get("DEEPSEARCHER_EMBED_BATCH", "64"))
+WRITE_BATCH_SIZE = int(os.environ.get("DEEPSEARCHER_WRITE_BATCH", "2048"))
 
-    text  = html_to_text(html)
-    meta  = parse_meta(Path(abs_path).name)
-    chunks = chunk_text(text)
-    doc_id = hashlib.sha256(relative_path.encode()).hexdigest()[:32]
+INDEX_CHUNKS = REGISTRY.register(Counter("deepsearcher_index_chunks_total", "Chunks written by the index pipeline."))
+INDEX_FILES  = REGISTRY.register(Counter(
+    "deepsearcher_index_files_total", "Files finished by the index pipeline.", ["outcome"]))
 
-    chunks = [c[:3900] for c in chunks]
-
-    col = get_collection()
+# A document's own number and promulgation date, when its file name lacks them,
+# are taken from the start of its text (the caption); further citations are the
+# documents it cites, kept per chunk and in the citation graph.
+DOC_HEAD_CHARS = 600
+CHUNK_CITATIONS_MAX = 100
 
-    # Check if already indexed (first chunk's doc_id exists)
-    existing = col.get(ids=[f"{doc_id}_0"], include=[])
-    if existing and existing.get("ids"):
-        return 0  # already indexed
+def doc_id_for(relative_path: str) -> str:
+    return hashlib.sha256(relative_path.encode()).hexdigest()[:32]
 
-    # Embed all chunks
-    embeddings = embed_texts(chunks)
+def prepare_document(abs_path: str, relative_path: str, category: str, subcategory: str):
+    """
+    Stream, parse and chunk one HTML file (CPU-only, no model or DB access, so it
+    can run in a worker process). Returns (ids, chunks, metadatas) or None.
+    """
+    from html_stream import extract_chunks
+    from passages import encode_offsets, sentence_ends
+    from citations import citation_keys, primary, scan
+    try:
+        chunks = [c[:3900] for c in extract_chunks(abs_path)]
+    except Exception:
+        return None
 
-    ids, embs, docs, metas = [], [], [], []
-    for i, (chunk, emb) in enumerate(zip(chunks, embeddings)):
+    meta  = parse_meta(Path(abs_path).name)
+    doc_id = doc_id_for(relative_path)
+    if chunks and not (meta["number"] and meta["promulgated"]):
+        head = scan(chunks[0][:DOC_HEAD_CHARS])
+        own = primary(head.citations)
+        if own and not meta["number"]:
+            meta["number"], meta["key"] = own.text, own.key
+        if head.dates and not meta["promulgated"]:
+            meta["promulgated"] = head.dates[0]
+        meta["year"] = meta["year"] or meta["promulgated"][:4]
+
+    ids, metas = [], []
+    for i in range(len(chunks)):
         ids.append(f"{doc_id}_{i}")
-        embs.append(emb)
-        docs.append(chunk)
         metas.append({
             "doc_id":        f"{doc_id}_{i}",
             "title":         meta["title"][:500],
@@ -186,111 +676,1694 @@ def index_html_file(abs_path: str, relative_path: str, category: str, subcategor
             "number":        meta["number"][:255],
             "year":          meta["year"][:15],
             "relative_path": relative_path[:500],
+            "sentences":     encode_offsets(sentence_ends(chunks[i])),
+            "promulgated":   meta["promulgated"],
+            "citations":     ",".join(citation_keys(scan(chunks[i]).citations, meta["key"])[:CHUNK_CITATIONS_MAX]),
         })
+    return ids, chunks, metas
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
-    col.add(ids=ids, embeddings=embs, documents=docs, metadatas=metas)
+def _prepare_task(args):
+    """
+    prepare_document plus the file's manifest fingerprint (mtime_ns, size, sha256),
+    taken before parsing. Returns (prepared, fingerprint, error, stage seconds); the
+    timings travel back with the result because this may run in a worker process.
+    """
+    t0 = time.perf_counter()
+    try:
+        st = os.stat(args[0])
+        fingerprint = (st.st_mtime_ns, st.st_size, file_sha256(args[0]))
+    except OSError as e:
+        return None, None, f"{type(e).__name__}: {e}", {}
+    t1 = time.perf_counter()
+    prepared = prepare_document(*args)
+    timings = {"index_hash": t1 - t0, "index_extract": time.perf_counter() - t1}
+    return prepared, fingerprint, None if prepared else "unreadable or unparsable HTML", timings
+
+def index_html_file(abs_path: str, relative_path: str, category: str, subcategory: str) -> int:
+    """Index (or re-index, if changed) a single HTML file. Returns number of chunks inserted."""
+    return sync_index([(abs_path, relative_path, category, subcategory)])["chunks_indexed"]
+
+def _after_chunks_added(ids: List[str], docs: List[str], metas: List[Dict]) -> None:
+    """Keep derived structures in step with ChromaDB after a col.upsert.
+
+    Lexical additions stay buffered; run_index_pipeline flushes them once per run
+    (the index also flushes itself every flush_docs chunks)."""
+    lex = get_lexical_index()
+    lex.delete(ids)     # upsert semantics: a re-written chunk must not be counted twice
+    lex.add(ids, docs, [m["category"] for m in metas], [m["year"] for m in metas])
+    record_citations(metas)
+    invalidate_query_caches({m["category"] for m in metas})
+
+def run_index_pipeline(file_list: List[tuple], workers: Optional[int] = None,
+                       progress=None, stop=None) -> int:
+    """
+    Staged bulk indexer over (abs_path, relative_path, category, subcategory) tuples:
+      parse  — process pool running prepare_document, bounded in-flight window
+      embed  — one thread packing chunks from many documents into EMBED_BATCH_SIZE batches
+      write  — one thread issuing large col.upsert calls (store_chunks)
+    Stages are connected by bounded queues. Every file given is (re)indexed — use
+    sync_index to skip unchanged ones; a document's manifest row is written once
+    its last chunk is stored. Returns number of chunks inserted.
+
+    Files are finished in input order. progress(files_done, chunks_done, failures) is
+    called from the writer after each flush, so files_done is a safe checkpoint
+    offset into file_list; stop() is polled before each file is submitted.
+    """
+    import queue, multiprocessing as mp
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor
+
+    col = get_collection()
+    todo = list(file_list)
+    if not todo:
+        return 0
+    workers = workers or INDEX_WORKERS
+    try:
+        write_batch = min(WRITE_BATCH_SIZE, _chroma_client.get_max_batch_size())
+    except Exception:
+        write_batch = WRITE_BATCH_SIZE
+
+    # With an embedding pool, one batch per worker goes out at a time (the pool splits it)
+    embed_batch = EMBED_BATCH_SIZE * max(1, EMBED_WORKERS)
+
+    DONE = object()
+    embed_q: "queue.Queue" = queue.Queue(maxsize=workers * 4)
+    write_q: "queue.Queue" = queue.Queue(maxsize=8)
+    errors: List[BaseException] = []
+    written = [0]
+
+    def embedder():
+        ids, docs, metas, records, failures = [], [], [], [], []
+        def flush():
+            if ids or records or failures:
+                embs = []
+                if docs:
+                    with span("index_embed"):
+                        embs = embed_texts(docs)
+                write_q.put((list(ids), embs, list(docs), list(metas),
+                             list(records), list(failures)))
+                for part in (ids, docs, metas, records, failures):
+                    part.clear()
+        try:
+            while True:
+                item = embed_q.get()
+                if item is DONE:
+                    break
+                prepared, record, failure = item
+                if failure:
+                    failures.append(failure)
+                    continue
+                for cid, doc, meta in zip(*prepared):
+                    ids.append(cid); docs.append(doc); metas.append(meta)
+                    if len(ids) >= embed_batch:
+                        flush()
+                # Rides with the batch holding the document's last chunk (or a later one)
+                records.append(record)
+            flush()
+        except BaseException as e:
+            errors.append(e)
+            while embed_q.get() is not DONE:   # drain so the producer never blocks
+                pass
+        finally:
+            write_q.put(DONE)
+
+    def writer():
+        buf: List[list] = [[], [], [], [], [], []]
+        conn = _state_db()
+        files_done = [0]
+        categories = set()
+        def flush():
+            if buf[0]:
+                with span("index_store"):
+                    store_chunks(col, buf[0], buf[1], buf[2], buf[3])
+                with span("index_lexical"):
+                    _after_chunks_added(buf[0], buf[2], buf[3])
+                categories.update(m["category"] for m in buf[3])
+                written[0] += len(buf[0])
+                INDEX_CHUNKS.inc(len(buf[0]))
+                print(f"[DeepSearcher] Indexed {written[0]} chunks so far...")
+            if buf[4]:
+                with span("index_manifest"):
+                    _manifest_record(conn, buf[4])
+                INDEX_FILES.inc(len(buf[4]), outcome="indexed")
+            if buf[5]:
+                INDEX_FILES.inc(len(buf[5]), outcome="failed")
+            if buf[4] or buf[5]:
+                files_done[0] += len(buf[4]) + len(buf[5])
+                if progress:
+                    progress(files_done[0], written[0], list(buf[5]))
+            for part in buf:
+                part.clear()
+        try:
+            while True:
+                item = write_q.get()
+                if item is DONE:
+                    break
+                for part, values in zip(buf, item):
+                    part.extend(values)
+                if len(buf[0]) >= write_batch:
+                    flush()
+            flush()
+        except BaseException as e:
+            errors.append(e)
+            while write_q.get() is not DONE:
+                pass
+        finally:
+            conn.close()
+            if categories:
+                # One lexical segment per run; searches cached meanwhile did not see it
+                with span("index_lexical"):
+                    get_lexical_index().flush()
+                invalidate_query_caches(categories)
+
+    def _submit(args, result):
+        prepared, fingerprint, error, timings = result
+        _, rel, category, _ = args
+        for stage, seconds in timings.items():
+            observe_stage(stage, seconds)
+        if prepared and prepared[0]:
+            embed_q.put((prepared, (rel, *fingerprint, len(prepared[0]), category), None))
+        else:
+            embed_q.put((None, None, (rel, error or "no chunks")))
+
+    threads = [threading.Thread(target=embedder, name="index-embed", daemon=True),
+               threading.Thread(target=writer, name="index-write", daemon=True)]
+    for t in threads:
+        t.start()
+
+    try:
+        if workers <= 1 or len(todo) < 32:
+            for args in todo:
+                if errors or (stop and stop()):
+                    break
+                _submit(args, _prepare_task(args))
+        else:
+            # spawn, not fork: this process already runs uvicorn, the writer and the embed pool's threads
+            with ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn")) as pool:
+                window: deque = deque()
+                pending = iter(todo)
+                for args in pending:
+                    window.append((args, pool.submit(_prepare_task, args)))
+                    if len(window) >= workers * 4:
+                        break
+                while window and not errors:
+                    args, fut = window.popleft()
+                    nxt = next(pending, None) if not (stop and stop()) else None
+                    if nxt is not None:
+                        window.append((nxt, pool.submit(_prepare_task, nxt)))
+                    _submit(args, fut.result())
+                for _, fut in window:
+                    fut.cancel()
+    finally:
+        embed_q.put(DONE)
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+    return written[0]
+
+# ─── Document manifest ─────────────────────────────────────────────────────────
+# One row per indexed file: what was stored for it and the file state it came
+# from, so a rescan can diff the filesystem without touching ChromaDB.
+FOLDER_CATEGORY_MAP = {
+    "Supreme Court":         ("supreme_court", "decisions"),
+    "Laws":                  ("laws", "republic_acts"),
+    "Executive Issuances":   ("executive_issuances", "executive_orders"),
+    "References":            ("references", "general"),
+    "Treaties":              ("treaties", "bilateral"),
+    "International Laws":    ("international_laws", "international"),
+}
+DELETE_BATCH_SIZE = 5000
+_PLAN_SAMPLE = 20
+
+def _manifest_schema(conn: sqlite3.Connection):
+    conn.execute("""CREATE TABLE IF NOT EXISTS manifest (
+        rel_path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, sha256 TEXT,
+        chunk_count INTEGER, embed_model TEXT, category TEXT, indexed_at REAL)""")
+
+def _manifest_record(conn: sqlite3.Connection, records: List[tuple]) -> None:
+    """records: (rel_path, mtime_ns, size, sha256, chunk_count, category) for fully stored documents."""
+    now = time.time()
+    with conn:
+        _manifest_schema(conn)
+        conn.executemany("INSERT OR REPLACE INTO manifest VALUES (?,?,?,?,?,?,?,?)",
+                         [(rel, mt, size, sha, n, _index_signature(), cat, now) for rel, mt, size, sha, n, cat in records])
+
+def scan_legal_db() -> List[tuple]:
+    """All HTML files under LEGAL_DB_ROOT as (abs_path, relative_path, category, subcategory)."""
+    jobs = []
+    if not os.path.isdir(LEGAL_DB_ROOT):
+        print(f"[DeepSearcher] LEGAL_DB_ROOT not found: {LEGAL_DB_ROOT}")
+        return jobs
+    for top_dir in sorted(os.listdir(LEGAL_DB_ROOT)):
+        top_abs = os.path.join(LEGAL_DB_ROOT, top_dir)
+        if not os.path.isdir(top_abs):
+            continue
+        category, subcategory = FOLDER_CATEGORY_MAP.get(top_dir, ("general", "general"))
+        for root, dirs, files in os.walk(top_abs):
+            dirs.sort()
+            # Sub-folder names give a better subcategory than the top-level default
+            sub_folder = os.path.basename(root)
+            sub = sub_folder.lower().replace(' ', '_').replace('/', '_') if sub_folder != top_dir else subcategory
+            for fname in sorted(files):
+                if re.search(r'\.html?$', fname, re.I):
+                    abs_path = os.path.join(root, fname)
+                    rel_path = os.path.relpath(abs_path, LEGAL_DB_ROOT).replace('\\', '/')
+                    jobs.append((abs_path, rel_path, category, sub))
+    return jobs
+
+def index_jobs_for(paths: Optional[List[str]]) -> List[tuple]:
+    """Index jobs for explicit HTML paths, or the whole LEGAL_DB_ROOT scan when paths is empty."""
+    if not paths:
+        return scan_legal_db()
+    jobs = []
+    for p in paths:
+        if p.endswith(('.html', '.htm')):
+            rel_path = os.path.relpath(p, LEGAL_DB_ROOT).replace('\\', '/') if p.startswith(LEGAL_DB_ROOT) else p
+            jobs.append((p, rel_path, "general", "general"))
+    return jobs
+
+def _bootstrap_manifest(conn: sqlite3.Connection, jobs: List[tuple], page: int = 5000) -> int:
+    """
+    Seed an empty manifest from a collection indexed before the manifest existed:
+    chunk counts come from one paged pass over ChromaDB metadata, file state from disk.
+    Every stored document is seeded, not only those in `jobs`: a first request for a
+    few explicit paths must not leave the rest of the corpus looking new.
+    """
+    col = get_collection()
+    if conn.execute("SELECT 1 FROM manifest LIMIT 1").fetchone() or col.count() == 0:
+        return 0
+    counts: Dict[str, int] = {}
+    categories: Dict[str, str] = {}
+    offset = 0
+    while True:
+        batch = col.get(include=["metadatas"], limit=page, offset=offset)
+        metas = batch.get("metadatas") or []
+        if not metas:
+            break
+        for m in metas:
+            rel = m.get("relative_path", "")
+            counts[rel] = counts.get(rel, 0) + 1
+            categories.setdefault(rel, m.get("category", ""))
+        offset += len(metas)
+    abs_paths = {rel: abs_path for abs_path, rel, _, _ in jobs}
+    records = []
+    for rel, n in counts.items():
+        abs_path = abs_paths.get(rel) or (rel if os.path.isabs(rel) else os.path.join(LEGAL_DB_ROOT, rel))
+        try:
+            st = os.stat(abs_path)
+            records.append((rel, st.st_mtime_ns, st.st_size, file_sha256(abs_path), n, categories[rel]))
+        except OSError:
+            continue
+    _manifest_record(conn, records)
+    print(f"[DeepSearcher] Manifest bootstrapped from ChromaDB: {len(records)} documents")
+    return len(records)
+
+def plan_index(jobs: List[tuple], prune: bool = False) -> Dict[str, Any]:
+    """
+    Diff jobs against the manifest in one pass:
+      new       — not in the manifest
+      changed   — content hash, embedding model or vector store differs (old chunks must go)
+      touched   — mtime/size moved but the content hash is unchanged (manifest update only)
+      unchanged — mtime and size match
+      deleted   — in the manifest but gone from disk (all manifest entries not in jobs when prune)
+    """
+    conn = _state_db()
+    try:
+        _manifest_schema(conn)
+        _bootstrap_manifest(conn, jobs)
+        known = {r[0]: r[1:] for r in conn.execute(
+            "SELECT rel_path, mtime_ns, size, sha256, chunk_count, embed_model, category FROM manifest")}
+    finally:
+        conn.close()
+
+    plan: Dict[str, Any] = {"new": [], "changed": [], "touched": [], "unchanged": 0, "deleted": []}
+    seen = set()
+    for job in jobs:
+        abs_path, rel = job[0], job[1]
+        row = known.get(rel)
+        try:
+            st = os.stat(abs_path)
+        except OSError:
+            if row is not None:
+                plan["deleted"].append((rel, row[3], row[5]))
+            continue
+        seen.add(rel)
+        if row is None:
+            plan["new"].append(job)
+        elif row[4] != _index_signature():
+            plan["changed"].append((job, row[3], row[5]))
+        elif (st.st_mtime_ns, st.st_size) == (row[0], row[1]):
+            plan["unchanged"] += 1
+        elif st.st_size == row[1] and file_sha256(abs_path) == row[2]:
+            plan["touched"].append((rel, st.st_mtime_ns, st.st_size))
+        else:
+            plan["changed"].append((job, row[3], row[5]))
+    if prune:
+        plan["deleted"] = [(rel, row[3], row[5]) for rel, row in known.items() if rel not in seen]
+    return plan
+
+def summarize_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "new":          len(plan["new"]),
+        "changed":      len(plan["changed"]),
+        "touched":      len(plan["touched"]),
+        "unchanged":    plan["unchanged"],
+        "deleted":      len(plan["deleted"]),
+        "stale_chunks": sum(n for _, n, _ in plan["deleted"]) + sum(n for _, n, _ in plan["changed"]),
+        "sample": {
+            "new":     [j[1] for j in plan["new"][:_PLAN_SAMPLE]],
+            "changed": [j[1] for j, _, _ in plan["changed"][:_PLAN_SAMPLE]],
+            "deleted": [rel for rel, _, _ in plan["deleted"][:_PLAN_SAMPLE]],
+        },
+    }
+
+def remove_documents(docs: List[tuple]) -> int:
+    """Bulk-delete every chunk of (rel_path, chunk_count, category) documents and their manifest rows."""
+    if not docs:
+        return 0
+    col, lex = get_collection(), get_lexical_index()
+    ids = [f"{doc_id_for(rel)}_{i}" for rel, n, _ in docs for i in range(n)]
+    for i in range(0, len(ids), DELETE_BATCH_SIZE):
+        col.delete(ids=ids[i:i+DELETE_BATCH_SIZE])
+    lex.delete(ids)
+    if VECTOR_STORE == "compact":
+        get_compact_store().delete(ids)
+    conn = _state_db()
+    try:
+        with conn:
+            _manifest_schema(conn)
+            conn.executemany("DELETE FROM manifest WHERE rel_path = ?", [(rel,) for rel, _, _ in docs])
+    finally:
+        conn.close()
+    forget_citations([rel for rel, _, _ in docs])
+    invalidate_query_caches({cat for _, _, cat in docs})
     return len(ids)
 
+def apply_plan_removals(plan: Dict[str, Any], limit: Optional[int] = None) -> tuple:
+    """
+    First half of a sync: drop stale chunks and refresh touched manifest rows.
+    Returns (summary, todo) where todo is the new + changed files to index, capped at `limit`.
+    """
+    summary = summarize_plan(plan)
+    todo = plan["new"] + [job for job, _, _ in plan["changed"]]
+    if limit is not None:
+        todo = todo[:limit]
+    redo = {job[1] for job in todo}
+    summary["chunks_removed"] = remove_documents(
+        plan["deleted"] + [(job[1], n, cat) for job, n, cat in plan["changed"] if job[1] in redo])
+    if plan["touched"]:
+        conn = _state_db()
+        try:
+            with conn:
+                conn.executemany("UPDATE manifest SET mtime_ns = ?, size = ? WHERE rel_path = ?",
+                                 [(mt, size, rel) for rel, mt, size in plan["touched"]])
+        finally:
+            conn.close()
+    return summary, todo
+
+def sync_index(jobs: List[tuple], prune: bool = False, limit: Optional[int] = None,
+               workers: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Bring the index in line with jobs: drop stale chunks, refresh touched manifest rows,
+    then run the pipeline over new and changed files (at most `limit` of them).
+    prune=True treats jobs as the whole corpus, so manifest entries outside it are deleted.
+    """
+    with _writer_lock:
+        summary, todo = apply_plan_removals(plan_index(jobs, prune), limit)
+        summary["chunks_indexed"] = run_index_pipeline(todo, workers)
+    return summary
+
+def manifest_stats() -> Dict[str, int]:
+    conn = _state_db()
+    try:
+        _manifest_schema(conn)
+        docs, chunks = conn.execute("SELECT COUNT(*), COALESCE(SUM(chunk_count), 0) FROM manifest").fetchone()
+    finally:
+        conn.close()
+    return {"documents": docs, "chunks": chunks}
+
+# ─── Snapshots ─────────────────────────────────────────────────────────────────
+# Export/import of the collection with its vectors and the document manifest
+# (format in snapshot.py), so a replica or a rollback starts from stored
+# embeddings instead of re-indexing the corpus. Both run under the writer lock.
+def export_snapshot(path: str, shard_rows: Optional[int] = None, dtype: str = "float32") -> Dict[str, Any]:
+    """Write the collection to a new snapshot directory at `path`. Returns its snapshot.json."""
+    from snapshot import SHARD_ROWS, SnapshotWriter
+    ensure_model()
+    with _writer_lock:
+        col = get_collection()
+        writer = SnapshotWriter(path, {"collection": COLLECTION, "embed_model": _embed_model, "embed_dim": _embed_dim},
+                                shard_rows or SHARD_ROWS, dtype)
+        try:
+            offset = 0
+            with span("snapshot_export"):
+                while True:
+                    if VECTOR_STORE == "compact":
+                        batch = col.get(include=["documents", "metadatas"], limit=WRITE_BATCH_SIZE, offset=offset)
+                        embeddings = get_compact_store().vectors(batch["ids"])
+                    else:
+                        batch = col.get(include=["embeddings", "documents", "metadatas"], limit=WRITE_BATCH_SIZE,
+                                        offset=offset)
+                        embeddings = batch["embeddings"]
+                    if not batch["ids"]:
+                        break
+                    writer.add(batch["ids"], embeddings, batch["documents"], batch["metadatas"])
+                    offset += len(batch["ids"])
+                conn = _state_db()
+                try:
+                    _manifest_schema(conn)
+                    writer.write_manifest(conn.execute(
+                        "SELECT rel_path, mtime_ns, size, sha256, chunk_count, embed_model, category, indexed_at "
+                        "FROM manifest ORDER BY rel_path"))
+                finally:
+                    conn.close()
+                info = writer.close()
+        except BaseException:
+            writer.abort()
+            raise
+    print(f"[DeepSearcher] Snapshot exported to {path}: {info['rows']} chunks, {info['documents']} documents")
+    return info
+
+def _staging_paths() -> Tuple[str, Path, Path]:
+    """Where import_snapshot builds the new collection: (Chroma collection name, compact store dir, BM25 dir)."""
+    compact = _compact_store_dir()
+    return f"{COLLECTION}__staging", compact.with_name(compact.name + ".staging"), Path(LEXICAL_INDEX_DIR + ".staging")
+
+def _discard_staging() -> None:
+    name, compact_dir, lex_dir = _staging_paths()
+    try:
+        _chroma_client.delete_collection(name)
+    except Exception:
+        pass
+    shutil.rmtree(compact_dir, ignore_errors=True)
+    shutil.rmtree(lex_dir, ignore_errors=True)
+
+def _swap_dir(live: Path, staged: Path) -> None:
+    old = live.with_name(live.name + ".old")
+    shutil.rmtree(old, ignore_errors=True)
+    if live.exists():
+        os.replace(live, old)
+    os.replace(staged, live)
+    shutil.rmtree(old, ignore_errors=True)
+
+def import_snapshot(path: str, replace: bool = False) -> Dict[str, Any]:
+    """
+    Load a snapshot into the collection without re-embedding. The snapshot must
+    come from the same embedding model and dimension; the collection must be
+    empty unless `replace`. Every file is checked against its checksum before
+    anything is written. Returns the snapshot.json.
+
+    The snapshot is loaded into a staging collection (with its own compact store
+    and BM25 index) while the live one keeps serving; only once it is complete are
+    the two swapped and the manifest and citation graph replaced, in one state DB
+    transaction. A failed import leaves the live collection as it was.
+    """
+    from compact_store import CompactVectorStore
+    from lexical_index import LexicalIndex
+    from snapshot import SnapshotError, iter_shards, manifest_rows, verify
+    global _collection, _compact_store, _lexical
+    ensure_model()
+    info = verify(path)
+    if (info["embed_model"], info["embed_dim"]) != (_embed_model, _embed_dim):
+        raise SnapshotError(f"snapshot vectors are {info['embed_model']} (dim {info['embed_dim']}); "
+                            f"this sidecar embeds with {_embed_model} (dim {_embed_dim})")
+    with _writer_lock:
+        if get_collection().count() and not replace:
+            raise SnapshotError(f"collection '{COLLECTION}' is not empty (import with replace to drop it)")
+        name, compact_dir, lex_dir = _staging_paths()
+        _discard_staging()                  # left over from an import that was cut short
+        try:
+            col = _chroma_client.create_collection(name=name, metadata={"hnsw:space": "cosine"})
+            compact = None
+            if VECTOR_STORE == "compact":
+                compact = CompactVectorStore(str(compact_dir), _embed_dim, rerank=COMPACT_RERANK,
+                                             compact_ratio=COMPACT_TOMBSTONE_RATIO)
+            lex, edges = LexicalIndex(str(lex_dir)), set()
+            with span("snapshot_import"):
+                for ids, embeddings, docs, metas in iter_shards(path):
+                    for i in range(0, len(ids), WRITE_BATCH_SIZE):
+                        j = i + WRITE_BATCH_SIZE
+                        store_chunks(col, ids[i:j], embeddings[i:j], docs[i:j], metas[i:j], compact)
+                    lex.add(ids, docs, [m.get("category", "") for m in metas], [m.get("year", "") for m in metas])
+                    edges.update((m.get("relative_path", ""), key) for m in _with_citations(docs, metas)
+                                 for key in m["citations"].split(",") if key)
+                lex.flush()
+                manifest = manifest_rows(path)
+        except BaseException:
+            _discard_staging()
+            raise
+        # Swap the staged collection in. Stores are dropped before their directories
+        # move (their memory maps must be closed first on Windows); the next use reopens them.
+        compact = lex = None
+        if VECTOR_STORE == "compact":
+            _compact_store = None
+            _swap_dir(_compact_store_dir(), compact_dir)
+        with _lexical_lock:
+            _lexical = None
+            _swap_dir(Path(LEXICAL_INDEX_DIR), lex_dir)
+        with _collection_lock:
+            try:
+                _chroma_client.delete_collection(COLLECTION)
+            except Exception:
+                pass
+            col.modify(name=COLLECTION)
+            _collection = col
+        # The rows now match this sidecar's vector store, whichever one exported them
+        signature = _index_signature()
+        conn = _state_db()
+        try:
+            with conn:
+                _manifest_schema(conn)
+                _citations_schema(conn)
+                conn.execute("DELETE FROM manifest")
+                conn.executemany("INSERT OR REPLACE INTO manifest VALUES (?,?,?,?,?,?,?,?)",
+                                 [(*row[:5], signature, *row[6:]) for row in manifest])
+                conn.execute("DELETE FROM citations")
+                conn.executemany("INSERT OR IGNORE INTO citations VALUES (?, ?)", edges)
+                conn.execute("INSERT OR REPLACE INTO citations_state VALUES ('backfilled', ?)", (str(time.time()),))
+        finally:
+            conn.close()
+        _citations_changed()
+        for cache in (_search_cache, _answer_cache, _partition_cache):
+            cache.clear()
+    print(f"[DeepSearcher] Snapshot imported from {path}: {info['rows']} chunks, {info['documents']} documents")
+    return info
+
+# ─── Index jobs ────────────────────────────────────────────────────────────────
+# /index/batch requests become rows in index_jobs, run one at a time by a single
+# runner thread (the only writer to the collection). A job's file list is stored
+# with it and files_done is a checkpoint offset into that list, so a paused or
+# interrupted job resumes where it stopped.
+JOB_ERROR_LIMIT = 100
+_writer_lock = threading.RLock()
+_job_wakeup = threading.Event()
+_job_runner: Optional[threading.Thread] = None
+_job_runner_lock = threading.Lock()
+_job_control: Dict[str, str] = {}       # running job id → "pause" | "cancel"
+
+def _jobs_schema(conn: sqlite3.Connection):
+    conn.execute("""CREATE TABLE IF NOT EXISTS index_jobs (
+        id TEXT PRIMARY KEY, status TEXT, phase TEXT, paths TEXT, prune INTEGER, max_files INTEGER,
+        files_total INTEGER DEFAULT 0, files_done INTEGER DEFAULT 0, chunks_indexed INTEGER DEFAULT 0,
+        chunks_removed INTEGER DEFAULT 0, error_count INTEGER DEFAULT 0, errors TEXT DEFAULT '[]',
+        plan TEXT, created_at REAL, started_at REAL, finished_at REAL, active_s REAL DEFAULT 0,
+        run_started_at REAL, run_files_start INTEGER DEFAULT 0, run_chunks_start INTEGER DEFAULT 0)""")
+    conn.execute("""CREATE TABLE IF NOT EXISTS index_job_files (
+        job_id TEXT, seq INTEGER, abs_path TEXT, rel_path TEXT, category TEXT, subcategory TEXT,
+        PRIMARY KEY (job_id, seq))""")
+
+def _job_row(conn: sqlite3.Connection, job_id: str) -> Optional[Dict[str, Any]]:
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM index_jobs WHERE id = ?", (job_id,)).fetchone()
+    return dict(row) if row else None
+
+def _job_view(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Public job state with throughput and ETA; rates cover the current (or last) run."""
+    now = time.time()
+    running = row["status"] == "running" and row["run_started_at"]
+    run_s = (now - row["run_started_at"]) if running else 0.0
+    active_s = row["active_s"] + run_s
+    if running and run_s > 0:
+        files_rate = (row["files_done"] - row["run_files_start"]) / run_s
+        chunks_rate = (row["chunks_indexed"] - row["run_chunks_start"]) / run_s
+    else:
+        files_rate = row["files_done"] / active_s if active_s else 0.0
+        chunks_rate = row["chunks_indexed"] / active_s if active_s else 0.0
+    remaining = max(row["files_total"] - row["files_done"], 0)
+    return {
+        "id":             row["id"],
+        "status":         row["status"],
+        "phase":          row["phase"],
+        "paths":          json.loads(row["paths"]) if row["paths"] else None,
+        "files_total":    row["files_total"],
+        "files_done":     row["files_done"],
+        "chunks_indexed": row["chunks_indexed"],
+        "chunks_removed": row["chunks_removed"],
+        "files_per_s":    round(files_rate, 2),
+        "chunks_per_s":   round(chunks_rate, 2),
+        "eta_s":          round(remaining / files_rate) if files_rate and row["status"] in ("running", "queued") else None,
+        "active_s":       round(active_s, 1),
+        "error_count":    row["error_count"],
+        "errors":         json.loads(row["errors"]),
+        "plan":           json.loads(row["plan"]) if row["plan"] else None,
+        "created_at":     row["created_at"],
+        "started_at":     row["started_at"],
+        "finished_at":    row["finished_at"],
+    }
+
+def create_index_job(paths: Optional[List[str]], limit: Optional[int]) -> Dict[str, Any]:
+    import uuid
+    job_id = uuid.uuid4().hex[:12]
+    conn = _state_db()
+    try:
+        with conn:
+            _jobs_schema(conn)
+            conn.execute("INSERT INTO index_jobs (id, status, phase, paths, prune, max_files, created_at) "
+                         "VALUES (?, 'queued', 'plan', ?, ?, ?, ?)",
+                         (job_id, json.dumps(paths) if paths else None, int(not paths), limit, time.time()))
+        row = _job_row(conn, job_id)
+    finally:
+        conn.close()
+    _ensure_job_runner()
+    return _job_view(row)
+
+def get_index_job(job_id: str) -> Optional[Dict[str, Any]]:
+    conn = _state_db()
+    try:
+        _jobs_schema(conn)
+        row = _job_row(conn, job_id)
+    finally:
+        conn.close()
+    return _job_view(row) if row else None
+
+def list_index_jobs(limit: int = 20) -> List[Dict[str, Any]]:
+    conn = _state_db()
+    try:
+        _jobs_schema(conn)
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute("SELECT * FROM index_jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+    finally:
+        conn.close()
+    return [_job_view(dict(r)) for r in rows]
+
+# action → {current status: new status}; a running job is stopped at the next file boundary
+_JOB_TRANSITIONS = {
+    "pause":  {"queued": "paused", "running": "pausing"},
+    "resume": {"paused": "queued"},
+    "cancel": {"queued": "cancelled", "paused": "cancelled", "running": "cancelling", "pausing": "cancelling"},
+}
+
+def control_index_job(job_id: str, action: str) -> Optional[Dict[str, Any]]:
+    """Apply pause/resume/cancel. Returns the job, or None if unknown; ValueError if not allowed now."""
+    conn = _state_db()
+    try:
+        _jobs_schema(conn)
+        with conn:
+            row = _job_row(conn, job_id)
+            if row is None:
+                return None
+            new = _JOB_TRANSITIONS[action].get(row["status"])
+            if new is None:
+                raise ValueError(f"cannot {action} a job that is {row['status']}")
+            if row["status"] in ("running", "pausing"):
+                _job_control[job_id] = "cancel" if action == "cancel" else "pause"
+            conn.execute("UPDATE index_jobs SET status = ? WHERE id = ?", (new, job_id))
+        row = _job_row(conn, job_id)
+    finally:
+        conn.close()
+    if new == "queued":
+        _ensure_job_runner()
+    return _job_view(row)
+
+def resume_interrupted_jobs() -> int:
+    """At startup, requeue jobs a previous process was running when it died (honouring pending pause/cancel)."""
+    conn = _state_db()
+    try:
+        _jobs_schema(conn)
+        with conn:
+            conn.execute("UPDATE index_jobs SET status = 'paused' WHERE status = 'pausing'")
+            conn.execute("UPDATE index_jobs SET status = 'cancelled' WHERE status = 'cancelling'")
+            n = conn.execute("UPDATE index_jobs SET status = 'queued' WHERE status = 'running'").rowcount
+            queued = conn.execute("SELECT COUNT(*) FROM index_jobs WHERE status = 'queued'").fetchone()[0]
+    finally:
+        conn.close()
+    if queued:
+        _ensure_job_runner()
+    return n
+
+def _ensure_job_runner():
+    global _job_runner
+    with _job_runner_lock:
+        if _job_runner is None or not _job_runner.is_alive():
+            _job_runner = threading.Thread(target=_job_runner_loop, name="index-jobs", daemon=True)
+            _job_runner.start()
+    _job_wakeup.set()
+
+def _job_runner_loop():
+    while True:
+        _job_wakeup.clear()
+        conn = _state_db()
+        try:
+            _jobs_schema(conn)
+            row = conn.execute("SELECT id FROM index_jobs WHERE status = 'queued' "
+                               "ORDER BY created_at LIMIT 1").fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            _job_wakeup.wait(timeout=30)
+            continue
+        try:
+            _run_index_job(row[0])
+        except Exception as e:
+            print(f"[DeepSearcher] Index job {row[0]} failed: {e}")
+            _job_update(row[0], status="failed", finished_at=time.time(),
+                        errors_add=[{"path": None, "error": f"{type(e).__name__}: {e}"}])
+
+def _job_update(job_id: str, errors_add: Optional[List[Dict]] = None, **fields) -> None:
+    conn = _state_db()
+    try:
+        with conn:
+            if errors_add:
+                row = _job_row(conn, job_id)
+                kept = (json.loads(row["errors"]) + errors_add)[:JOB_ERROR_LIMIT]
+                fields["errors"] = json.dumps(kept)
+                fields["error_count"] = row["error_count"] + len(errors_add)
+            if fields:
+                cols = ", ".join(f"{k} = ?" for k in fields)
+                conn.execute(f"UPDATE index_jobs SET {cols} WHERE id = ?", (*fields.values(), job_id))
+    finally:
+        conn.close()
+
+def _run_index_job(job_id: str) -> None:
+    with _writer_lock:
+        # Claim the job only if it is still queued: a pause or cancel since the runner
+        # picked it must win over the runner
+        now = time.time()
+        conn = _state_db()
+        try:
+            with conn:
+                claimed = conn.execute(
+                    "UPDATE index_jobs SET status = 'running', started_at = COALESCE(started_at, ?), "
+                    "run_started_at = ?, run_files_start = files_done, run_chunks_start = chunks_indexed "
+                    "WHERE id = ? AND status = 'queued'", (now, now, job_id)).rowcount
+            job = _job_row(conn, job_id)
+        finally:
+            conn.close()
+        if not claimed:
+            return
+        if job["phase"] == "plan":
+            paths = json.loads(job["paths"]) if job["paths"] else None
+            plan = plan_index(index_jobs_for(paths), prune=bool(job["prune"]))
+            summary, todo = apply_plan_removals(plan, job["max_files"])
+            conn = _state_db()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM index_job_files WHERE job_id = ?", (job_id,))
+                    conn.executemany("INSERT INTO index_job_files VALUES (?,?,?,?,?,?)",
+                                     [(job_id, i, *t) for i, t in enumerate(todo)])
+            finally:
+                conn.close()
+            _job_update(job_id, phase="index", files_total=len(todo), chunks_removed=summary["chunks_removed"],
+                        plan=json.dumps({k: v for k, v in summary.items() if k != "sample"}))
+            job.update(phase="index", files_total=len(todo))
+
+        offset, chunks_base = job["files_done"], job["chunks_indexed"]
+        conn = _state_db()
+        try:
+            todo = [tuple(r) for r in conn.execute(
+                "SELECT abs_path, rel_path, category, subcategory FROM index_job_files "
+                "WHERE job_id = ? AND seq >= ? ORDER BY seq", (job_id, offset))]
+        finally:
+            conn.close()
+
+        def progress(files_done: int, chunks_done: int, failures: List[tuple]):
+            _job_update(job_id, files_done=offset + files_done, chunks_indexed=chunks_base + chunks_done,
+                        errors_add=[{"path": rel, "error": err} for rel, err in failures])
+
+        print(f"[DeepSearcher] Index job {job_id}: {len(todo)} files to go (from offset {offset})")
+        run_index_pipeline(todo, progress=progress, stop=lambda: job_id in _job_control)
+
+        action = _job_control.pop(job_id, None)
+        now = time.time()
+        conn = _state_db()
+        try:
+            row = _job_row(conn, job_id)
+        finally:
+            conn.close()
+        active = row["active_s"] + (now - row["run_started_at"])
+        if action == "pause":
+            _job_update(job_id, status="paused", active_s=active, run_started_at=None)
+        elif action == "cancel":
+            _job_update(job_id, status="cancelled", active_s=active, run_started_at=None, finished_at=now)
+        else:
+            _job_update(job_id, status="completed", phase="done", active_s=active, run_started_at=None,
+                        finished_at=now)
+        if action != "pause":
+            conn = _state_db()
+            try:
+                with conn:
+                    conn.execute("DELETE FROM index_job_files WHERE job_id = ?", (job_id,))
+            finally:
+                conn.close()
+    final = get_index_job(job_id)
+    print(f"[DeepSearcher] Index job {job_id} {final['status']}: {final['files_done']}/{final['files_total']} files, "
+          f"{final['chunks_indexed']} chunks inserted, {final['chunks_removed']} removed")
+    if final["status"] == "completed":
+        refresh_ident_index()
+
+# ─── Query caches ──────────────────────────────────────────────────────────────
+class TTLCache:
+    """
+    Thread-safe LRU cache with a per-cache TTL, bounded by entry count and, with
+    max_bytes, by the approximate size of its values. Entries carry tags (the
+    category they were computed for, or '*' for unfiltered) so indexing can drop
+    exactly the entries a new batch of documents could change.
+    """
+    _MISS = object()
+
+    def __init__(self, name: str, maxsize: int, ttl: float, max_bytes: Optional[int] = None):
+        from collections import OrderedDict
+        self.name, self.maxsize, self.ttl, self.max_bytes = name, maxsize, ttl, max_bytes
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key, self._MISS)
+            if entry is self._MISS or entry[0] < time.monotonic():
+                if entry is not self._MISS:
+                    self._drop(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=("*",)):
+        size = _approx_size(value)
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, frozenset(tags), size)
+            self._bytes += size
+            # A value larger than max_bytes on its own is evicted too: the caller keeps it, the cache does not
+            while len(self._data) > self.maxsize or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def invalidate(self, tags) -> int:
+        tags = set(tags)
+        with self._lock:
+            stale = [k for k, e in self._data.items() if e[2] & tags]
+            for k in stale:
+                self._drop(k)
+        return len(stale)
+
+    def _drop(self, key):
+        self._bytes -= self._data.pop(key)[3]
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries":     len(self._data),
+            "max_entries": self.maxsize,
+            "max_bytes":   self.max_bytes,
+            "ttl_s":       self.ttl,
+            "hits":        self.hits,
+            "misses":      self.misses,
+            "evictions":   self.evictions,
+            "hit_ratio":   round(self.hits / lookups, 4) if lookups else 0.0,
+            "approx_bytes": self._bytes,
+        }
+
+def _approx_size(obj) -> int:
+    """Rough deep size of JSON-like values (dict/list/str/number), or an object's own nbytes."""
+    import sys
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(_approx_size(k) + _approx_size(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_approx_size(v) for v in obj)
+    return sys.getsizeof(obj)
+
+_qemb_cache   = TTLCache("query_embedding", int(os.environ.get("DEEPSEARCHER_QEMB_CACHE_SIZE", "4096")), 24 * 3600)
+_search_cache = TTLCache("search", int(os.environ.get("DEEPSEARCHER_SEARCH_CACHE_SIZE", "2048")),
+                         float(os.environ.get("DEEPSEARCHER_SEARCH_CACHE_TTL", "900")))
+_answer_cache = TTLCache("answer", int(os.environ.get("DEEPSEARCHER_ANSWER_CACHE_SIZE", "512")),
+                         float(os.environ.get("DEEPSEARCHER_ANSWER_CACHE_TTL", "3600")))
+# SearchFilter → materialized Partition, or the filter's row count when it is too large to materialize
+# (reranker, query, document, passage hash) → reranker score; not tied to any category
+_rerank_cache = TTLCache("rerank", int(os.environ.get("DEEPSEARCHER_RERANK_CACHE_SIZE", "20000")),
+                         float(os.environ.get("DEEPSEARCHER_RERANK_CACHE_TTL", "86400")))
+_partition_cache = TTLCache("partition", int(os.environ.get("DEEPSEARCHER_PARTITION_CACHE_SIZE", "32")),
+                            float(os.environ.get("DEEPSEARCHER_PARTITION_CACHE_TTL", "3600")),
+                            max_bytes=int(PARTITION_CACHE_MB * 1024 * 1024))
+
+def invalidate_query_caches(categories) -> None:
+    """Drop cached search results/answers that new chunks in `categories` could change."""
+    tags = set(categories) | {"*"}
+    _search_cache.invalidate(tags)
+    _answer_cache.invalidate(tags)
+    _partition_cache.invalidate(tags)
+
+def query_embedding(query: str) -> List[float]:
+    return query_embeddings([query])[0]
+
+def query_embeddings(queries: List[str]) -> List[List[float]]:
+    """Cached query vectors; all misses are embedded in a single model call."""
+    embs = [_qemb_cache.get(q) for q in queries]
+    missing = list(dict.fromkeys(q for q, e in zip(queries, embs) if e is None))
+    if missing:
+        with span("query_embed"):
+            fresh = dict(zip(missing, embed_texts(missing, timeout=EMBED_QUEUE_TIMEOUT)))
+        for q, e in fresh.items():
+            _qemb_cache.set(q, e)
+        embs = [e if e is not None else fresh[q] for q, e in zip(queries, embs)]
+    return embs
+
 # ─── Search ────────────────────────────────────────────────────────────────────
-def vector_search(query: str, top_k: int = 10, category_filter: Optional[str] = None) -> List[Dict]:
-    col = get_collection()
-    if col.count() == 0:
-        return []
+SearchMode = Literal["dense", "lexical", "hybrid"]
+RRF_K = 60
+YEAR_MIN, YEAR_MAX = 1900, 2099        # parse_meta only recognises 19xx / 20xx years
 
-    q_emb = embed_texts([query])[0]
-    where = {"category": {"$eq": category_filter}} if category_filter else None
+class SearchFilter(NamedTuple):
+    """
+    Metadata restriction applied before ranking: any of `categories`, any of
+    `subcategories`, and a year between year_from and year_to (inclusive; chunks
+    without a year fail a year filter). None means unrestricted. Hashable, so it
+    keys the caches and groups batched queries.
+    """
+    categories: Optional[Tuple[str, ...]] = None
+    subcategories: Optional[Tuple[str, ...]] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
+
+    @property
+    def year_range(self) -> Optional[Tuple[int, int]]:
+        if self.year_from is None and self.year_to is None:
+            return None
+        return (max(self.year_from or YEAR_MIN, YEAR_MIN), min(self.year_to or YEAR_MAX, YEAR_MAX))
+
+    def tags(self) -> Tuple[str, ...]:
+        return self.categories or ("*",)
+
+    def split(self) -> List["SearchFilter"]:
+        """One filter per category (the per-category partitions searched and merged)."""
+        if not self.categories or len(self.categories) == 1:
+            return [self]
+        return [self._replace(categories=(c,)) for c in self.categories]
+
+    def where(self) -> Optional[Dict]:
+        """The equivalent ChromaDB `where` clause (years are stored as strings, hence $in)."""
+        clauses = [{field: {"$in": list(values)}} for field, values in
+                   (("category", self.categories), ("subcategory", self.subcategories)) if values]
+        if self.year_range:
+            lo, hi = self.year_range
+            clauses.append({"year": {"$in": [str(y) for y in range(lo, hi + 1)]}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def make_filter(categories=None, subcategories=None, year_from: Optional[int] = None,
+                year_to: Optional[int] = None) -> Optional[SearchFilter]:
+    """A normalized SearchFilter, or None when nothing is restricted. Raises ValueError on an empty year range."""
+    if year_from is not None and year_to is not None and year_from > year_to:
+        raise ValueError(f"year_from {year_from} is after year_to {year_to}")
+    flt = SearchFilter(tuple(sorted(set(categories))) if categories else None,
+                       tuple(sorted(set(subcategories))) if subcategories else None, year_from, year_to)
+    return flt if flt != SearchFilter() else None
+
+def _as_filter(filters: Union[str, SearchFilter, None]) -> Optional[SearchFilter]:
+    if isinstance(filters, str):
+        return make_filter([filters])
+    return filters if filters else None
+
+def vector_search(query: str, top_k: int = 10, filters: Union[str, SearchFilter, None] = None,
+                  mode: SearchMode = "dense") -> List[Dict]:
+    """
+    Search deduplicated per document. mode: 'dense' (embeddings), 'lexical' (BM25)
+    or 'hybrid' (reciprocal rank fusion of both). filters: a SearchFilter, or a
+    single category name. Results are fresh dicts (safe to mutate).
+    """
+    return vector_search_batch([(query, top_k, filters, mode)])[0]
+
+def vector_search_batch(requests: List[tuple]) -> List[List[Dict]]:
+    """
+    vector_search over many (query, top_k, filters, mode) requests at once.
+    Cache misses are embedded in one model call and the dense legs run as one
+    multi-embedding search per distinct filter; each request is then cut to its
+    own top_k and deduplicated by document.
+    """
+    keys = [(q, k, _as_filter(flt), mode) for q, k, flt, mode in requests]
+    out: List[Optional[List[Dict]]] = [_search_cache.get(key) for key in keys]
+    missing = list(dict.fromkeys(key for key, r in zip(keys, out) if r is None))
+    if missing:
+        dense = [key for key in missing if key[3] != "lexical"]
+        embs = dict(zip(dense, query_embeddings([key[0] for key in dense])))
+        by_filter: Dict[Optional[SearchFilter], List[tuple]] = {}
+        for key in dense:
+            by_filter.setdefault(key[2], []).append(key)
+        dense_hits: Dict[tuple, List[Dict]] = {}
+        for flt, group in by_filter.items():
+            depths = [key[1] if key[3] == "dense" else _hybrid_depth(key[1]) for key in group]
+            with span("dense_search"):
+                for key, hits in zip(group, _vector_search_embs([embs[key] for key in group], depths, flt)):
+                    dense_hits[key] = hits
+        fresh: Dict[tuple, List[Dict]] = {}
+        for key in missing:
+            q, k, flt, mode = key
+            if mode == "lexical":
+                fresh[key] = _lexical_search(q, k, flt)
+            elif mode == "dense":
+                fresh[key] = dense_hits[key]
+            else:
+                fresh[key] = _fuse_rrf([dense_hits[key], _lexical_search(q, _hybrid_depth(k), flt)], k)
+            _search_cache.set(key, fresh[key], tags=flt.tags() if flt else ("*",))
+        out = [r if r is not None else fresh[key] for key, r in zip(keys, out)]
+    return [[dict(r) for r in res] for res in out]
+
+async def vector_search_many(queries: List[str], top_k: int = 10, filters: Union[str, SearchFilter, None] = None,
+                             mode: SearchMode = "dense") -> List[List[Dict]]:
+    """Async vector_search over several queries, run as one vector_search_batch off the event loop."""
+    return await asyncio.to_thread(vector_search_batch, [(q, top_k, filters, mode) for q in queries])
+
+def _hybrid_depth(top_k: int) -> int:
+    return max(top_k * 2, 20)
+
+def _fuse_rrf(rankings: List[List[Dict]], top_k: int) -> List[Dict]:
+    """Reciprocal rank fusion by document; score rescaled so rank 1 in every list = 100."""
+    fused: Dict[str, float] = {}
+    rows: Dict[str, Dict] = {}
+    for ranking in rankings:
+        for rank, r in enumerate(ranking):
+            path = r["relativePath"]
+            fused[path] = fused.get(path, 0.0) + 1.0 / (RRF_K + rank + 1)
+            rows.setdefault(path, r)
+    best = len(rankings) / (RRF_K + 1)
+    top = sorted(fused, key=lambda p: -fused[p])[:top_k]
+    return [{**rows[p], "score": round(fused[p] / best * 100, 2)} for p in top]
 
-    kwargs: Dict[str, Any] = {
-        "query_embeddings": [q_emb],
-        "n_results": min(top_k * 2, max(col.count(), 1)),
-        "include": ["metadatas", "documents", "distances"],
+def _result_row(meta: Dict, doc: str, score: float) -> Dict:
+    return {
+        "documentId":   meta.get("doc_id", "").split("_")[0],
+        "title":        meta.get("title", ""),
+        "category":     meta.get("category", ""),
+        "subcategory":  meta.get("subcategory", ""),
+        "number":       meta.get("number", ""),
+        "date":         meta.get("year", ""),
+        "relevantText": doc,
+        "score":        score,
+        "relativePath": meta.get("relative_path", ""),
+        "_sentences":   meta.get("sentences", ""),      # dropped by present_rows
     }
-    if where:
-        kwargs["where"] = where
 
-    results = col.query(**kwargs)
+def _lexical_search(query: str, top_k: int, flt: Optional[SearchFilter]) -> List[Dict]:
+    with span("lexical_search"):
+        return _lexical_search_rows(query, top_k, flt)
 
-    # Deduplicate by relative_path, keep best score
-    seen: Dict[str, Dict] = {}
-    metadatas = results.get("metadatas", [[]])[0]
-    documents = results.get("documents", [[]])[0]
-    distances = results.get("distances", [[]])[0]
+# The BM25 index filters categories and years itself but does not hold subcategories;
+# those are checked on the hits' metadata, from a deeper hit list
+LEXICAL_SUBCATEGORY_DEPTH = 20
 
-    for meta, doc, dist in zip(metadatas, documents, distances):
+def _lexical_search_rows(query: str, top_k: int, flt: Optional[SearchFilter]) -> List[Dict]:
+    flt = flt or SearchFilter()
+    depth = top_k * (LEXICAL_SUBCATEGORY_DEPTH if flt.subcategories else 3)
+    hits = get_lexical_index().search(query, depth, categories=flt.categories, year_range=flt.year_range)
+    if not hits:
+        return []
+    got = get_collection().get(ids=[cid for cid, _ in hits], include=["metadatas", "documents"])
+    by_id = {cid: (m, d) for cid, m, d in zip(got["ids"], got["metadatas"], got["documents"])}
+    best = hits[0][1]
+    seen: Dict[str, Dict] = {}
+    for cid, bm25 in hits:
+        if cid not in by_id:
+            continue
+        meta, doc = by_id[cid]
+        if flt.subcategories and meta.get("subcategory", "") not in flt.subcategories:
+            continue
         path = meta.get("relative_path", "")
+        if path not in seen:                       # hits are already sorted best-first
+            seen[path] = _result_row(meta, doc, round(bm25 / best * 100, 2))
+    return list(seen.values())[:top_k]
+
+def _vector_search_embs(q_embs: List[List[float]], top_ks: List[int],
+                        flt: Optional[SearchFilter]) -> List[List[Dict]]:
+    """One col.query (or compact store scan) for several query vectors sharing a filter; per-query top_k."""
+    if VECTOR_STORE == "compact":
+        return _compact_search_embs(q_embs, top_ks, flt)
+    if flt is not None:
+        return _filtered_search_embs(q_embs, top_ks, flt)
+    col = get_collection()
+    count = col.count()
+    if count == 0:
+        return [[] for _ in q_embs]
+
+    results = col.query(
+        query_embeddings=q_embs,
+        n_results=min(max(top_ks) * 2, max(count, 1)),
+        include=["metadatas", "documents", "distances"],
+    )
+
+    out = []
+    for qi, top_k in enumerate(top_ks):
+        # Only this query's own n_results count
+        n = top_k * 2
+        metadatas = (results.get("metadatas") or [[]])[qi][:n]
+        documents = (results.get("documents") or [[]])[qi][:n]
+        distances = (results.get("distances") or [[]])[qi][:n]
         # ChromaDB cosine distance: 0=identical, 2=opposite → convert to 0-100 score
-        score = round((1.0 - float(dist)) * 100, 2)
+        out.append(_dedupe_by_document(
+            ((meta, doc, round((1.0 - float(dist)) * 100, 2)) for meta, doc, dist in zip(metadatas, documents, distances)),
+            top_k))
+    return out
+
+def _get_partition(key: SearchFilter):
+    """The materialized Partition for `key`, or None when more than PARTITION_MAX_ROWS chunks match it."""
+    from partitions import Partition
+    cached = _partition_cache.get(key)
+    if cached is None:
+        with _partition_lock:
+            cached = _partition_cache.get(key)
+            if cached is None:
+                col = get_collection()
+                with span("partition_build"):
+                    probe = col.get(where=key.where(), limit=PARTITION_MAX_ROWS + 1, include=[])
+                    if len(probe["ids"]) > PARTITION_MAX_ROWS:
+                        cached = len(probe["ids"])
+                    else:
+                        got = col.get(ids=probe["ids"], include=["embeddings", "metadatas"]) if probe["ids"] \
+                            else {"ids": [], "embeddings": [], "metadatas": []}
+                        metas = got["metadatas"]
+                        cached = Partition(got["ids"], got["embeddings"], [m.get("relative_path", "") for m in metas],
+                                           [m.get("year", "") for m in metas], [m.get("subcategory", "") for m in metas])
+                _partition_cache.set(key, cached, tags=key.tags())
+    return cached if isinstance(cached, Partition) else None
+
+_partition_lock = threading.Lock()
+
+def _filtered_search_embs(q_embs: List[List[float]], top_ks: List[int], flt: SearchFilter) -> List[List[Dict]]:
+    """
+    _vector_search_embs under a filter on ChromaDB. Each category of the filter is
+    searched on its own and the chunk lists are merged by score: exactly over a
+    materialized partition (the whole category, narrowed by subcategory/year, or
+    failing that just the filtered rows) when one is small enough, otherwise with
+    the collection's filtered HNSW search. A partition ranks whole documents, so
+    its share of the merge is exact.
+    """
+    col = get_collection()
+    if col.count() == 0:
+        return [[] for _ in q_embs]
+    depth = max(top_ks) * 2
+    rows: List[List[tuple]] = [[] for _ in q_embs]        # (meta, doc, score) per query
+    exact: List[List[tuple]] = [[] for _ in q_embs]       # (chunk id, cosine) per query
+    for part in flt.split():
+        # Broadest first: the whole category (narrowed in the scan), then only the rows the filter matches
+        keys = dict.fromkeys([SearchFilter(categories=part.categories)] if part.categories else [])
+        keys[part] = None
+        partition = next((p for p in map(_get_partition, keys) if p is not None), None)
+        if partition is not None:
+            for qi, hits in enumerate(partition.search(q_embs, max(top_ks), part.subcategories, part.year_range,
+                                                       per_doc=_chunks_per_doc())):
+                exact[qi].extend(hits)
+            continue
+        res = col.query(query_embeddings=q_embs, n_results=min(depth, col.count()), where=part.where(),
+                        include=["metadatas", "documents", "distances"])
+        for qi, top_k in enumerate(top_ks):
+            n = top_k * 2
+            rows[qi].extend((meta, doc, round((1.0 - float(dist)) * 100, 2)) for meta, doc, dist in
+                            zip(res["metadatas"][qi][:n], res["documents"][qi][:n], res["distances"][qi][:n]))
+    ids = list(dict.fromkeys(cid for per_query in exact for cid, _ in per_query))
+    if ids:
+        got = col.get(ids=ids, include=["metadatas", "documents"])
+        by_id = {cid: (m, d) for cid, m, d in zip(got["ids"], got["metadatas"], got["documents"])}
+        for qi, per_query in enumerate(exact):
+            rows[qi].extend((*by_id[cid], round(cos * 100, 2)) for cid, cos in per_query if cid in by_id)
+    return [_dedupe_by_document(r, top_k) for r, top_k in zip(rows, top_ks)]
+
+def _compact_search_embs(q_embs: List[List[float]], top_ks: List[int],
+                         flt: Optional[SearchFilter]) -> List[List[Dict]]:
+    """_vector_search_embs over the compact store (which applies filters inside its scan); one col.get for documents."""
+    flt = flt or SearchFilter()
+    hits = get_compact_store().search(q_embs, max(top_ks) * 2, flt.categories, flt.year_range, flt.subcategories)
+    ids = list(dict.fromkeys(cid for per_query in hits for cid, _ in per_query))
+    if not ids:
+        return [[] for _ in q_embs]
+    got = get_collection().get(ids=ids, include=["metadatas", "documents"])
+    by_id = {cid: (m, d) for cid, m, d in zip(got["ids"], got["metadatas"], got["documents"])}
+    return [_dedupe_by_document(((*by_id[cid], round(cos * 100, 2)) for cid, cos in per_query[:top_k * 2]
+                                 if cid in by_id), top_k)
+            for per_query, top_k in zip(hits, top_ks)]
+
+def _chunks_per_doc() -> int:
+    return 1 if DOC_AGGREGATION == "max" else max(1, DOC_AGGREGATION_CHUNKS)
+
+def _dedupe_by_document(rows, top_k: int) -> List[Dict]:
+    """
+    (meta, doc, score) chunk rows → one row per relative_path, top_k of them: the
+    best chunk's row, scored by DOC_AGGREGATION over the document's chunks, with
+    the number of chunks that matched as "matchedChunks".
+    """
+    seen: Dict[str, Dict] = {}
+    chunk_scores: Dict[str, List[float]] = {}
+    for meta, doc, score in rows:
+        path = meta.get("relative_path", "")
+        chunk_scores.setdefault(path, []).append(score)
         if path not in seen or score > seen[path]["score"]:
-            seen[path] = {
-                "documentId":   meta.get("doc_id", "").split("_")[0],
-                "title":        meta.get("title", ""),
-                "category":     meta.get("category", ""),
-                "subcategory":  meta.get("subcategory", ""),
-                "number":       meta.get("number", ""),
-                "date":         meta.get("year", ""),
-                "relevantText": doc,
-                "score":        score,
-                "relativePath": path,
-            }
-
-    top = sorted(seen.values(), key=lambda x: -x["score"])[:top_k]
-    return top
+            seen[path] = _result_row(meta, doc, score)
+    for path, row in seen.items():
+        scores = sorted(chunk_scores[path], reverse=True)
+        row["matchedChunks"] = len(scores)
+        if DOC_AGGREGATION == "sum":
+            row["score"] = round(sum(scores[:_chunks_per_doc()]), 2)
+        elif DOC_AGGREGATION == "decay":
+            row["score"] = round(sum(s * DOC_AGGREGATION_DECAY ** i for i, s in enumerate(scores[:_chunks_per_doc()])), 2)
+    return sorted(seen.values(), key=lambda x: -x["score"])[:top_k]
+
+def present_rows(rows: List[Dict], query: str, passage_chars: Optional[int] = None) -> List[Dict]:
+    """
+    Result rows as returned to clients: relevantText cut to the passage of at most
+    passage_chars (default PASSAGE_CHARS; 0 keeps the whole chunk) that best covers
+    the query terms, and "highlights" — [start, end) spans of those terms in it.
+    Works from the sentence offsets stored with each chunk, so nothing is re-read.
+    """
+    from passages import best_passage, decode_offsets, query_terms
+    limit = PASSAGE_CHARS if passage_chars is None else passage_chars
+    terms = query_terms(query)
+    out = []
+    with span("passages"):
+        for r in rows:
+            r = dict(r)
+            text, offsets = r.get("relevantText", ""), r.pop("_sentences", None)
+            if limit > 0:
+                r["relevantText"], r["highlights"] = best_passage(text, terms, limit, decode_offsets(offsets, text))
+            else:
+                r["highlights"] = best_passage(text, terms, len(text), [len(text)])[1]
+            out.append(r)
+    return out
+
+# ─── KAG identifier index ──────────────────────────────────────────────────────
+# Persistent map of normalized law/case numbers → files under LEGAL_DB_ROOT.
+# Rows live in the state DB and are refreshed incrementally by file mtime; the
+# key → paths map and a sorted key list stay in memory for O(1)/prefix lookups.
+_ident_keys: Dict[str, List[str]] = {}
+_ident_sorted: List[str] = []
+_ident_docs: Dict[str, Dict[str, str]] = {}
+_ident_lock = threading.Lock()
+# A key that only starts with the one asked for ("gr:12" → "gr:1234") is a near
+# miss, not the document named: such rows are labelled prefix_match and rank lower
+PREFIX_MATCH_SCORE = 50.0
+
+def _ident_schema(conn: sqlite3.Connection):
+    conn.execute("""CREATE TABLE IF NOT EXISTS ident_files (
+        rel_path TEXT PRIMARY KEY, mtime_ns INTEGER, size INTEGER, key TEXT,
+        title TEXT, number TEXT, year TEXT, snippet TEXT)""")
+    conn.execute("CREATE INDEX IF NOT EXISTS ident_files_key ON ident_files(key)")
+
+def load_ident_index() -> int:
+    """Load the identifier index from the state DB into memory. Returns file count."""
+    global _ident_keys, _ident_sorted, _ident_docs
+    conn = _state_db()
+    try:
+        _ident_schema(conn)
+        rows = conn.execute("SELECT rel_path, key, title, number, year FROM ident_files").fetchall()
+    finally:
+        conn.close()
+    keys: Dict[str, List[str]] = {}
+    docs: Dict[str, Dict[str, str]] = {}
+    for rel_path, key, title, number, year in rows:
+        docs[rel_path] = {"title": title, "number": number, "year": year, "name": Path(rel_path).name.lower()}
+        if key:
+            keys.setdefault(key, []).append(rel_path)
+    for paths in keys.values():
+        paths.sort()
+    _ident_keys, _ident_sorted, _ident_docs = keys, sorted(keys), docs
+    return len(docs)
+
+def refresh_ident_index() -> Dict[str, int]:
+    """
+    Bring the identifier index up to date with LEGAL_DB_ROOT.
+    Only files whose mtime/size changed are re-read, and only as far as the snippet
+    needs; vanished files are dropped.
+    """
+    from html_stream import extract_prefix
+    stats = {"scanned": 0, "updated": 0, "removed": 0}
+    if not os.path.isdir(LEGAL_DB_ROOT):
+        return stats
+    with _ident_lock:
+        conn = _state_db()
+        try:
+            _ident_schema(conn)
+            known = {r[0]: (r[1], r[2]) for r in conn.execute("SELECT rel_path, mtime_ns, size FROM ident_files")}
+            seen = set()
+            for root, dirs, files in os.walk(LEGAL_DB_ROOT):
+                for fname in files:
+                    if not re.search(r'\.html?$', fname, re.I):
+                        continue
+                    abs_path = os.path.join(root, fname)
+                    rel_path = os.path.relpath(abs_path, LEGAL_DB_ROOT).replace('\\', '/')
+                    try:
+                        st = os.stat(abs_path)
+                    except OSError:
+                        continue
+                    seen.add(rel_path)
+                    stats["scanned"] += 1
+                    if known.get(rel_path) == (st.st_mtime_ns, st.st_size):
+                        continue
+                    meta = parse_meta(fname)
+                    try:
+                        snippet = extract_prefix(abs_path, 2000)
+                    except Exception:
+                        snippet = ""
+                    _ident_from_caption(meta, snippet)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO ident_files VALUES (?,?,?,?,?,?,?,?)",
+                        (rel_path, st.st_mtime_ns, st.st_size, meta["key"], meta["title"], meta["number"], meta["year"],
+                         snippet),
+                    )
+                    stats["updated"] += 1
+                    if stats["updated"] % 1000 == 0:
+                        conn.commit()
+            removed = [(p,) for p in known if p not in seen]
+            conn.executemany("DELETE FROM ident_files WHERE rel_path = ?", removed)
+            stats["removed"] = len(removed)
+            # Rows written before numbers were read from captions have a NULL key; fill them from the stored snippet
+            stale = conn.execute("SELECT rel_path, title, year, snippet FROM ident_files WHERE key IS NULL").fetchall()
+            for rel_path, title, year, snippet in stale:
+                meta = {"number": "", "key": "", "year": year, "promulgated": ""}
+                _ident_from_caption(meta, snippet or "")
+                conn.execute("UPDATE ident_files SET key = ?, number = ?, year = ? WHERE rel_path = ?",
+                             (meta["key"], meta["number"], meta["year"], rel_path))
+            conn.commit()
+        finally:
+            conn.close()
+        load_ident_index()
+    print(f"[DeepSearcher] Identifier index: {stats['scanned']} files, "
+          f"{stats['updated']} updated, {stats['removed']} removed")
+    return stats
+
+def _ident_from_caption(meta: Dict[str, str], snippet: str) -> None:
+    """Fill a file-name meta's missing number/key/year from the document's caption, as prepare_document does."""
+    if meta["number"] and meta["year"]:
+        return
+    from citations import primary, scan
+    head = scan(snippet[:DOC_HEAD_CHARS])
+    own = primary(head.citations)
+    if own and not meta["number"]:
+        meta["number"], meta["key"] = own.text, own.key
+    if head.dates and not meta["year"]:
+        meta["year"] = head.dates[0][:4]
+
+def _ident_snippets(paths: List[str]) -> Dict[str, str]:
+    marks = ",".join("?" * len(paths))
+    conn = _state_db()
+    try:
+        return dict(conn.execute(f"SELECT rel_path, snippet FROM ident_files WHERE rel_path IN ({marks})",
+                                 paths).fetchall())
+    finally:
+        conn.close()
+
+def _ident_resolve(identifier: str, lookup_type: str, limit: int) -> Tuple[List[str], bool]:
+    """Files for an identifier, and False when they only share a key prefix with it."""
+    from citations import KINDS
+    kinds = [lookup_type.lower()] if lookup_type != "auto" else KINDS
+    key = identifier_key(identifier, lookup_type)
+    candidates = [key] if key else []
+    if not key and re.fullmatch(r'\s*\d+(?:-\d+)*\s*', identifier):
+        candidates = [f"{k}:{identifier.strip()}" for k in kinds]
+
+    paths: List[str] = []
+    for k in candidates:                      # exact: O(1) dict hit per key
+        paths.extend(_ident_keys.get(k, []))
+    if paths:
+        return list(dict.fromkeys(paths))[:limit], True
+    for k in candidates:                      # prefix: bisect over sorted keys
+        i = bisect.bisect_left(_ident_sorted, k)
+        while i < len(_ident_sorted) and _ident_sorted[i].startswith(k) and len(paths) < limit:
+            paths.extend(_ident_keys.get(_ident_sorted[i], []))
+            i += 1
+    if paths:
+        return list(dict.fromkeys(paths))[:limit], False
+    if not key:
+        # Free-text identifier (e.g. a case title): match against cached file names
+        norm = identifier.strip().lower()
+        alt = norm.replace(' ', '_')
+        paths = [p for p, d in _ident_docs.items() if norm in d["name"] or alt in d["name"]][:limit]
+    return paths, True
 
 # ─── KAG exact lookup ──────────────────────────────────────────────────────────
 def exact_lookup(identifier: str, lookup_type: str = "auto") -> List[Dict]:
     """
-    Find documents by exact law/case number.
+    Find documents by exact law/case number via the identifier index.
     lookup_type: 'gr' | 'ra' | 'bp' | 'eo' | 'pd' | 'ao' | 'auto'
     """
-    from pathlib import Path
-    import os
+    paths, exact = _ident_resolve(identifier, lookup_type, limit=5)
+    return _exact_rows(paths, identifier, exact)
 
-    if not os.path.isdir(LEGAL_DB_ROOT):
+def _exact_rows(paths: List[str], identifier: str, exact: bool = True) -> List[Dict]:
+    if not paths:
         return []
-
-    norm = identifier.strip().lower()
+    snippets = _ident_snippets(paths)
 
     matches = []
-    for root, dirs, files in os.walk(LEGAL_DB_ROOT):
-        # Skip deep year dirs to keep it fast — just top 2 levels
-        rel = os.path.relpath(root, LEGAL_DB_ROOT)
-        depth = len(Path(rel).parts)
-        if depth > 3:
-            dirs.clear()
-            continue
-        for fname in files:
-            if not re.search(r'\.html?$', fname, re.I):
-                continue
-            if norm in fname.lower() or norm.replace(' ', '_') in fname.lower():
-                abs_path = os.path.join(root, fname)
-                rel_path = os.path.relpath(abs_path, LEGAL_DB_ROOT).replace('\\', '/')
-                meta = parse_meta(fname)
-                try:
-                    with open(abs_path, 'r', encoding='utf-8', errors='replace') as f:
-                        text = html_to_text(f.read())[:2000]
-                except Exception:
-                    text = ""
-                matches.append({
-                    "documentId":   hashlib.sha256(rel_path.encode()).hexdigest()[:16],
-                    "title":        meta["title"],
-                    "number":       meta["number"] or identifier,
-                    "date":         meta["year"],
-                    "relevantText": text,
-                    "score":        100.0,
-                    "relativePath": rel_path,
-                    "category":     "exact_match",
-                    "subcategory":  "lookup",
-                })
-    return matches[:5]
+    for rel_path in paths:
+        meta = _ident_docs.get(rel_path, {})
+        matches.append({
+            "documentId":   hashlib.sha256(rel_path.encode()).hexdigest()[:16],
+            "title":        meta.get("title", ""),
+            "number":       meta.get("number") or identifier,
+            "date":         meta.get("year", ""),
+            "relevantText": snippets.get(rel_path, ""),
+            "score":        100.0 if exact else PREFIX_MATCH_SCORE,
+            "relativePath": rel_path,
+            "category":     "exact_match" if exact else "prefix_match",
+            "subcategory":  "lookup",
+        })
+    return matches
+
+# ─── Citation graph ────────────────────────────────────────────────────────────
+# Which documents cite which authority: (citing rel_path, cited key) rows in the
+# state DB, written with a document's chunks (their "citations" metadata) and
+# dropped with them. How many documents cite a key is the authority prior that
+# /query adds to a source's score. Collections indexed before the graph existed
+# are backfilled from their stored chunk text (backfill_citations) until a
+# completed backfill is recorded in citations_state.
+_citation_counts: Optional[Dict[str, int]] = None
+_citation_lock = threading.Lock()
+
+def _citations_schema(conn: sqlite3.Connection):
+    conn.execute("CREATE TABLE IF NOT EXISTS citations (src TEXT, key TEXT, PRIMARY KEY (src, key))")
+    conn.execute("CREATE INDEX IF NOT EXISTS citations_key ON citations(key)")
+    conn.execute("CREATE TABLE IF NOT EXISTS citations_state (name TEXT PRIMARY KEY, value TEXT)")
+
+def _citations_changed() -> None:
+    global _citation_counts
+    with _citation_lock:
+        _citation_counts = None
+
+def record_citations(metas: List[Dict]) -> int:
+    """Add the graph edges of stored chunks (their relative_path → "citations" keys)."""
+    rows = {(m.get("relative_path", ""), key) for m in metas for key in (m.get("citations") or "").split(",") if key}
+    if not rows:
+        return 0
+    conn = _state_db()
+    try:
+        with conn:
+            _citations_schema(conn)
+            conn.executemany("INSERT OR IGNORE INTO citations VALUES (?, ?)", rows)
+    finally:
+        conn.close()
+    _citations_changed()
+    return len(rows)
+
+def forget_citations(paths: Optional[List[str]]) -> None:
+    """Drop the edges of documents leaving the index (all of them for None)."""
+    conn = _state_db()
+    try:
+        with conn:
+            _citations_schema(conn)
+            if paths is None:
+                conn.execute("DELETE FROM citations")
+            else:
+                conn.executemany("DELETE FROM citations WHERE src = ?", [(p,) for p in paths])
+    finally:
+        conn.close()
+    _citations_changed()
+
+def citation_counts() -> Dict[str, int]:
+    """Cited key → number of indexed documents citing it."""
+    global _citation_counts
+    with _citation_lock:
+        if _citation_counts is None:
+            conn = _state_db()
+            try:
+                _citations_schema(conn)
+                _citation_counts = dict(conn.execute("SELECT key, COUNT(*) FROM citations GROUP BY key").fetchall())
+            finally:
+                conn.close()
+        return _citation_counts
+
+def citing_documents(key: str, limit: int = 20) -> List[str]:
+    conn = _state_db()
+    try:
+        _citations_schema(conn)
+        return [r[0] for r in conn.execute("SELECT src FROM citations WHERE key = ? ORDER BY src LIMIT ?", (key, limit))]
+    finally:
+        conn.close()
+
+def _with_citations(docs: List[str], metas: List[Dict]) -> List[Dict]:
+    """Chunk metadatas, with "citations" read from the chunk text where it was not stored at index time."""
+    from citations import citation_keys, scan
+    return [m if "citations" in m else
+            {**m, "citations": ",".join(citation_keys(scan(doc).citations,
+                                                      identifier_key(m.get("number") or ""))[:CHUNK_CITATIONS_MAX])}
+            for doc, m in zip(docs, metas)]
+
+def backfill_citations(page: int = 5000) -> int:
+    """
+    Build the graph from the collection's chunks unless a backfill has completed
+    before. Returns edges added. Edges are inserted idempotently, so a backfill cut
+    short (crash, restart) simply runs again in full on the next start.
+    """
+    with _writer_lock:
+        conn = _state_db()
+        try:
+            with conn:
+                _citations_schema(conn)
+            done = conn.execute("SELECT 1 FROM citations_state WHERE name = 'backfilled'").fetchone()
+        finally:
+            conn.close()
+        if done:
+            return 0
+        col, added, offset = get_collection(), 0, 0
+        while True:
+            batch = col.get(include=["documents", "metadatas"], limit=page, offset=offset)
+            if not batch["ids"]:
+                break
+            added += record_citations(_with_citations(batch["documents"], batch["metadatas"]))
+            offset += len(batch["ids"])
+        conn = _state_db()
+        try:
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO citations_state VALUES ('backfilled', ?)", (str(time.time()),))
+        finally:
+            conn.close()
+    if added:
+        print(f"[DeepSearcher] Citation graph backfilled: {added} edges")
+    return added
+
+def boost_authorities(query: str, rows: List[Dict], flt: Optional[SearchFilter] = None,
+                      scored: Optional[int] = None) -> List[Dict]:
+    """
+    /query sources re-scored with the citation graph: each row gains
+    CITATION_BOOST × ln(1 + "citedBy", the documents citing it), and the documents
+    a citation in the query names gain CITATION_MATCH_BOOST. Such documents that
+    retrieval missed are added from the identifier index when no filter is set.
+
+    Only the first `scored` rows (all by default) carry reranker scores; the rest
+    still hold first-stage scores on another scale, so the two groups are re-sorted
+    separately and the unscored tail stays behind.
+    """
+    from citations import citation_keys, scan
+    counts = citation_counts()
+    wanted = set(citation_keys(scan(query).citations))
+    head, tail = (rows, []) if scored is None else (rows[:scored], rows[scored:])
+    if wanted and flt is None:
+        have = {r["relativePath"] for r in rows}
+        for key in wanted:
+            paths = [p for p in _ident_keys.get(key, [])[:5] if p not in have]
+            head = head + _exact_rows(paths, key)
+            have.update(paths)
+
+    def boosted(group: List[Dict]) -> List[Dict]:
+        out = []
+        for r in group:
+            key = identifier_key(r["number"]) if r.get("number") else None
+            cited = counts.get(key, 0) if key else 0
+            bonus = CITATION_BOOST * math.log1p(cited) + (CITATION_MATCH_BOOST if key in wanted else 0.0)
+            out.append({**r, "score": round(r["score"] + bonus, 2), "citedBy": cited})
+        return sorted(out, key=lambda r: -r["score"])
+    return boosted(head) + boosted(tail)
 
 # ─── LLM helper (DeepSearch synthesis) ────────────────────────────────────────
-def llm_synthesize(query: str, sources: List[Dict], sub_queries: List[str]) -> str:
-    if not LLM_API_KEY:
-        return f"[No LLM configured] Retrieved {len(sources)} sources for: {query}"
-    import urllib.request, json as _json
+# One keep-alive connection pool to LLM_BASE_URL shared by all requests.
+_llm_client: Optional[httpx.AsyncClient] = None
+
+def _get_llm_client() -> httpx.AsyncClient:
+    global _llm_client
+    if _llm_client is None:
+        _llm_client = httpx.AsyncClient(
+            base_url=LLM_BASE_URL.rstrip('/'),
+            headers={"Authorization": f"Bearer {LLM_API_KEY}", "Content-Type": "application/json"},
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                max_keepalive_connections=LLM_MAX_CONNECTIONS, keepalive_expiry=60),
+            timeout=httpx.Timeout(60, connect=10),
+        )
+    return _llm_client
+
+LLM_REQUESTS = REGISTRY.register(Counter(
+    "deepsearcher_llm_requests_total", "LLM calls by kind and outcome.", ["call", "outcome"]))
+
+async def llm_chat(messages: List[Dict[str, str]], temperature: float, max_tokens: int,
+                   timeout: float = 60) -> str:
+    """Single OpenAI-compatible chat completion. Raises on transport/HTTP errors."""
+    try:
+        resp = await _get_llm_client().post("/v1/chat/completions", timeout=timeout, json={
+            "model": LLM_MODEL, "messages": messages,
+            "temperature": temperature, "max_tokens": max_tokens,
+        })
+        resp.raise_for_status()
+        content = resp.json()["choices"][0]["message"]["content"]
+    except Exception:
+        LLM_REQUESTS.inc(call="chat", outcome="error")
+        raise
+    LLM_REQUESTS.inc(call="chat", outcome="ok")
+    return content
+
+async def llm_stream(messages: List[Dict[str, str]], temperature: float, max_tokens: int):
+    """Yield content deltas from an OpenAI-compatible `stream: true` completion."""
+    try:
+        async with _get_llm_client().stream("POST", "/v1/chat/completions", json={
+            "model": LLM_MODEL, "messages": messages,
+            "temperature": temperature, "max_tokens": max_tokens, "stream": True,
+        }) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if delta:
+                    yield delta
+    except Exception:
+        LLM_REQUESTS.inc(call="stream", outcome="error")
+        raise
+    LLM_REQUESTS.inc(call="stream", outcome="ok")
+
+async def decompose_query(query: str) -> List[str]:
+    """Split a long question into 2-4 focused sub-queries (original query first)."""
+    if len(query.split()) <= 5 or not LLM_API_KEY:
+        return [query]
+    try:
+        raw = await llm_chat([
+            {"role": "system", "content": "Output ONLY a JSON array of 2-4 focused sub-queries for searching a Philippine legal database. No other text."},
+            {"role": "user", "content": f"Decompose this legal question: {query}"},
+        ], temperature=0.2, max_tokens=300, timeout=10)
+        m = re.search(r'\[.*?\]', raw, re.S)
+        if m:
+            parsed = json.loads(m.group(0))
+            if isinstance(parsed, list) and len(parsed) > 0:
+                return [query] + [str(q) for q in parsed[:3]]
+    except Exception:
+        pass
+    return [query]
+
+def _synthesis_depth() -> int:
+    """Sources given to the LLM: fewer once a model reranker has put the best ones first."""
+    return RERANK_SOURCES if get_reranker().is_model else 8
+
+def _synthesis_messages(query: str, sources: List[Dict], sub_queries: List[str]) -> List[Dict[str, str]]:
     sources_text = "\n\n---\n\n".join(
-        f"[{i+1}] {s['title']} ({s.get('number','')})\n{s['relevantText'][:600]}"
-        for i, s in enumerate(sources[:8])
+        f"[{i+1}] {s['title']} ({s.get('number','')})\n{s['relevantText'][:PASSAGE_CHARS or None]}"
+        for i, s in enumerate(sources[:_synthesis_depth()])
     )
     system = (
         "You are JusConsultus AI, an expert Philippine legal research assistant. "
@@ -303,37 +2376,104 @@ def llm_synthesize(query: str, sources: List[Dict], sub_queries: List[str]) -> s
         f"Sources:\n{sources_text}\n\n"
         "Provide comprehensive legal analysis with citations."
     )
-    payload = _json.dumps({
-        "model": LLM_MODEL,
-        "messages": [{"role":"system","content":system}, {"role":"user","content":user}],
-        "temperature": 0.3, "max_tokens": 2048,
-    }).encode()
-    req = urllib.request.Request(
-        f"{LLM_BASE_URL.rstrip('/')}/v1/chat/completions",
-        data=payload,
-        headers={"Authorization": f"Bearer {LLM_API_KEY}", "Content-Type": "application/json"},
-    )
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}]
+
+async def llm_synthesize(query: str, sources: List[Dict], sub_queries: List[str]) -> str:
+    if not LLM_API_KEY:
+        return f"[No LLM configured] Retrieved {len(sources)} sources for: {query}"
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            data = _json.loads(resp.read())
-            return data["choices"][0]["message"]["content"]
+        return await llm_chat(_synthesis_messages(query, sources, sub_queries), temperature=0.3, max_tokens=2048)
     except Exception as e:
         return f"[LLM error: {e}]"
 
 # ─── Startup ───────────────────────────────────────────────────────────────────
-_indexed = False
+# The server is live as soon as uvicorn binds; it is ready once the model is
+# loaded, the collection is open and a warm-up batch has gone through the model
+# and the vector index. By default that happens in the background so /health
+# answers (and PM2 sees the process up) immediately; DEEPSEARCHER_PRELOAD=1 makes
+# startup wait for it instead.
+PRELOAD_MODEL = os.environ.get("DEEPSEARCHER_PRELOAD", "") == "1"
+WARMUP_QUERIES = [
+    "illegal dismissal backwages reinstatement",
+    "Republic Act No. 9262 protection order",
+    "writ of certiorari grave abuse of discretion",
+    "estafa by misappropriation",
+]
+_model_ready = threading.Event()
+_model_state = "loading"                # loading → (restoring →) warming → ready | failed
+_model_error: Optional[str] = None
+
+def warm_up() -> None:
+    """Run a small batch through the models and the vector index so the first real query pays no first-use cost."""
+    embs = embed_texts(WARMUP_QUERIES)
+    get_reranker().score(WARMUP_QUERIES[0], [{"title": "", "relevantText": WARMUP_QUERIES[1], "score": 0.0}])
+    get_lexical_index()
+    if get_collection().count():
+        _vector_search_embs(embs, [10] * len(embs), None)
+
+def _load_and_warm() -> None:
+    global _model_state, _model_error
+    t0 = time.perf_counter()
+    try:
+        ensure_model()
+        ensure_collection()
+        if SNAPSHOT_IMPORT and get_collection().count() == 0:
+            _model_state = "restoring"
+            import_snapshot(SNAPSHOT_IMPORT)
+        _model_state = "warming"
+        with span("warm_up"):
+            warm_up()
+    except Exception as e:
+        _model_state, _model_error = "failed", f"{type(e).__name__}: {e}"
+        print(f"[DeepSearcher] Startup failed: {_model_error}")
+        return
+    _model_state = "ready"
+    _model_ready.set()
+    print(f"[DeepSearcher] Ready in {time.perf_counter() - t0:.1f}s ({_embed_model}, dim={_embed_dim})")
+    threading.Thread(target=_ensure_lexical_index, name="lexical-backfill", daemon=True).start()
+    threading.Thread(target=backfill_citations, name="citation-backfill", daemon=True).start()
+    if VECTOR_STORE == "compact":
+        threading.Thread(target=_prepare_compact_store, name="compact-migrate", daemon=True).start()
+    resumed = resume_interrupted_jobs()
+    if resumed:
+        print(f"[DeepSearcher] Resuming {resumed} interrupted index job(s)")
+
+def _require_ready() -> None:
+    """503 (with Retry-After) for endpoints that need the model while it is still loading."""
+    if not _model_ready.is_set():
+        detail = f"model {_model_state}" + (f": {_model_error}" if _model_error else "")
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "5"})
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global _indexed
-    ensure_collection()
-    print(f"[DeepSearcher] ChromaDB ready at {CHROMA_DB_PATH}")
+    if not lock_data_dir():
+        msg = (f"{DATA_DIR} is already served by pid {data_dir_owner()}. The sidecar is single-process: "
+               "run one server per DEEPSEARCHER_DATA_DIR, without uvicorn --workers")
+        print(f"[DeepSearcher] {msg}")
+        raise RuntimeError(msg)
+    print(f"[DeepSearcher] ChromaDB at {CHROMA_DB_PATH}")
     print(f"[DeepSearcher] Legal DB root: {LEGAL_DB_ROOT}")
+    print(f"[DeepSearcher] Identifier index loaded: {load_ident_index()} files")
+    threading.Thread(target=refresh_ident_index, name="ident-refresh", daemon=True).start()
+    if PRELOAD_MODEL:
+        await asyncio.to_thread(_load_and_warm)
+    else:
+        threading.Thread(target=_load_and_warm, name="model-load", daemon=True).start()
     yield
+    if _embed_pool is not None:
+        _embed_pool.close()
+    if _llm_client is not None:
+        await _llm_client.aclose()
     # ChromaDB PersistentClient auto-flushes on exit
 
 app = FastAPI(title="JusConsultus DeepSearcher", version="1.0", lifespan=lifespan)
 app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
+app.add_middleware(MetricsMiddleware)
+
+@app.exception_handler(EmbeddingQueueFull)
+async def _embed_queue_full(request, exc: EmbeddingQueueFull):
+    # Backpressure from the embedding pool: shed the request rather than queue without bound
+    return JSONResponse({"detail": f"embedding queue full: {exc}"}, status_code=503, headers={"Retry-After": "1"})
 
 # ─── Request/Response Models ───────────────────────────────────────────────────
 class SearchRequest(BaseModel):
@@ -341,143 +2481,344 @@ class SearchRequest(BaseModel):
     top_k: int = 10
     category_filter: Optional[str] = None
     source_filters: Optional[List[str]] = None
+    categories: Optional[List[str]] = None      # with category_filter and source_filters: any of these
+    subcategories: Optional[List[str]] = None
+    year_from: Optional[int] = None             # inclusive year range
+    year_to: Optional[int] = None
+    mode: SearchMode = "dense"
+    passage_chars: Optional[int] = None     # relevantText length (default DEEPSEARCHER_PASSAGE_CHARS, 0 = whole chunk)
+    timings: bool = False       # add a per-stage "timings" breakdown (ms) to the response
+
+class SearchBatchRequest(BaseModel):
+    queries: List[SearchRequest]
+    timings: bool = False
 
 class QueryRequest(BaseModel):
     query: str
     max_iter: int = 3
+    category_filter: Optional[str] = None
     source_filters: Optional[List[str]] = None
+    categories: Optional[List[str]] = None
+    subcategories: Optional[List[str]] = None
+    year_from: Optional[int] = None
+    year_to: Optional[int] = None
     deep_think: bool = False
     chat_mode: Optional[str] = None
     history: Optional[List[Dict[str, str]]] = None
+    mode: SearchMode = "hybrid"
+    timings: bool = False
 
 class KAGLookupRequest(BaseModel):
     identifier: str
     lookup_type: str = "auto"
     context_query: Optional[str] = None
+    timings: bool = False
 
 class IndexRequest(BaseModel):
     paths: Optional[List[str]] = None  # explicit paths; None = scan LEGAL_DB_ROOT
-    limit: Optional[int] = None        # max files to index per call
+    limit: Optional[int] = None        # max new/changed files to index per call
+    dry_run: bool = False              # report the new/changed/deleted plan without indexing
+
+class SnapshotExportRequest(BaseModel):
+    name: Optional[str] = None         # directory under DEEPSEARCHER_SNAPSHOT_DIR (default: a UTC timestamp)
+    dtype: Literal["float32", "float16"] = "float32"
+
+class SnapshotImportRequest(BaseModel):
+    replace: bool = False              # drop the current collection first
 
 # ─── Endpoints ─────────────────────────────────────────────────────────────────
+def _with_timings(req, body: Dict[str, Any]) -> Dict[str, Any]:
+    if getattr(req, "timings", False):
+        body["timings"] = current_timings()
+    return body
+
+@REGISTRY.collector
+def _cache_metrics():
+    caches = [(c.name, c.stats()) for c in (_qemb_cache, _search_cache, _answer_cache, _partition_cache, _rerank_cache)]
+    if _embed_cache is not None:
+        caches.append(("embedding", _embed_cache.stats()))
+    yield ("deepsearcher_cache_hits_total", "counter", "Cache hits.", [({"cache": n}, st["hits"]) for n, st in caches])
+    yield ("deepsearcher_cache_misses_total", "counter", "Cache misses.",
+           [({"cache": n}, st["misses"]) for n, st in caches])
+    yield ("deepsearcher_cache_entries", "gauge", "Entries held per cache.",
+           [({"cache": n}, st["entries"]) for n, st in caches])
+
+@REGISTRY.collector
+def _embed_pool_metrics():
+    if _embed_pool is None:
+        return
+    st = _embed_pool.stats()
+    yield ("deepsearcher_embed_queue_depth", "gauge", "Embedding requests and texts waiting for a worker.",
+           [({"unit": "requests"}, st["pending_requests"]), ({"unit": "texts"}, st["pending_texts"])])
+    yield ("deepsearcher_embed_batches_in_flight", "gauge", "Batches being embedded by pool workers.",
+           [({}, st["in_flight_batches"])])
+    yield ("deepsearcher_embed_workers", "gauge", "Embedding worker processes.", [({}, st["workers"])])
+
+@REGISTRY.collector
+def _startup_metrics():
+    yield ("deepsearcher_ready", "gauge", "1 once the model is loaded and warmed up.",
+           [({"state": _model_state}, int(_model_ready.is_set()))])
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus text-format metrics: stage and request latency histograms, in-flight gauges, counters."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/health")
 def health():
-    try:
-        col = get_collection()
-        count = col.count()
-    except Exception:
-        count = -1
-    return {"status": "ok", "collection": COLLECTION, "indexed_chunks": count, "embed_dim": _embed_dim}
+    """Liveness: answers as soon as the process serves requests; `ready` tells whether search can run yet."""
+    count = -1
+    if _model_ready.is_set():
+        try:
+            count = get_collection().count()
+        except Exception:
+            pass
+    return {"status": "ok", "ready": _model_ready.is_set(), "model_state": _model_state, "error": _model_error,
+            "collection": COLLECTION, "indexed_chunks": count, "embed_dim": _embed_dim}
+
+@app.get("/health/ready")
+def health_ready():
+    """Readiness: 200 once the model is loaded and warmed up, 503 until then."""
+    _require_ready()
+    return {"status": "ready", "embed_model": _embed_model, "embed_dim": _embed_dim}
 
 @app.get("/stats")
 def stats():
+    _require_ready()
     try:
         col = get_collection()
-        return {"collection": COLLECTION, "row_count": col.count(), "embed_dim": _embed_dim}
+        return {
+            "collection":  COLLECTION,
+            "row_count":   col.count(),
+            "embed_dim":   _embed_dim,
+            "embed_model": _embed_model,
+            "embed_cache": _get_embed_cache().stats() if _embed_fn is not None else None,
+            "embed_pool":  _embed_pool.stats() if _embed_pool is not None else None,
+            "lexical_index": get_lexical_index().stats(),
+            "vector_store": get_compact_store().stats() if VECTOR_STORE == "compact" else "chroma",
+            "manifest":    manifest_stats(),
+            "reranker":    get_reranker().name,
+            "query_cache": {c.name: c.stats() for c in (_qemb_cache, _search_cache, _answer_cache, _partition_cache,
+                                                        _rerank_cache)},
+        }
     except Exception as e:
         return {"error": str(e)}
 
+_CATEGORY_MAP = {
+    "law": "laws", "jurisprudence": "supreme_court",
+    "issuance": "executive_issuances", "reference": "references",
+    "treaty": "treaties", "international": "international_laws",
+}
+
+def _request_filter(req) -> Optional[SearchFilter]:
+    """
+    The SearchFilter for a search or query request. Categories are the union of
+    `categories`, `category_filter` and the categories `source_filters` map to
+    (unknown source keys are ignored); 422 on an empty year range.
+    """
+    categories = set(req.categories or [])
+    categories.update(_CATEGORY_MAP[s] for s in req.source_filters or [] if s in _CATEGORY_MAP)
+    if req.category_filter:
+        categories.add(req.category_filter)
+    try:
+        return make_filter(categories, req.subcategories, req.year_from, req.year_to)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 @app.post("/search")
 def search(req: SearchRequest):
-    """Fast vector similarity search — returns top-K semantically similar documents."""
+    """Similarity search — top-K documents by dense, lexical (BM25) or hybrid retrieval (see `mode`)."""
+    _require_ready()
     start = time.time()
-    # Map source_filters to category names
-    cat_map = {
-        "law": "laws", "jurisprudence": "supreme_court",
-        "issuance": "executive_issuances", "reference": "references",
-        "treaty": "treaties", "international": "international_laws",
-    }
-    category_filter = None
-    if req.source_filters and len(req.source_filters) == 1:
-        category_filter = cat_map.get(req.source_filters[0]) or req.category_filter
-
-    results = vector_search(req.query, top_k=req.top_k, category_filter=category_filter)
-    return {
+    results = vector_search(req.query, top_k=req.top_k, filters=_request_filter(req), mode=req.mode)
+    results = present_rows(results, req.query, req.passage_chars)
+    return _with_timings(req, {
         "query": req.query,
         "results": results,
         "total": len(results),
         "elapsed_ms": round((time.time() - start) * 1000),
-    }
+    })
 
-@app.post("/query")
-def query(req: QueryRequest):
-    """
-    Full DeepSearcher pipeline:
-      1. Sub-query decomposition (via LLM)
-      2. Multi-pass vector retrieval
-      3. Re-ranking
-      4. LLM synthesis
-    """
+@app.post("/search/batch")
+def search_batch(req: SearchBatchRequest):
+    """Several /search requests in one round-trip: one embedding pass, one col.query per distinct filter."""
+    _require_ready()
     start = time.time()
+    batch = vector_search_batch([(q.query, q.top_k, _request_filter(q), q.mode) for q in req.queries])
+    return _with_timings(req, {
+        "results": [{"query": q.query, "results": present_rows(results, q.query, q.passage_chars), "total": len(results)}
+                    for q, results in zip(req.queries, batch)],
+        "elapsed_ms": round((time.time() - start) * 1000),
+    })
 
+_query_slots = asyncio.Semaphore(QUERY_CONCURRENCY)
+QUERY_PIPELINES = REGISTRY.register(Gauge(
+    "deepsearcher_query_pipelines", "/query pipelines by state (waiting for a slot or running).", ["state"]))
+
+@asynccontextmanager
+async def _query_slot():
+    """One of the QUERY_CONCURRENCY pipeline slots, with the waiting/running gauges kept in step."""
+    with QUERY_PIPELINES.track(state="waiting"):
+        await _query_slots.acquire()
+    try:
+        with QUERY_PIPELINES.track(state="running"):
+            yield
+    finally:
+        _query_slots.release()
+
+async def deep_retrieve(req: "QueryRequest"):
+    """Steps 1-3 of /query. Returns (sub_queries, top_sources, total_scanned, filter)."""
     # Step 1: Simple query decomposition
-    sub_queries = [req.query]
-    if len(req.query.split()) > 5 and LLM_API_KEY:
-        try:
-            import urllib.request, json as _json
-            payload = _json.dumps({
-                "model": LLM_MODEL,
-                "messages": [
-                    {"role": "system", "content": "Output ONLY a JSON array of 2-4 focused sub-queries for searching a Philippine legal database. No other text."},
-                    {"role": "user", "content": f"Decompose this legal question: {req.query}"},
-                ],
-                "temperature": 0.2, "max_tokens": 300,
-            }).encode()
-            req2 = urllib.request.Request(
-                f"{LLM_BASE_URL.rstrip('/')}/v1/chat/completions",
-                data=payload,
-                headers={"Authorization": f"Bearer {LLM_API_KEY}", "Content-Type": "application/json"},
-            )
-            with urllib.request.urlopen(req2, timeout=10) as resp:
-                data = _json.loads(resp.read())
-                raw = data["choices"][0]["message"]["content"]
-                m = re.search(r'\[.*?\]', raw, re.S)
-                if m:
-                    parsed = _json.loads(m.group(0))
-                    if isinstance(parsed, list) and len(parsed) > 0:
-                        sub_queries = [req.query] + [str(q) for q in parsed[:3]]
-        except Exception:
-            pass
+    with span("decompose"):
+        sub_queries = await decompose_query(req.query)
 
-    # Step 2: Multi-pass retrieval
-    cat_map = {
-        "law": "laws", "jurisprudence": "supreme_court",
-        "issuance": "executive_issuances", "reference": "references",
-        "treaty": "treaties", "international": "international_laws",
-    }
-    cat_filter = None
-    if req.source_filters and len(req.source_filters) == 1:
-        cat_filter = cat_map.get(req.source_filters[0])
+    # Step 2: Multi-pass retrieval (all sub-queries in one batched search)
+    flt = _request_filter(req)
 
     all_results: Dict[str, Dict] = {}
-    for sq in sub_queries:
-        for r in vector_search(sq, top_k=8, category_filter=cat_filter):
+    with span("retrieve"):
+        batches = await vector_search_many(sub_queries, top_k=8, filters=flt, mode=req.mode)
+    for results in batches:
+        for r in results:
             path = r["relativePath"]
             if path not in all_results or r["score"] > all_results[path]["score"]:
                 all_results[path] = r
 
     # Step 3: Re-rank by original query relevance
-    query_kws = set(re.findall(r'\w+', req.query.lower()))
-    for r in all_results.values():
-        bonus = sum(1 for kw in query_kws if kw in r.get("relevantText","").lower())
-        bonus += sum(2 for kw in query_kws if kw in r.get("title","").lower())
-        if r.get("date") and int(r["date"]) >= 2020:
-            bonus += 2
-        r["score"] = round(r["score"] + bonus, 2)
-
-    ranked = sorted(all_results.values(), key=lambda x: -x["score"])
-    top_sources = ranked[:12 if req.deep_think else 8]
-
-    # Step 4: Synthesize
-    answer = llm_synthesize(req.query, top_sources, sub_queries)
+    with span("rerank"):
+        ranked, scored = await asyncio.to_thread(rerank_candidates, req.query, list(all_results.values()))
+    with span("authority"):
+        ranked = await asyncio.to_thread(boost_authorities, req.query, ranked, flt, scored)
+    top_sources = present_rows(ranked[:12 if req.deep_think else 8], req.query)
+    return sub_queries, top_sources, len(all_results), flt
+
+
+RERANK_EXHAUSTED = REGISTRY.register(Counter(
+    "deepsearcher_rerank_budget_exhausted_total", "Rerank passes cut short by DEEPSEARCHER_RERANK_BUDGET_MS."))
+RERANK_SCORED = REGISTRY.register(Counter(
+    "deepsearcher_rerank_pairs_total", "Query/passage pairs given a reranker score, by source.", ["source"]))
+
+_reranker = None
+_reranker_lock = threading.Lock()
+
+def get_reranker():
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                from rerank import build_reranker
+                _reranker = build_reranker(RERANKER, RERANK_MODEL)
+    return _reranker
+
+def rerank_candidates(query: str, rows: List[Dict]) -> Tuple[List[Dict], int]:
+    """
+    The fused /query candidates, best first by the configured reranker (within its
+    time budget), and how many lead the list with a reranker score.
+    """
+    from rerank import rerank
+    reranker = get_reranker()
+    if reranker.is_model:
+        rows = sorted(rows, key=lambda r: -r["score"])[:RERANK_CANDIDATES]
+    res = rerank(reranker, query, rows, RERANK_BUDGET_MS / 1000 if reranker.is_model else None,
+                 RERANK_BATCH, _rerank_cache)
+    RERANK_SCORED.inc(res["scored"] - res["cached"], source="model" if reranker.is_model else "keyword")
+    RERANK_SCORED.inc(res["cached"], source="cache")
+    if res["exhausted"]:
+        RERANK_EXHAUSTED.inc()
+    return res["rows"], res["scored"]
 
-    return {
+@app.post("/query")
+async def query(req: QueryRequest):
+    """
+    Full DeepSearcher pipeline:
+      1. Sub-query decomposition (via LLM)
+      2. Multi-pass vector retrieval
+      3. Re-ranking
+      4. LLM synthesis
+    At most QUERY_CONCURRENCY pipelines run at once; the rest wait for a slot.
+    """
+    _require_ready()
+    start = time.time()
+    cache_key = (req.query, _request_filter(req), req.deep_think, req.mode)
+    cached = _answer_cache.get(cache_key)
+    if cached is not None:
+        return _with_timings(req, {**cached, "sources": [dict(r) for r in cached["sources"]], "cached": True,
+                                   "elapsed_ms": round((time.time() - start) * 1000)})
+
+    async with _query_slot():
+        sub_queries, top_sources, scanned, flt = await deep_retrieve(req)
+        # Step 4: Synthesize
+        with span("synthesize"):
+            answer = await llm_synthesize(req.query, top_sources, sub_queries)
+
+    result = {
         "answer":              answer,
         "sources":             top_sources,
         "sub_queries":         sub_queries,
-        "total_sources_scanned": len(all_results),
-        "elapsed_ms":          round((time.time() - start) * 1000),
+        "total_sources_scanned": scanned,
     }
+    if not answer.startswith("[LLM error"):
+        _answer_cache.set(cache_key, {**result, "sources": [dict(r) for r in top_sources]},
+                          tags=flt.tags() if flt else ("*",))
+    return _with_timings(req, {**result, "cached": False, "elapsed_ms": round((time.time() - start) * 1000)})
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/query/stream")
+async def query_stream(req: QueryRequest):
+    """
+    Streaming variant of /query (Server-Sent Events):
+      start → sub_queries → sources → token* → done   (or error)
+    Sources are sent as soon as retrieval finishes; LLM tokens are forwarded
+    as they arrive. /query keeps returning the single JSON response.
+    """
+    _require_ready()
+    start = time.time()
+    cache_key = (req.query, _request_filter(req), req.deep_think, req.mode)
+
+    async def events():
+        yield _sse("start", {"query": req.query})
+        cached = _answer_cache.get(cache_key)
+        if cached is not None:
+            yield _sse("sub_queries", cached["sub_queries"])
+            yield _sse("sources", cached["sources"])
+            yield _sse("token", {"delta": cached["answer"]})
+            yield _sse("done", _with_timings(req, {"cached": True, "total_sources_scanned": cached["total_sources_scanned"],
+                                                   "elapsed_ms": round((time.time() - start) * 1000)}))
+            return
+
+        async with _query_slot():
+            sub_queries, top_sources, scanned, flt = await deep_retrieve(req)
+            yield _sse("sub_queries", sub_queries)
+            yield _sse("sources", top_sources)
+
+            parts: List[str] = []
+            if not LLM_API_KEY:
+                parts.append(f"[No LLM configured] Retrieved {len(top_sources)} sources for: {req.query}")
+                yield _sse("token", {"delta": parts[0]})
+            else:
+                t0 = time.perf_counter()
+                try:
+                    async for delta in llm_stream(_synthesis_messages(req.query, top_sources, sub_queries),
+                                                  temperature=0.3, max_tokens=2048):
+                        parts.append(delta)
+                        yield _sse("token", {"delta": delta})
+                except Exception as e:
+                    yield _sse("error", {"message": f"[LLM error: {e}]"})
+                    return
+                finally:
+                    observe_stage("synthesize", time.perf_counter() - t0)
+
+        _answer_cache.set(cache_key, {
+            "answer": "".join(parts), "sources": [dict(r) for r in top_sources],
+            "sub_queries": sub_queries, "total_sources_scanned": scanned,
+        }, tags=flt.tags() if flt else ("*",))
+        yield _sse("done", _with_timings(req, {"cached": False, "total_sources_scanned": scanned,
+                                               "elapsed_ms": round((time.time() - start) * 1000)}))
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.post("/kag/lookup")
 def kag_lookup(req: KAGLookupRequest):
@@ -486,83 +2827,121 @@ def kag_lookup(req: KAGLookupRequest):
     Finds documents by law/case number (e.g. 'RA 9262', 'G.R. No. 12').
     Combines with vector context retrieval if context_query is provided.
     """
+    if req.context_query:
+        _require_ready()
     start = time.time()
-    exact_results = exact_lookup(req.identifier, req.lookup_type)
+    with span("exact_lookup"):
+        exact_results = exact_lookup(req.identifier, req.lookup_type)
 
     # Optionally enrich with vector context
     vector_results = []
     if req.context_query:
-        vector_results = vector_search(req.context_query, top_k=5)
+        with span("context_search"):
+            vector_results = vector_search(req.context_query, top_k=5)
 
     # Merge: exact matches first, then vector
     seen_paths = {r["relativePath"] for r in exact_results}
-    merged = exact_results + [r for r in vector_results if r["relativePath"] not in seen_paths]
+    merged = present_rows(exact_results, f"{req.identifier} {req.context_query or ''}") + \
+        present_rows([r for r in vector_results if r["relativePath"] not in seen_paths], req.context_query or "")
 
-    return {
+    key = identifier_key(req.identifier, req.lookup_type)
+    cited_by = [{"relativePath": p, "title": _ident_docs.get(p, {}).get("title", "")}
+                for p in (citing_documents(key) if key else [])]
+
+    return _with_timings(req, {
         "identifier":   req.identifier,
-        "exact_matches": len(exact_results),
+        "exact_matches": sum(r["category"] == "exact_match" for r in exact_results),
+        "cited_by":      cited_by,
         "results":       merged,
         "elapsed_ms":    round((time.time() - start) * 1000),
-    }
+    })
 
 @app.post("/index/batch")
-def index_batch(req: IndexRequest, background_tasks: BackgroundTasks):
+def index_batch(req: IndexRequest):
     """
-    Index legal HTML files into Milvus Lite.
+    Queue an indexing job over legal HTML files (see /index/jobs/{id} for progress).
     If req.paths is None, scans the entire data/legal-database directory.
-    Runs incrementally — skips already-indexed documents.
-    """
-    target_paths = req.paths
-
-    def do_index():
-        global _indexed
-        import os
-        total_indexed = 0
-        FOLDER_CATEGORY_MAP = {
-            "Supreme Court":         ("supreme_court", "decisions"),
-            "Laws":                  ("laws", "republic_acts"),
-            "Executive Issuances":   ("executive_issuances", "executive_orders"),
-            "References":            ("references", "general"),
-            "Treaties":              ("treaties", "bilateral"),
-            "International Laws":    ("international_laws", "international"),
-        }
-
-        if target_paths:
-            file_list = [(p, "general", "general") for p in target_paths if p.endswith(('.html','.htm'))]
-        else:
-            file_list = []
-            if not os.path.isdir(LEGAL_DB_ROOT):
-                print(f"[DeepSearcher] LEGAL_DB_ROOT not found: {LEGAL_DB_ROOT}")
-                return
-            for top_dir in os.listdir(LEGAL_DB_ROOT):
-                top_abs = os.path.join(LEGAL_DB_ROOT, top_dir)
-                if not os.path.isdir(top_abs):
-                    continue
-                category, subcategory = FOLDER_CATEGORY_MAP.get(top_dir, ("general", "general"))
-                # Walk subdirectories
-                for root, dirs, files in os.walk(top_abs):
-                    for fname in files:
-                        if re.search(r'\.html?$', fname, re.I):
-                            abs_path = os.path.join(root, fname)
-                            rel_path = os.path.relpath(abs_path, LEGAL_DB_ROOT).replace('\\', '/')
-                            # Try to get better subcategory from sub-folder
-                            sub_folder = os.path.basename(root)
-                            sub = sub_folder.lower().replace(' ', '_').replace('/', '_') if sub_folder != top_dir else subcategory
-                            file_list.append((abs_path, category, sub))
-
-        limit = req.limit or len(file_list)
-        for abs_path, category, subcategory in file_list[:limit]:
-            rel_path = os.path.relpath(abs_path, LEGAL_DB_ROOT).replace('\\', '/') if abs_path.startswith(LEGAL_DB_ROOT) else abs_path
-            n = index_html_file(abs_path, rel_path, category, subcategory)
-            total_indexed += n
-            if total_indexed % 500 == 0 and total_indexed > 0:
-                print(f"[DeepSearcher] Indexed {total_indexed} chunks so far...")
-
-        _indexed = True
-        print(f"[DeepSearcher] Indexing complete. Total chunks inserted: {total_indexed}")
-
-    background_tasks.add_task(do_index)
-    return {"message": "Indexing started in background", "legal_db_root": LEGAL_DB_ROOT}
+    Runs incrementally against the document manifest: only new or changed files
+    are embedded, and chunks of changed or deleted files are removed. With
+    req.dry_run the plan is returned and nothing is written.
+    """
+    if req.dry_run:
+        _require_ready()
+        return {"dry_run": True, **summarize_plan(plan_index(index_jobs_for(req.paths), prune=not req.paths))}
+    job = create_index_job(req.paths, req.limit)
+    return {"message": "Indexing job queued", "job_id": job["id"], "job": job, "legal_db_root": LEGAL_DB_ROOT}
+
+@app.get("/index/jobs")
+def index_jobs(limit: int = 20):
+    return {"jobs": list_index_jobs(limit)}
+
+@app.get("/index/jobs/{job_id}")
+def index_job(job_id: str):
+    job = get_index_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown index job: {job_id}")
+    return job
+
+@app.post("/index/jobs/{job_id}/{action}")
+def index_job_control(job_id: str, action: Literal["pause", "resume", "cancel"]):
+    """Pause, resume or cancel a job; a running job stops at the next file boundary."""
+    try:
+        job = control_index_job(job_id, action)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown index job: {job_id}")
+    return job
+
+_SNAPSHOT_SUMMARY = ("collection", "embed_model", "embed_dim", "dtype", "rows", "documents", "created_at")
+
+def _snapshot_path(name: str) -> Path:
+    if not re.fullmatch(r'[A-Za-z0-9][A-Za-z0-9_.-]*', name) or name.endswith(".partial"):
+        raise HTTPException(status_code=422, detail=f"Invalid snapshot name: {name!r}")
+    return SNAPSHOT_DIR / name
+
+@app.get("/snapshots")
+def snapshots():
+    """Complete snapshots under DEEPSEARCHER_SNAPSHOT_DIR, newest first."""
+    from snapshot import SnapshotError, read_info
+    out = []
+    for p in sorted(SNAPSHOT_DIR.iterdir()) if SNAPSHOT_DIR.is_dir() else []:
+        try:
+            info = read_info(str(p))
+        except SnapshotError:
+            continue
+        out.append({"name": p.name, **{k: info.get(k) for k in _SNAPSHOT_SUMMARY}})
+    return {"snapshots": sorted(out, key=lambda s: -(s["created_at"] or 0))}
+
+@app.post("/snapshots")
+def snapshot_export(req: SnapshotExportRequest):
+    """Export the collection (vectors, documents, metadata, manifest) as a checksummed snapshot."""
+    from snapshot import SnapshotError
+    _require_ready()
+    name = req.name or time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+    path = _snapshot_path(name)
+    start = time.time()
+    try:
+        info = export_snapshot(str(path), dtype=req.dtype)
+    except SnapshotError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"name": name, **{k: info[k] for k in _SNAPSHOT_SUMMARY},
+            "bytes": sum(f["bytes"] for f in info["files"].values()), "elapsed_ms": round((time.time() - start) * 1000)}
+
+@app.post("/snapshots/{name}/import")
+def snapshot_import(name: str, req: SnapshotImportRequest):
+    """Load a snapshot into the collection without re-embedding (409 if it does not fit this sidecar)."""
+    from snapshot import SnapshotError
+    _require_ready()
+    path = _snapshot_path(name)
+    if not (path / "snapshot.json").exists():
+        raise HTTPException(status_code=404, detail=f"Unknown snapshot: {name}")
+    start = time.time()
+    try:
+        info = import_snapshot(str(path), replace=req.replace)
+    except SnapshotError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"name": name, **{k: info[k] for k in _SNAPSHOT_SUMMARY}, "elapsed_ms": round((time.time() - start) * 1000)}
 
 # ─── Main ──────────────────────────────────────────────────────────────────────
 if __name__ == "__main__":
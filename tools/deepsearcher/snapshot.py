@@ -0,0 +1,203 @@
+"""
+Portable snapshots of the DeepSearcher collection.
+
+A snapshot is a directory holding everything needed to bring up a replica
+without re-embedding the corpus:
+  snapshot.json          — format, collection, embedding model and dim, vector
+                           dtype, row counts, and the size and sha256 of every
+                           other file
+  vectors-NNNNN.npy      — one (rows, dim) embedding matrix per shard, float32
+                           (lossless) or float16 (half the size)
+  rows-NNNNN.jsonl.gz    — [chunk id, document, metadata] per line, in the same
+                           order as the shard's vectors
+  manifest.jsonl.gz      — the sidecar's document manifest, so the replica's
+                           next /index/batch only touches files that changed
+
+A snapshot is written to "<dir>.partial" and renamed into place once
+snapshot.json is written, so a directory under its final name is complete.
+Readers verify checksums with verify() before loading anything.
+
+Usage (runs against the sidecar configured by the DEEPSEARCHER_* environment):
+  python snapshot.py export /backups/ds-2024-06-01 [--dtype float16]
+  python snapshot.py import /backups/ds-2024-06-01 [--replace]
+  python snapshot.py verify /backups/ds-2024-06-01
+export and import open the data directory themselves, so they refuse to run
+while a sidecar holds it; use its /snapshots endpoints then.
+"""
+
+import io, os, gzip, json, time, shutil, hashlib, argparse
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+FORMAT = "deepsearcher-snapshot/1"
+SHARD_ROWS = 20000
+
+class SnapshotError(ValueError):
+    """A snapshot that is missing, incomplete, corrupt, or does not fit this sidecar."""
+
+class _HashingWriter(io.RawIOBase):
+    """File wrapper that hashes and counts what is written through it."""
+    def __init__(self, f):
+        self._f, self.sha, self.size = f, hashlib.sha256(), 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.sha.update(data)
+        self.size += len(data)
+        return self._f.write(data)
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class SnapshotWriter:
+    def __init__(self, path: str, info: Dict, shard_rows: int = SHARD_ROWS, dtype: str = "float32"):
+        if dtype not in ("float32", "float16"):
+            raise SnapshotError(f"unsupported vector dtype {dtype!r}")
+        self.path = Path(path)
+        if self.path.exists():
+            raise SnapshotError(f"{self.path} already exists")
+        self.tmp = self.path.with_name(self.path.name + ".partial")
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        self.tmp.mkdir(parents=True)
+        self.info = {**info, "format": FORMAT, "dtype": dtype, "rows": 0, "documents": 0, "shards": [], "files": {}}
+        self.shard_rows, self.dtype = shard_rows, np.dtype(dtype)
+        self._buf: List[tuple] = []
+        self._buffered = 0
+
+    def _write(self, name: str, write) -> None:
+        with open(self.tmp / name, "wb") as raw:
+            out = _HashingWriter(raw)
+            write(out)
+        self.info["files"][name] = {"bytes": out.size, "sha256": out.sha.hexdigest()}
+
+    def add(self, ids: Sequence[str], embeddings, documents: Sequence[str], metadatas: Sequence[Dict]) -> None:
+        vecs = np.asarray(embeddings, dtype=self.dtype).reshape(len(ids), -1)
+        self._buf.append((list(ids), vecs, list(documents), list(metadatas)))
+        self._buffered += len(ids)
+        while self._buffered >= self.shard_rows:
+            self._flush(self.shard_rows)
+
+    def _flush(self, rows: int) -> None:
+        ids = [cid for b in self._buf for cid in b[0]]
+        vecs = np.concatenate([b[1] for b in self._buf])
+        docs = [doc for b in self._buf for doc in b[2]]
+        metas = [meta for b in self._buf for meta in b[3]]
+        self._buf = [(ids[rows:], vecs[rows:], docs[rows:], metas[rows:])] if len(ids) > rows else []
+        self._buffered = len(ids) - rows
+        n = len(self.info["shards"])
+        vec_name, row_name = f"vectors-{n:05d}.npy", f"rows-{n:05d}.jsonl.gz"
+        self._write(vec_name, lambda f: np.save(f, np.ascontiguousarray(vecs[:rows]), allow_pickle=False))
+
+        def write_rows(f):
+            with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6, mtime=0) as gz:
+                for row in zip(ids[:rows], docs[:rows], metas[:rows]):
+                    gz.write((json.dumps(row, ensure_ascii=False) + "\n").encode("utf-8"))
+        self._write(row_name, write_rows)
+        self.info["shards"].append({"vectors": vec_name, "rows_file": row_name, "rows": rows})
+        self.info["rows"] += rows
+
+    def write_manifest(self, rows: Iterable[Sequence]) -> None:
+        def write(f):
+            with gzip.GzipFile(fileobj=f, mode="wb", compresslevel=6, mtime=0) as gz:
+                for row in rows:
+                    gz.write((json.dumps(list(row)) + "\n").encode("utf-8"))
+                    self.info["documents"] += 1
+        self._write("manifest.jsonl.gz", write)
+
+    def close(self) -> Dict:
+        """Write the last shard and snapshot.json, and move the snapshot into place."""
+        if self._buffered:
+            self._flush(self._buffered)
+        if "manifest.jsonl.gz" not in self.info["files"]:
+            self.write_manifest([])
+        self.info["created_at"] = time.time()
+        (self.tmp / "snapshot.json").write_text(json.dumps(self.info, indent=2))
+        os.replace(self.tmp, self.path)
+        return self.info
+
+    def abort(self) -> None:
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+def read_info(path: str) -> Dict:
+    p = Path(path) / "snapshot.json"
+    try:
+        info = json.loads(p.read_text())
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"not a snapshot: {p} ({e})")
+    if info.get("format") != FORMAT:
+        raise SnapshotError(f"unsupported snapshot format {info.get('format')!r} (expected {FORMAT})")
+    return info
+
+def verify(path: str) -> Dict:
+    """snapshot.json of a snapshot whose files all match their recorded size and sha256; SnapshotError otherwise."""
+    info = read_info(path)
+    for name, want in info["files"].items():
+        f = Path(path) / name
+        if not f.exists():
+            raise SnapshotError(f"{name} is missing")
+        if f.stat().st_size != want["bytes"] or _sha256(f) != want["sha256"]:
+            raise SnapshotError(f"{name} does not match its checksum")
+    return info
+
+def iter_shards(path: str) -> Iterator[Tuple[List[str], np.ndarray, List[str], List[Dict]]]:
+    """(ids, float32 embeddings, documents, metadatas) per shard, in export order."""
+    info = read_info(path)
+    for shard in info["shards"]:
+        vecs = np.load(Path(path) / shard["vectors"], allow_pickle=False).astype(np.float32, copy=False)
+        ids, docs, metas = [], [], []
+        with gzip.open(Path(path) / shard["rows_file"], "rt", encoding="utf-8") as f:
+            for line in f:
+                cid, doc, meta = json.loads(line)
+                ids.append(cid)
+                docs.append(doc)
+                metas.append(meta)
+        if len(ids) != len(vecs):
+            raise SnapshotError(f"{shard['rows_file']}: {len(ids)} rows for {len(vecs)} vectors")
+        yield ids, vecs, docs, metas
+
+def manifest_rows(path: str) -> List[list]:
+    with gzip.open(Path(path) / "manifest.jsonl.gz", "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("export", help="write the collection to a new snapshot directory")
+    p.add_argument("path")
+    p.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+    p.add_argument("--shard-rows", type=int, default=SHARD_ROWS)
+    p = sub.add_parser("import", help="load a snapshot into the collection (no re-embedding)")
+    p.add_argument("path")
+    p.add_argument("--replace", action="store_true", help="drop the current collection first")
+    p = sub.add_parser("verify", help="check a snapshot's files against their checksums")
+    p.add_argument("path")
+    args = ap.parse_args()
+    # Run as a script this file is __main__; the server raises the SnapshotError of the imported module
+    from snapshot import SnapshotError as ModuleSnapshotError
+    try:
+        if args.cmd == "verify":
+            result = verify(args.path)
+        else:
+            import server
+            if not server.lock_data_dir():
+                raise SystemExit(f"snapshot {args.cmd} refused: a sidecar (pid {server.data_dir_owner()}) is using "
+                                 f"{server.DATA_DIR}; use its POST /snapshots endpoints instead")
+            if args.cmd == "export":
+                result = server.export_snapshot(args.path, shard_rows=args.shard_rows, dtype=args.dtype)
+            else:
+                result = server.import_snapshot(args.path, replace=args.replace)
+    except (SnapshotError, ModuleSnapshotError) as e:
+        raise SystemExit(f"snapshot {args.cmd} failed: {e}")
+    print(json.dumps({k: v for k, v in result.items() if k not in ("files", "shards")}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import sys
+from pathlib import Path
+
+# The sidecar modules import each other as top-level modules (server.py runs from its own directory)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+@pytest.fixture
+def sidecar(tmp_path, monkeypatch):
+    """server.py with its state DB and legal-database root under tmp_path."""
+    import server
+    monkeypatch.setattr(server, "STATE_DB_PATH", str(tmp_path / "state" / "deepsearcher_state.db"))
+    monkeypatch.setattr(server, "LEGAL_DB_ROOT", str(tmp_path / "legal"))
+    for name in ("_ident_keys", "_ident_sorted", "_ident_docs"):
+        monkeypatch.setattr(server, name, type(getattr(server, name))())
+    return server
+
+@pytest.fixture
+def store(sidecar, tmp_path, monkeypatch):
+    """sidecar with its own ChromaDB collection, lexical index and caches under tmp_path."""
+    monkeypatch.setattr(sidecar, "DATA_DIR", tmp_path / "state")
+    for name, sub in (("CHROMA_DB_PATH", "chroma_db"), ("LEXICAL_INDEX_DIR", "lexical_index"),
+                      ("COMPACT_STORE_DIR", "compact_store"), ("EMBED_CACHE_DIR", "embed_cache")):
+        monkeypatch.setattr(sidecar, name, str(tmp_path / "state" / sub))
+    for name in ("_chroma_client", "_collection", "_lexical", "_compact_store", "_embed_cache", "_citation_counts"):
+        monkeypatch.setattr(sidecar, name, None)
+    for cache in (sidecar._search_cache, sidecar._answer_cache, sidecar._partition_cache):
+        cache.clear()
+    return sidecar
+
+def write_html(root: Path, rel: str, text: str) -> tuple:
+    """An HTML file under root, as the (abs_path, rel_path, category, subcategory) job scan_legal_db yields."""
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(f"<html><head><title>t</title></head><body><p>{text}</p></body></html>", encoding="utf-8")
+    return str(path), rel, "supreme_court", "decisions"
@@ -0,0 +1,87 @@
+import numpy as np
+
+import compact_store
+from compact_store import CompactVectorStore
+
+def _store(path, n=40, dim=8, **kw):
+    rng = np.random.default_rng(0)
+    store = CompactVectorStore(str(path), dim, rerank=50, **kw)
+    vecs = rng.normal(size=(n, dim)).astype(np.float32)
+    store.upsert([f"c{i}" for i in range(n)], vecs, ["cases"] * n, ["2001"] * n, ["sc"] * n)
+    return store, vecs
+
+def test_delete_compacts_past_the_tombstone_ratio(tmp_path, monkeypatch):
+    monkeypatch.setattr(compact_store, "COMPACT_MIN_ROWS", 1)
+    store, vecs = _store(tmp_path, compact_ratio=0.25)
+    store.delete([f"c{i}" for i in range(9)])           # 9/40 < 25%: tombstones only
+    assert store.stats()["rows"] == 40
+    store.delete(["c9", "c10"])                          # 11/40: compacted
+    assert store.stats()["rows"] == store.count == 29 and store.stats()["tombstones"] == 0
+    assert store.search(vecs[20:21], top_k=1)[0][0][0] == "c20"
+    assert np.allclose(store.vectors(["c39"]), vecs[39], atol=1e-2)
+
+def test_compaction_cut_short_keeps_the_old_generation(tmp_path, monkeypatch):
+    store, vecs = _store(tmp_path, compact_ratio=1.0)
+    store.delete(["c0", "c1"])
+
+    def crash(src, dst):
+        raise OSError("power cut")
+    monkeypatch.setattr(compact_store.os, "replace", crash)
+    try:
+        store.compact()
+    except OSError:
+        pass
+    monkeypatch.undo()
+    # The half-written generation was never pointed at: it is dropped, the old one serves
+    reopened = CompactVectorStore(str(tmp_path), 8)
+    assert not list(tmp_path.glob("gen_*"))
+    assert reopened.stats()["rows"] == 40 and reopened.count == 38
+    assert reopened.search(vecs[7:8], top_k=1)[0][0][0] == "c7"
+
+def test_compaction_switches_generation_and_survives_reopen(tmp_path):
+    store, vecs = _store(tmp_path, compact_ratio=1.0)
+    store.delete(["c0", "c1"])
+    assert store.compact() == 2
+    assert (tmp_path / "generation").read_text() == "1"
+    assert not (tmp_path / "codes.i8").exists() and (tmp_path / "gen_000001" / "codes.i8").exists()
+    store.delete(["c2"])
+    store.compact()
+    assert [p.name for p in tmp_path.glob("gen_*")] == ["gen_000002"]
+    reopened = CompactVectorStore(str(tmp_path), 8)
+    assert reopened.stats()["rows"] == reopened.count == 37
+    assert reopened.search(vecs[9:10], top_k=1)[0][0][0] == "c9"
+
+def test_retired_generation_outlives_its_readers(tmp_path, monkeypatch):
+    import threading
+    store, vecs = _store(tmp_path, compact_ratio=1.0)
+    store.delete(["c0"])
+    entered, release, result = threading.Event(), threading.Event(), []
+    search = store._search
+
+    def slow_search(*args):
+        entered.set()
+        release.wait(10)
+        return search(*args)
+    monkeypatch.setattr(store, "_search", slow_search)
+    reader = threading.Thread(target=lambda: result.append(store.search(vecs[3:4], top_k=1)))
+    reader.start()
+    entered.wait(10)
+    store.compact()
+    assert (tmp_path / "codes.i8").exists()              # the reader's generation is kept
+    release.set()
+    reader.join(10)
+    assert result[0][0][0][0] == "c3"
+    assert not (tmp_path / "codes.i8").exists()
+
+def test_generation_the_os_will_not_release_is_swept_later(tmp_path, monkeypatch):
+    store, _ = _store(tmp_path, compact_ratio=1.0)
+    store.delete(["c0"])
+
+    def mapped(self, missing_ok=False):                  # Windows: a mapped file cannot be deleted
+        raise PermissionError("in use")
+    monkeypatch.setattr(compact_store.Path, "unlink", mapped)
+    store.compact()
+    assert (tmp_path / "codes.i8").exists()
+    monkeypatch.undo()
+    reopened = CompactVectorStore(str(tmp_path), 8)
+    assert not (tmp_path / "codes.i8").exists() and reopened.count == 39
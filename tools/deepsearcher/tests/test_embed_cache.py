@@ -0,0 +1,39 @@
+import numpy as np
+
+from embed_cache import EmbeddingCache
+
+def _vecs(n, dim=4, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim))
+
+def test_hits_return_what_the_miss_returned(tmp_path):
+    vecs = _vecs(3)
+    for dtype in ("float32", "float16"):
+        cache = EmbeddingCache(str(tmp_path / dtype), "m", 4, dtype=dtype)
+        stored = cache.put_many(["a", "b", "c"], vecs)
+        hits = cache.get_many(["c", "a", "zzz"])
+        assert np.array_equal(hits[0], stored[2]) and np.array_equal(hits[1], stored[0]) and hits[2] is None
+        cache.close()
+    assert np.array_equal(stored, vecs.astype(np.float16).astype(np.float32))
+
+def test_reopen_keeps_vectors_and_drops_a_torn_tail(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "m", 4)
+    stored = cache.put_many(["a", "b"], _vecs(2))
+    cache.close()
+    keys = next(tmp_path.glob("m_4/gen_*/keys.bin"))
+    keys.write_bytes(keys.read_bytes() + b"torn")
+    cache = EmbeddingCache(str(tmp_path), "m", 4)
+    assert cache.stats()["entries"] == 2
+    assert np.array_equal(cache.get_many(["b"])[0], stored[1])
+
+def test_size_bound_rotates_generations_and_keeps_used_vectors(tmp_path):
+    row = 4 * 4 + 16                                     # float32 vector + key
+    cache = EmbeddingCache(str(tmp_path), "m", 4, max_bytes=2 * 3 * row)    # three rows per generation
+    texts = [f"t{i}" for i in range(6)]
+    cache.put_many(texts, _vecs(6))                      # fills gen 1, then gen 2
+    assert cache.stats()["entries"] == 6 and cache.stats()["evictions"] == 0
+    assert cache.get_many(["t0"])[0] is not None         # copied forward into a new generation
+    cache.put_many(["u0", "u1", "u2"], _vecs(3, seed=1))
+    st = cache.stats()
+    assert st["disk_bytes"] <= st["max_bytes"] and st["evictions"] > 0
+    assert cache.get_many(["t0"])[0] is not None and cache.get_many(["t1"])[0] is None
+    assert len(list(tmp_path.glob("m_4/gen_*"))) == 2
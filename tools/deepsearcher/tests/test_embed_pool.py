@@ -0,0 +1,76 @@
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+import pytest
+
+from embed_pool import EmbeddingPool, EmbeddingQueueFull
+
+def _pool(max_pending=4, max_batch=2):
+    # The queue logic only; no worker processes or dispatcher
+    pool = EmbeddingPool.__new__(EmbeddingPool)
+    pool.workers, pool.max_batch, pool.max_pending = 1, max_batch, max_pending
+    pool._cond, pool._pending, pool._pending_texts = threading.Condition(), deque(), 0
+    pool._slots, pool._in_flight = threading.Semaphore(0), 1
+    return pool
+
+def test_finish_resolves_the_batch_around_a_cancelled_future():
+    pool = _pool()
+    done = Future()
+    done.set_result(np.arange(6, dtype=np.float32).reshape(3, 2))
+    a, b, c = Future(), Future(), Future()
+    b.cancel()
+    pool._finish([(["x"], a, 0.0), (["y"], b, 0.0), (["z"], c, 0.0)], done)
+    assert a.result().tolist() == [[0, 1]]
+    assert c.result().tolist() == [[4, 5]]
+
+def test_finish_propagates_errors_past_a_cancelled_future():
+    pool = _pool()
+    failed = Future()
+    failed.set_exception(RuntimeError("model crashed"))
+    a, b = Future(), Future()
+    a.cancel()
+    pool._finish([(["x"], a, 0.0), (["y"], b, 0.0)], failed)
+    with pytest.raises(RuntimeError):
+        b.result()
+
+def test_queue_full_withdraws_the_parts_already_enqueued():
+    pool = _pool(max_pending=4, max_batch=2)
+    other = Future()
+    pool._pending.append((["o"], other, 0.0))
+    pool._pending_texts = 1
+    # Parts of 2, 2 and 2: the first fits (1+2), the second does not (3+2 > 4)
+    with pytest.raises(EmbeddingQueueFull):
+        pool.embed(["a", "b", "c", "d", "e", "f"], timeout=0.01)
+    assert [item[1] for item in pool._pending] == [other]
+    assert pool._pending_texts == 1
+
+class _FakeExecutor:
+    def __init__(self):
+        self.shutdowns = 0
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdowns += 1
+
+def test_broken_pool_is_replaced_once_by_concurrent_batches():
+    from concurrent.futures.process import BrokenProcessPool
+    pool = _pool()
+    pool._closed, pool._in_flight = False, 8
+    pool._slots = threading.Semaphore(0)
+    broken = pool._executor = _FakeExecutor()
+    made = []
+    pool._new_executor = lambda: made.append(_FakeExecutor()) or made[-1]
+    crashed = Future()
+    crashed.set_exception(BrokenProcessPool("worker died"))
+    callers = [Future() for _ in range(8)]
+    threads = [threading.Thread(target=pool._finish, args=([(["x"], f, 0.0)], crashed, broken)) for f in callers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(made) == 1 and pool._executor is made[0]
+    assert broken.shutdowns == 1
+    assert all(isinstance(f.exception(), BrokenProcessPool) for f in callers)
+    # A late failure reported against the old executor leaves the new one alone
+    pool._finish([(["y"], Future(), 0.0)], crashed, broken)
+    assert len(made) == 1 and made[0].shutdowns == 0
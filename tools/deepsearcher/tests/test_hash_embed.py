@@ -0,0 +1,71 @@
+import hashlib
+import math
+import re
+from typing import Dict, List
+
+import numpy as np
+import pytest
+
+def _baseline_hash_embed(texts: List[str]) -> List[List[float]]:
+    """The fallback from embed_texts before vectorisation, kept verbatim as the reference."""
+    results = []
+    for text in texts:
+        words = re.findall(r'\w+', text.lower())
+        freq: Dict[str, int] = {}
+        for w in words:
+            freq[w] = freq.get(w, 0) + 1
+        vec = [0.0] * 256
+        for w, cnt in freq.items():
+            h = int(hashlib.md5(w.encode()).hexdigest(), 16) % 256
+            vec[h] += cnt * math.log(1 + len(words))
+        norm = math.sqrt(sum(v*v for v in vec)) or 1.0
+        results.append([v/norm for v in vec])
+    return results
+
+TEXTS = [
+    "The petitioner filed a Petition for Certiorari under Rule 65.",
+    "G.R. No. 100527, September 19, 2019 — People v. Santos",
+    "REPUBLIC ACT NO. 9262: anti-violence against women and their children act of 2004",
+    "snake_case and CamelCase tokens, e-mail@example.com; 1,000.50 pesos",
+    "Señor Niño's décision — Ünïcode, ñ and ß with CAFÉ and 第三条",
+    "repeat repeat repeat once",
+    "",
+    "   ...   ",
+    "x" * 80 + " short",
+    "same text twice",
+    "same text twice",
+]
+
+@pytest.fixture(scope="module")
+def server():
+    import server
+    return server
+
+@pytest.fixture
+def fresh_memo(server, monkeypatch):
+    monkeypatch.setattr(server, "_hash_memo", {})
+
+def test_hash_embed_matches_baseline_cold_and_warm(server, fresh_memo):
+    want = np.array(_baseline_hash_embed(TEXTS))
+    for _ in range(2):                      # first call fills the memo, second reads it
+        got = np.array(server._hash_embed(TEXTS))
+        assert np.abs(got - want).max() < 1e-12
+    assert len(server._hash_memo[256][0]) > 0
+
+def test_hash_embed_matches_baseline_per_text(server, fresh_memo):
+    server._hash_embed(TEXTS[:3])
+    for text in TEXTS:
+        assert np.abs(np.array(server._hash_embed([text])) - np.array(_baseline_hash_embed([text]))).max() < 1e-12
+
+def test_hash_embed_memo_ignores_other_dims(server, fresh_memo):
+    server._hash_embed(TEXTS, 256)
+    small = np.array(server._hash_embed(["contract of lease"], 7))
+    buckets = {int(hashlib.md5(w.encode()).hexdigest(), 16) % 7 for w in ("contract", "of", "lease")}
+    assert set(np.flatnonzero(small[0])) == buckets
+
+def test_hash_embed_bigram_features(server, fresh_memo, monkeypatch):
+    monkeypatch.setattr(server, "HASH_EMBED_BIGRAMS", True)
+    vec = np.array(server._hash_embed(["Alpha, beta", "gamma"]))
+    bucket = lambda w: int(hashlib.md5(w.encode()).hexdigest(), 16) % 256
+    assert set(np.flatnonzero(vec[0])) == {bucket("alpha"), bucket("beta"), bucket("alpha beta")}
+    assert set(np.flatnonzero(vec[1])) == {bucket("gamma")}     # no pair across texts
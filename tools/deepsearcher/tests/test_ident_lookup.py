@@ -0,0 +1,54 @@
+import sqlite3
+
+import pytest
+
+FILES = {
+    "Supreme Court/G.R. No. 120, March 1, 1999.html":   ("gr:120", "G.R. No. 120"),
+    "Supreme Court/G.R. No. 1234, May 2, 2001.html":   ("gr:1234", "G.R. No. 1234"),
+    "Laws/Republic Acts/Republic Act No. 9262.html":   ("ra:9262", "Republic Act No. 9262"),
+    "References/Civil Code.html":                      ("", ""),
+}
+
+@pytest.fixture
+def ident(sidecar):
+    conn = sidecar._state_db()
+    try:
+        sidecar._ident_schema(conn)
+        conn.executemany("INSERT INTO ident_files VALUES (?,?,?,?,?,?,?,?)",
+                         [(p, 0, 0, key, p.split("/")[-1][:-5], number, "", f"snippet of {p}")
+                          for p, (key, number) in FILES.items()])
+        conn.commit()
+    finally:
+        conn.close()
+    sidecar.load_ident_index()
+    return sidecar
+
+def test_keyed_lookup_is_exact(ident):
+    rows = ident.exact_lookup("RA 9262")
+    assert [(r["relativePath"], r["category"], r["score"]) for r in rows] == \
+        [("Laws/Republic Acts/Republic Act No. 9262.html", "exact_match", 100.0)]
+    assert rows[0]["relevantText"].startswith("snippet of Laws/")
+
+def test_key_prefix_hits_are_labelled_and_ranked_below_exact(ident):
+    rows = ident.exact_lookup("G.R. No. 12")
+    assert {r["relativePath"] for r in rows} == {p for p in FILES if p.startswith("Supreme Court/")}
+    assert all(r["category"] == "prefix_match" and r["score"] == ident.PREFIX_MATCH_SCORE < 100 for r in rows)
+    # Once the exact key exists, its siblings are no longer returned at all
+    assert [r["category"] for r in ident.exact_lookup("G.R. No. 120")] == ["exact_match"]
+
+def test_free_text_lookup_matches_file_names(ident):
+    rows = ident.exact_lookup("civil code")
+    assert [(r["relativePath"], r["category"]) for r in rows] == [("References/Civil Code.html", "exact_match")]
+
+def test_snippet_connections_are_closed(ident, monkeypatch):
+    opened = []
+    state_db = ident._state_db
+
+    def tracking():
+        opened.append(state_db())
+        return opened[-1]
+    monkeypatch.setattr(ident, "_state_db", tracking)
+    ident.exact_lookup("RA 9262")
+    assert len(opened) == 1
+    with pytest.raises(sqlite3.ProgrammingError):
+        opened[0].execute("SELECT 1")
@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+from conftest import write_html
+
+STATUSES = ["queued", "running", "pausing", "paused", "cancelling", "cancelled", "completed", "failed"]
+
+@pytest.fixture
+def jobs(store, tmp_path, monkeypatch):
+    """store with a small corpus; the runner thread is not started, tests run jobs by hand."""
+    for n in range(4):
+        write_html(tmp_path / "legal", f"Supreme Court/G.R. No. {n}, May 1, 2001.html", f"petitioner appeal case {n}")
+    monkeypatch.setattr(store, "_ensure_job_runner", lambda: None)
+    monkeypatch.setattr(store, "_job_control", {})
+    return store
+
+def set_status(server, job_id, status):
+    conn = server._state_db()
+    try:
+        with conn:
+            conn.execute("UPDATE index_jobs SET status = ? WHERE id = ?", (status, job_id))
+    finally:
+        conn.close()
+
+@pytest.mark.parametrize("action", ["pause", "resume", "cancel"])
+@pytest.mark.parametrize("status", STATUSES)
+def test_control_follows_the_transition_table(jobs, status, action):
+    job = jobs.create_index_job(None, None)
+    set_status(jobs, job["id"], status)
+    new = jobs._JOB_TRANSITIONS[action].get(status)
+    if new is None:
+        with pytest.raises(ValueError, match=f"cannot {action} a job that is {status}"):
+            jobs.control_index_job(job["id"], action)
+        assert jobs.get_index_job(job["id"])["status"] == status
+    else:
+        assert jobs.control_index_job(job["id"], action)["status"] == new
+    # Only a job the runner holds is signalled; the others change in the database alone
+    assert (job["id"] in jobs._job_control) == (new is not None and status in ("running", "pausing"))
+
+def test_control_of_an_unknown_job(jobs):
+    assert jobs.control_index_job("nope", "pause") is None
+
+def test_job_runs_to_completion(jobs):
+    job = jobs.create_index_job(None, None)
+    jobs._run_index_job(job["id"])
+    done = jobs.get_index_job(job["id"])
+    assert (done["status"], done["phase"], done["files_done"], done["files_total"]) == ("completed", "done", 4, 4)
+    assert done["chunks_indexed"] == jobs.get_collection().count() > 0
+    assert done["plan"]["new"] == 4
+
+def test_pause_before_the_claim_wins(jobs):
+    # The runner has selected the queued job but not claimed it yet when the pause lands
+    job = jobs.create_index_job(None, None)
+    jobs.control_index_job(job["id"], "pause")
+    jobs._run_index_job(job["id"])
+    assert jobs.get_index_job(job["id"])["status"] == "paused"
+    assert jobs.get_collection().count() == 0
+    jobs.control_index_job(job["id"], "resume")
+    jobs._run_index_job(job["id"])
+    assert jobs.get_index_job(job["id"])["status"] == "completed"
+
+def test_cancel_before_the_claim_wins(jobs):
+    job = jobs.create_index_job(None, None)
+    jobs.control_index_job(job["id"], "cancel")
+    jobs._run_index_job(job["id"])
+    assert jobs.get_index_job(job["id"])["status"] == "cancelled"
+    assert jobs.get_collection().count() == 0
+
+def test_a_job_is_claimed_once(jobs, monkeypatch):
+    runs = []
+    pipeline = jobs.run_index_pipeline
+
+    def counting(todo, **kw):
+        runs.append(len(todo))
+        return pipeline(todo, **kw)
+    monkeypatch.setattr(jobs, "run_index_pipeline", counting)
+    job = jobs.create_index_job(None, None)
+    threads = [threading.Thread(target=jobs._run_index_job, args=(job["id"],)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert runs == [4]
+    assert jobs.get_index_job(job["id"])["status"] == "completed"
+
+def test_paused_running_job_resumes_from_its_checkpoint(jobs, monkeypatch):
+    pipeline = jobs.run_index_pipeline
+    job = jobs.create_index_job(None, None)
+    runs = []
+
+    def pause_after_one_file(todo, progress=None, stop=None, **kw):
+        runs.append([t[1] for t in todo])
+        if len(runs) == 1:
+            done = pipeline(todo[:1], progress=progress, **kw)
+            assert jobs.control_index_job(job["id"], "pause")["status"] == "pausing"
+            return done
+        return pipeline(todo, progress=progress, stop=stop, **kw)
+    monkeypatch.setattr(jobs, "run_index_pipeline", pause_after_one_file)
+    jobs._run_index_job(job["id"])
+    paused = jobs.get_index_job(job["id"])
+    assert (paused["status"], paused["files_done"], paused["files_total"]) == ("paused", 1, 4)
+    assert job["id"] not in jobs._job_control
+    jobs.control_index_job(job["id"], "resume")
+    jobs._run_index_job(job["id"])
+    done = jobs.get_index_job(job["id"])
+    assert (done["status"], done["files_done"]) == ("completed", 4)
+    assert runs[1] == runs[0][1:]
+
+def test_interrupted_jobs_are_requeued_at_startup(jobs):
+    ids = {}
+    for status in ("running", "pausing", "cancelling", "paused"):
+        ids[status] = jobs.create_index_job(None, None)["id"]
+        set_status(jobs, ids[status], status)
+    assert jobs.resume_interrupted_jobs() == 1
+    assert {s: jobs.get_index_job(i)["status"] for s, i in ids.items()} == \
+        {"running": "queued", "pausing": "paused", "cancelling": "cancelled", "paused": "paused"}
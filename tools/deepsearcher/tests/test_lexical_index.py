@@ -0,0 +1,70 @@
+from lexical_index import LexicalIndex
+
+def _index(tmp_path, ids):
+    idx = LexicalIndex(str(tmp_path / "lex"))
+    idx.add(ids, [f"contract of lease {i}" for i in range(len(ids))], ["cases"] * len(ids), ["2001"] * len(ids))
+    idx.flush()
+    return idx
+
+def test_delete_ids_wider_than_segment_is_a_no_op(tmp_path):
+    idx = _index(tmp_path, [f"X_{i}" for i in range(10)])
+    # "X_10".."X_19" would truncate to "X_1" in the segment's S3 id column
+    assert idx.delete([f"X_{i}" for i in range(10, 20)]) == 0
+    assert idx.doc_count == 10
+    assert len(idx.search("lease", top_k=20)) == 10
+
+def test_delete_shared_prefix_ids_removes_each_once(tmp_path):
+    idx = _index(tmp_path, [f"X_{i}" for i in range(20)])
+    assert idx.delete(["X_1", "X_1", "X_10", "X_100"]) == 2
+    assert idx.doc_count == 18
+    hits = {cid for cid, _ in idx.search("lease", top_k=30)}
+    assert "X_1" not in hits and "X_10" not in hits and "X_11" in hits
+
+def test_delete_drops_buffered_chunks_without_flushing(tmp_path):
+    idx = _index(tmp_path, [f"X_{i}" for i in range(5)])
+    idx.add(["Y_0", "Y_1"], ["deed of sale", "deed of sale"], ["cases"] * 2, ["2001"] * 2)
+    assert idx.delete(["Y_0", "X_0"]) == 2
+    assert idx.stats()["segments"] == 1 and idx.stats()["buffered"] == 1
+    idx.flush()
+    assert [cid for cid, _ in idx.search("deed sale")] == ["Y_1"]
+    assert idx.doc_count == 5
+
+def test_search_scores_match_dense_bm25(tmp_path):
+    import math
+    from collections import Counter
+    texts = ["lease contract", "contract of sale contract", "lease of land lease lease", "land title"]
+    idx = LexicalIndex(str(tmp_path / "lex"))
+    idx.add(["a", "b", "c", "d"], texts, ["cases", "laws", "cases", "laws"], ["2001", "1999", "2010", ""])
+    idx.flush()
+    docs = [Counter(t.split()) - Counter({"of": 99}) for t in texts]
+    avgdl = sum(sum(d.values()) for d in docs) / len(docs)
+    def bm25(d, q):
+        s = 0.0
+        for t in q:
+            df = sum(t in x for x in docs)
+            idf = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+            tf = d[t]
+            s += idf * tf * (idx.k1 + 1) / (tf + idx.k1 * (1 - idx.b + idx.b * sum(d.values()) / avgdl))
+        return s
+    got = dict(idx.search("lease contract land", top_k=10))
+    want = {cid: bm25(d, ["lease", "contract", "land"]) for cid, d in zip("abcd", docs)}
+    assert got.keys() == want.keys()
+    assert all(abs(got[c] - want[c]) < 1e-4 for c in got)
+    assert {c for c, _ in idx.search("lease contract land", categories=["laws"])} == {"b", "d"}
+    assert {c for c, _ in idx.search("lease contract land", year_range=(2000, 2020))} == {"a", "c"}
+
+def test_merge_policy_expunges_deletes_and_caps_segments(tmp_path):
+    idx = LexicalIndex(str(tmp_path / "lex"), flush_docs=4, max_segments=3)
+    for n in range(6):
+        ids = [f"S{n}_{i}" for i in range(n + 1)]
+        idx.add(ids, ["writ of amparo"] * len(ids), ["cases"] * len(ids), ["2001"] * len(ids))
+        idx.flush()
+    assert idx.stats()["segments"] <= 3
+    assert idx.doc_count == 21
+    idx.delete([f"S5_{i}" for i in range(5)])
+    idx.add(["T"], ["writ of kalikasan"], ["cases"], ["2001"])
+    idx.flush()
+    assert all(s.size == s.live for s in idx._segments)
+    assert idx.doc_count == 17 and len(idx.search("writ", top_k=50)) == 17
+    reopened = LexicalIndex(str(tmp_path / "lex"))
+    assert reopened.doc_count == 17 and abs(reopened.avgdl - idx.avgdl) < 1e-9
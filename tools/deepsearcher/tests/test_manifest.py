@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from conftest import write_html
+
+WORDS = "petitioner respondent dismissal appeal employer contract damages property"
+
+def counts(plan):
+    return {k: (len(v) if isinstance(v, list) else v) for k, v in plan.items()}
+
+def manifest(server):
+    conn = server._state_db()
+    try:
+        return {r[0]: r[1:] for r in conn.execute("SELECT rel_path, mtime_ns, size, sha256, chunk_count FROM manifest")}
+    finally:
+        conn.close()
+
+def stored_paths(server):
+    return sorted({m["relative_path"] for m in server.get_collection().get(include=["metadatas"])["metadatas"]})
+
+@pytest.fixture
+def corpus(store, tmp_path):
+    root = tmp_path / "legal"
+    jobs = [write_html(root, f"Supreme Court/G.R. No. {n}, May 1, 2001.html", f"{WORDS} case {n}") for n in (101, 102, 103)]
+    return store, root, jobs
+
+def test_sync_indexes_new_files_once(corpus):
+    server, _, jobs = corpus
+    assert counts(server.plan_index(jobs)) == {"new": 3, "changed": 0, "touched": 0, "unchanged": 0, "deleted": 0}
+    summary = server.sync_index(jobs)
+    assert summary["chunks_indexed"] == server.get_collection().count() > 0
+    rows = manifest(server)
+    assert sorted(rows) == [job[1] for job in jobs]
+    assert sum(r[3] for r in rows.values()) == server.get_collection().count()
+    assert counts(server.plan_index(jobs))["unchanged"] == 3
+    assert server.sync_index(jobs)["chunks_indexed"] == 0
+
+def test_touched_file_updates_manifest_without_reindexing(corpus):
+    server, _, jobs = corpus
+    server.sync_index(jobs)
+    st = os.stat(jobs[0][0])
+    os.utime(jobs[0][0], ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    plan = server.plan_index(jobs)
+    assert counts(plan)["touched"] == 1 and counts(plan)["unchanged"] == 2
+    summary, todo = server.apply_plan_removals(plan)
+    assert todo == [] and summary["chunks_removed"] == 0
+    assert manifest(server)[jobs[0][1]][0] == st.st_mtime_ns + 10**9
+    assert counts(server.plan_index(jobs))["unchanged"] == 3
+
+def test_changed_file_replaces_its_chunks(corpus):
+    server, root, jobs = corpus
+    server.sync_index(jobs)
+    before = server.get_collection().count()
+    write_html(root, jobs[1][1], f"{WORDS} case 102 amended with a longer holding on backwages")
+    plan = server.plan_index(jobs)
+    assert counts(plan)["changed"] == 1
+    summary = server.sync_index(jobs)
+    assert summary["changed"] == 1 and summary["chunks_removed"] == manifest(server)[jobs[1][1]][3]
+    assert server.get_collection().count() == before
+    hits = server.get_lexical_index().search("backwages", 5)
+    assert [h[0].rsplit("_", 1)[0] for h in hits] == [server.doc_id_for(jobs[1][1])]
+
+def test_index_signature_change_forces_reindex(corpus, monkeypatch):
+    server, _, jobs = corpus
+    server.sync_index(jobs)
+    monkeypatch.setattr(server, "VECTOR_STORE", "compact")
+    assert counts(server.plan_index(jobs))["changed"] == 3
+
+def test_deleted_files_are_removed(corpus):
+    server, _, jobs = corpus
+    server.sync_index(jobs)
+    os.remove(jobs[0][0])
+    plan = server.plan_index(jobs)
+    assert [rel for rel, _, _ in plan["deleted"]] == [jobs[0][1]]
+    summary, todo = server.apply_plan_removals(plan)
+    assert todo == [] and summary["chunks_removed"] > 0
+    assert stored_paths(server) == [job[1] for job in jobs[1:]]
+    assert jobs[0][1] not in manifest(server)
+    assert not server.get_lexical_index().search("101", 5)
+
+def test_prune_only_deletes_documents_outside_the_jobs(corpus):
+    server, _, jobs = corpus
+    server.sync_index(jobs)
+    assert counts(server.plan_index(jobs[1:]))["deleted"] == 0
+    plan = server.plan_index(jobs[1:], prune=True)
+    assert [rel for rel, _, _ in plan["deleted"]] == [jobs[0][1]]
+    server.apply_plan_removals(plan)
+    assert stored_paths(server) == [job[1] for job in jobs[1:]]
+
+def test_limit_only_removes_chunks_of_files_it_reindexes(corpus):
+    server, root, jobs = corpus
+    server.sync_index(jobs)
+    for job in jobs[:2]:
+        write_html(root, job[1], f"{WORDS} rewritten {job[1]}")
+    summary, todo = server.apply_plan_removals(server.plan_index(jobs), limit=1)
+    assert [job[1] for job in todo] == [jobs[0][1]]
+    assert stored_paths(server) == [job[1] for job in jobs[1:]]
+    # The file past the limit keeps its old chunks and is still pending
+    assert counts(server.plan_index(jobs))["changed"] == 1
+
+def test_bootstrap_seeds_every_stored_document(corpus):
+    server, _, jobs = corpus
+    server.sync_index(jobs)
+    seeded = manifest(server)
+    conn = server._state_db()
+    try:
+        with conn:
+            conn.execute("DELETE FROM manifest")
+    finally:
+        conn.close()
+    # A request for one explicit path must not leave the rest of the corpus looking new
+    plan = server.plan_index(jobs[:1])
+    assert counts(plan) == {"new": 0, "changed": 0, "touched": 0, "unchanged": 1, "deleted": 0}
+    assert manifest(server) == seeded
+    assert counts(server.plan_index(jobs))["unchanged"] == 3
+
+def test_bootstrap_skips_an_empty_collection(store):
+    conn = store._state_db()
+    try:
+        store._manifest_schema(conn)
+        assert store._bootstrap_manifest(conn, []) == 0
+    finally:
+        conn.close()
+    assert store.manifest_stats()["documents"] == 0
@@ -0,0 +1,153 @@
+import numpy as np
+import pytest
+
+from conftest import write_html
+from partitions import Partition
+
+def brute_force(vecs, docs, q, top_docs, mask=None):
+    """Best chunk of each of the top_docs best documents, by cosine, best first."""
+    vecs = vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+    scores = vecs @ (q / np.linalg.norm(q))
+    best = {}
+    for i in np.argsort(-scores, kind="stable"):
+        if (mask is None or mask[i]) and docs[i] not in best:
+            best[docs[i]] = (i, scores[i])
+    return [(int(i), float(s)) for i, s in list(best.values())[:top_docs]]
+
+@pytest.fixture
+def rows():
+    rng = np.random.default_rng(7)
+    n = 400
+    docs = [f"doc{i % 60}" for i in range(n)]
+    years = [str(1990 + i % 30) if i % 11 else "" for i in range(n)]
+    subcats = ["decisions" if i % 3 else "resolutions" for i in range(n)]
+    return rng.standard_normal((n, 16)).astype(np.float32), docs, years, subcats
+
+def test_search_ranks_documents_by_their_best_chunk(rows):
+    vecs, docs, years, subcats = rows
+    part = Partition([f"c{i}" for i in range(len(docs))], vecs, docs, years, subcats)
+    queries = np.random.default_rng(1).standard_normal((5, 16))
+    for q, hits in zip(queries, part.search(queries, 10)):
+        want = brute_force(vecs, docs, q, 10)
+        assert [cid for cid, _ in hits] == [f"c{i}" for i, _ in want]
+        np.testing.assert_allclose([s for _, s in hits], [s for _, s in want], rtol=1e-5)
+
+def test_filters_narrow_the_scan(rows):
+    vecs, docs, years, subcats = rows
+    part = Partition([f"c{i}" for i in range(len(docs))], vecs, docs, years, subcats)
+    q = np.random.default_rng(2).standard_normal(16)
+    mask = np.array([s == "resolutions" and y.isdigit() and 2000 <= int(y) <= 2005 for s, y in zip(subcats, years)])
+    hits = part.search([q], 5, subcategories=["resolutions"], year_range=(2000, 2005))[0]
+    assert [cid for cid, _ in hits] == [f"c{i}" for i, _ in brute_force(vecs, docs, q, 5, mask)]
+    assert part.search([q], 5, subcategories=["no_such"])[0] == []
+    # Chunks without a year never pass a year filter
+    hits = part.search([q], 100, year_range=(1900, 2099))[0]
+    assert hits and all(years[int(cid[1:])] for cid, _ in hits)
+
+def test_one_long_document_does_not_crowd_out_the_others():
+    # 100 chunks of one document score above everything else; the top-3 still holds three documents
+    q = np.ones(4, dtype=np.float32)
+    vecs = np.vstack([np.tile(q, (100, 1)), np.eye(4, dtype=np.float32)[:3] + 0.1])
+    docs = ["long"] * 100 + ["a", "b", "c"]
+    part = Partition([f"c{i}" for i in range(103)], vecs, docs, [""] * 103, [""] * 103)
+    hits = part.search([q], 3)[0]
+    assert [cid for cid, _ in hits] == ["c0", "c100", "c101"]
+
+def test_per_doc_adds_the_next_best_chunks_of_the_top_documents(rows):
+    vecs, docs, years, subcats = rows
+    part = Partition([f"c{i}" for i in range(len(docs))], vecs, docs, years, subcats)
+    q = np.random.default_rng(3).standard_normal(16)
+    single = part.search([q], 4)[0]
+    double = part.search([q], 4, per_doc=2)[0]
+    top = {docs[int(cid[1:])] for cid, _ in single}
+    assert {docs[int(cid[1:])] for cid, _ in double} == top
+    assert [s for _, s in double] == sorted((s for _, s in double), reverse=True)
+    assert set(single) <= set(double)
+    # Every top document has several chunks, so each brings its second best, however far down it ranks
+    cos = (vecs / np.linalg.norm(vecs, axis=1, keepdims=True)) @ (q / np.linalg.norm(q))
+    own = {d: sorted((i for i in range(len(docs)) if docs[i] == d), key=lambda i: -cos[i])[:2] for d in top}
+    want = sorted((i for rows in own.values() for i in rows), key=lambda i: -cos[i])
+    assert [cid for cid, _ in double] == [f"c{i}" for i in want]
+
+def test_zero_vectors_and_empty_partitions():
+    part = Partition(["a", "b"], [[0, 0], [1, 0]], ["d1", "d2"], ["2001", "2002"], ["x", "x"])
+    assert part.search([[1, 0]], 2)[0] == [("b", 1.0), ("a", 0.0)]
+    assert part.search([[0, 0]], 1)[0][0][1] == 0.0
+    empty = Partition([], np.zeros((0, 2)), [], [], [])
+    assert len(empty) == 0 and empty.search([[1, 0]], 3) == [[]]
+
+# ─── SearchFilter ──────────────────────────────────────────────────────────────
+def test_make_filter_normalizes(sidecar):
+    flt = sidecar.make_filter(["laws", "supreme_court", "laws"], ["decisions"], 2001)
+    assert flt == sidecar.SearchFilter(("laws", "supreme_court"), ("decisions",), 2001, None)
+    assert sidecar.make_filter() is None and sidecar.make_filter([], []) is None
+    assert sidecar.make_filter(["laws"]) == sidecar._as_filter("laws")
+    with pytest.raises(ValueError, match="year_from 2005 is after year_to 2001"):
+        sidecar.make_filter(year_from=2005, year_to=2001)
+
+def test_filter_where_clause_and_split(sidecar):
+    flt = sidecar.make_filter(["laws", "supreme_court"], year_from=1850, year_to=1901)
+    assert flt.year_range == (1900, 1901)
+    assert flt.where() == {"$and": [{"category": {"$in": ["laws", "supreme_court"]}},
+                                    {"year": {"$in": ["1900", "1901"]}}]}
+    assert flt.split() == [flt._replace(categories=("laws",)), flt._replace(categories=("supreme_court",))]
+    assert flt.tags() == ("laws", "supreme_court")
+    only_sub = sidecar.make_filter(subcategories=["decisions"])
+    assert only_sub.where() == {"subcategory": {"$in": ["decisions"]}}
+    assert only_sub.split() == [only_sub] and only_sub.tags() == ("*",)
+    assert sidecar.SearchFilter().where() is None
+
+# ─── Filtered dense search on ChromaDB ─────────────────────────────────────────
+VOCABULARY = ("petitioner respondent appeal dismissal contract damages property employer employee "
+              "marriage violence women children protection republic order court law decision").split()
+
+@pytest.fixture
+def filtered(store, tmp_path):
+    root = tmp_path / "legal"
+    rng = np.random.default_rng(18)
+    jobs = []
+    for n in range(12):
+        category, folder = ("supreme_court", "Supreme Court") if n % 2 else ("laws", "Laws")
+        abs_path, rel, _, _ = write_html(root, f"{folder}/G.R. No. {n}, May 1, {2000 + n % 4}.html",
+                                         " ".join(rng.choice(VOCABULARY, 12)))
+        jobs.append((abs_path, rel, category, "decisions" if n % 3 else "resolutions"))
+    store.sync_index(jobs)
+    return store
+
+def expected_paths(server, flt, query, top_k):
+    got = server.get_collection().get(where=flt.where(), include=["embeddings", "metadatas"])
+    vecs, paths = np.asarray(got["embeddings"]), [m["relative_path"] for m in got["metadatas"]]
+    return [paths[i] for i, _ in brute_force(vecs, paths, np.asarray(server.query_embedding(query)), top_k)]
+
+@pytest.mark.parametrize("flt_args", [
+    dict(categories=["laws"]),
+    dict(categories=["laws", "supreme_court"], year_from=2001, year_to=2002),
+    dict(categories=["supreme_court"], subcategories=["resolutions"]),
+    dict(year_from=2003),
+])
+def test_filtered_search_is_exact(filtered, flt_args):
+    flt = filtered.make_filter(**flt_args)
+    rows = filtered.vector_search("dismissal contract damages", 4, flt)
+    assert [r["relativePath"] for r in rows] == expected_paths(filtered, flt, "dismissal contract damages", 4)
+
+def test_filter_matching_nothing(filtered):
+    assert filtered.vector_search("appeal", 3, filtered.make_filter(["laws"], year_from=1950, year_to=1960)) == []
+    assert filtered.vector_search("appeal", 3, filtered.make_filter(["no_such_category"])) == []
+
+def test_large_filters_fall_back_to_the_collection(filtered, monkeypatch):
+    monkeypatch.setattr(filtered, "PARTITION_MAX_ROWS", 0)
+    flt = filtered.make_filter(["laws"], year_from=2000, year_to=2001)
+    rows = filtered.vector_search("petitioner appeal", 3, flt)
+    assert rows and all(r["category"] == "laws" and r["date"] in ("2000", "2001") for r in rows)
+    assert isinstance(filtered._partition_cache.get(filtered.make_filter(["laws"])), int)
+
+def test_partitions_are_cached_and_dropped_when_their_category_changes(filtered, tmp_path):
+    laws, court = filtered.make_filter(["laws"]), filtered.make_filter(["supreme_court"])
+    filtered.vector_search("appeal", 3, laws)
+    filtered.vector_search("appeal", 3, court)
+    part = filtered._partition_cache.get(laws)
+    assert isinstance(part, Partition)
+    assert sorted(part.ids) == sorted(filtered.get_collection().get(where=laws.where(), include=[])["ids"])
+    filtered.sync_index([write_html(tmp_path / "legal", "Supreme Court/G.R. No. 99, May 1, 2003.html", "new appeal")])
+    assert filtered._partition_cache.get(laws) is part
+    assert filtered._partition_cache.get(court) is None
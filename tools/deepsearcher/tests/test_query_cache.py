@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from conftest import write_html
+
+@pytest.fixture
+def clock(sidecar, monkeypatch):
+    """A settable time.monotonic for TTL expiry."""
+    now = [1000.0]
+    monkeypatch.setattr(sidecar.time, "monotonic", lambda: now[0])
+    return now
+
+def test_least_recently_used_entry_goes_first(sidecar):
+    cache = sidecar.TTLCache("t", 2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1          # "b" is now the oldest
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+    stats = cache.stats()
+    assert (stats["entries"], stats["evictions"], stats["hits"], stats["misses"]) == (2, 1, 3, 1)
+    assert stats["hit_ratio"] == 0.75
+
+def test_entries_expire_after_the_ttl(sidecar, clock):
+    cache = sidecar.TTLCache("t", 10, 60)
+    cache.set("a", [1, 2])
+    clock[0] += 59
+    assert cache.get("a") == [1, 2]
+    clock[0] += 2
+    assert cache.get("a", "gone") == "gone"
+    assert cache.stats()["entries"] == 0 and cache.stats()["approx_bytes"] == 0
+    # Overwriting restarts the clock
+    cache.set("a", 1)
+    clock[0] += 50
+    cache.set("a", 2)
+    clock[0] += 50
+    assert cache.get("a") == 2
+
+def test_max_bytes_bounds_the_cache(sidecar):
+    cache = sidecar.TTLCache("t", 100, 60, max_bytes=3000)
+    for key in "abc":
+        cache.set(key, np.zeros(100, dtype=np.float64))   # 800 bytes each
+    assert cache.stats()["approx_bytes"] == 2400
+    cache.get("a")
+    cache.set("d", np.zeros(100, dtype=np.float64))
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert cache.stats()["approx_bytes"] == 2400 and cache.stats()["evictions"] == 1
+    # A value larger than the whole budget is handed back but not kept
+    cache.set("huge", np.zeros(1000, dtype=np.float64))
+    assert cache.get("huge") is None and cache.stats()["approx_bytes"] <= 3000
+    cache.clear()
+    assert cache.stats()["entries"] == 0 and cache.stats()["approx_bytes"] == 0
+
+def test_invalidate_drops_only_matching_tags(sidecar):
+    cache = sidecar.TTLCache("t", 10, 60)
+    cache.set("laws", 1, tags=("laws",))
+    cache.set("both", 2, tags=("laws", "treaties"))
+    cache.set("court", 3, tags=("supreme_court",))
+    cache.set("all", 4)
+    assert cache.invalidate({"treaties"}) == 1
+    assert cache.invalidate({"laws", "*"}) == 2
+    assert [k for k in ("laws", "both", "court", "all") if cache.get(k) is not None] == ["court"]
+
+def test_approx_size(sidecar):
+    assert sidecar._approx_size(np.zeros(10, dtype=np.float32)) == 40
+    small, large = sidecar._approx_size({"a": "x"}), sidecar._approx_size({"a": "x" * 1000})
+    assert large - small == 999
+    assert sidecar._approx_size([[1.0] * 10] * 3) > 3 * sidecar._approx_size([1.0] * 10)
+
+# ─── The query caches in use ───────────────────────────────────────────────────
+@pytest.fixture
+def corpus(store, tmp_path):
+    store._qemb_cache.clear()
+    jobs = [write_html(tmp_path / "legal", f"Supreme Court/G.R. No. {n}, May 1, 2001.html",
+                       f"petitioner appeal dismissal case {n}") for n in range(3)]
+    store.sync_index(jobs)
+    return store, tmp_path / "legal"
+
+def test_repeat_searches_are_served_from_the_cache(corpus, monkeypatch):
+    server, _ = corpus
+    first = server.vector_search("appeal dismissal", 2)
+    monkeypatch.setattr(server, "_vector_search_embs", lambda *a: pytest.fail("searched again"))
+    second = server.vector_search("appeal dismissal", 2)
+    assert second == first
+    # Callers get their own copies: a caller rescoring rows does not change the cached ones
+    second[0]["score"] = -1
+    assert server.vector_search("appeal dismissal", 2)[0]["score"] == first[0]["score"]
+    assert server._qemb_cache.get("appeal dismissal") is not None
+
+def test_indexing_invalidates_results_for_its_category(corpus):
+    server, root = corpus
+    laws = server.make_filter(["laws"])
+    server.vector_search("appeal", 5)
+    server.vector_search("appeal", 5, laws)
+    assert len(server.vector_search("appeal", 5)) == 3
+    server.sync_index([write_html(root, "Supreme Court/G.R. No. 9, May 1, 2001.html", "appeal")])
+    assert server._search_cache.get(("appeal", 5, laws, "dense")) is not None
+    assert server._search_cache.get(("appeal", 5, None, "dense")) is None
+    assert len(server.vector_search("appeal", 5)) == 4
@@ -0,0 +1,78 @@
+import time
+from types import SimpleNamespace
+
+import rerank
+from rerank import CrossEncoderReranker, KeywordReranker, build_reranker
+
+class _FakeModel:
+    """Stands in for BGERerankFunction: scores a passage by how many times it says 'lease'."""
+    def __init__(self, delay=0.0):
+        self.calls, self.delay = [], delay
+
+    def __call__(self, query, passages, top_k):
+        self.calls.append(list(passages))
+        time.sleep(self.delay)
+        scored = [SimpleNamespace(index=i, score=p.count("lease") / 10) for i, p in enumerate(passages)]
+        return sorted(scored, key=lambda r: -r.score)[:top_k]
+
+class _Cache(dict):
+    def get(self, key, default=None):
+        return super().get(key, default)
+
+    def set(self, key, value, tags=("*",)):
+        self[key] = value
+
+def _reranker(model):
+    reranker = CrossEncoderReranker.__new__(CrossEncoderReranker)
+    reranker.name, reranker._fn = "fake-ce", model
+    return reranker
+
+def _rows():
+    # First-stage order a, b, c, d; the model prefers d, then b
+    texts = {"a": "sale", "b": "lease lease", "c": "deed", "d": "lease lease lease"}
+    return [{"relativePath": k, "title": k.upper(), "relevantText": t, "score": s}
+            for (k, t), s in zip(texts.items(), (0.9, 0.8, 0.7, 0.6))]
+
+def test_cross_encoder_orders_by_model_score():
+    model = _FakeModel()
+    res = rerank.rerank(_reranker(model), "lease", _rows(), batch_size=2)
+    assert [r["relativePath"] for r in res["rows"]] == ["d", "b", "a", "c"]
+    assert [r["score"] for r in res["rows"]][:2] == [30.0, 20.0]
+    assert res["scored"] == 4 and not res["exhausted"]
+    assert model.calls[0] == ["A\nsale", "B\nlease lease"]     # best first-stage candidates first
+
+def test_model_scores_are_cached_per_query_and_passage():
+    model, cache = _FakeModel(), _Cache()
+    reranker = _reranker(model)
+    rerank.rerank(reranker, "lease", _rows(), batch_size=4, cache=cache)
+    res = rerank.rerank(reranker, "lease", _rows(), batch_size=4, cache=cache)
+    assert len(model.calls) == 1 and res["cached"] == 4
+    assert [r["relativePath"] for r in res["rows"]] == ["d", "b", "a", "c"]
+    rows = _rows()
+    rows[0]["relevantText"] = "lease lease lease lease"          # changed passage: scored again
+    res = rerank.rerank(reranker, "lease", rows, batch_size=4, cache=cache)
+    assert res["cached"] == 3 and model.calls[-1] == ["A\nlease lease lease lease"]
+    assert res["rows"][0]["relativePath"] == "a"
+    rerank.rerank(reranker, "deed", _rows(), batch_size=4, cache=cache)
+    assert len(model.calls) == 3                                 # other query: not cached
+
+def test_budget_leaves_unreached_rows_in_first_stage_order():
+    model = _FakeModel(delay=0.05)
+    res = rerank.rerank(_reranker(model), "lease", _rows(), budget_s=0.06, batch_size=1)
+    assert res["exhausted"] and res["scored"] < 4 and len(model.calls) == res["scored"]
+    unscored = [r["relativePath"] for r in res["rows"][res["scored"]:]]
+    assert unscored == sorted(unscored)                          # a, b, c, d: first-stage order
+    assert all(r["score"] < 1 for r in res["rows"][res["scored"]:])
+
+def test_keyword_reranker_is_never_cached():
+    cache = _Cache()
+    res = rerank.rerank(KeywordReranker(), "lease", _rows(), cache=cache)
+    assert not cache and res["cached"] == 0
+    assert res["rows"][0]["relativePath"] == "b"                 # 0.8 + 1 beats d's 0.6 + 1
+
+def test_unavailable_cross_encoder_falls_back_to_keyword(monkeypatch):
+    def missing(*args, **kwargs):
+        raise ImportError("No module named 'pymilvus'")
+    monkeypatch.setattr(CrossEncoderReranker, "__init__", missing)
+    assert isinstance(build_reranker("cross-encoder"), KeywordReranker)
+    assert isinstance(build_reranker("bogus"), KeywordReranker)
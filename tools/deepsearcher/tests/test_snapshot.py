@@ -0,0 +1,167 @@
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+SIDECAR_DIR = Path(__file__).resolve().parent.parent
+
+@pytest.fixture(scope="module")
+def server():
+    import server
+    return server
+
+@pytest.fixture
+def held_data_dir(tmp_path, server, monkeypatch):
+    """A data directory whose lock is held by another (sidecar-like) process."""
+    code = "import server, sys; assert server.lock_data_dir(); print('locked', flush=True); sys.stdin.read()"
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=SIDECAR_DIR, text=True,
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                            env={**os.environ, "DEEPSEARCHER_DATA_DIR": str(tmp_path)})
+    try:
+        assert proc.stdout.readline().strip() == "locked"
+        monkeypatch.setattr(server, "DATA_DIR", tmp_path)
+        monkeypatch.setattr(server, "_data_dir_lock", None)
+        yield tmp_path, proc.pid
+    finally:
+        proc.stdin.close()
+        proc.wait(timeout=30)
+
+def test_second_server_on_a_data_dir_is_refused(server, held_data_dir):
+    _, pid = held_data_dir
+    async def start():
+        async with server.lifespan(server.app):
+            pass
+    with pytest.raises(RuntimeError, match=rf"served by pid {pid}\. The sidecar is single-process"):
+        asyncio.run(start())
+
+def test_snapshot_cli_refuses_a_live_data_dir(held_data_dir):
+    data_dir, pid = held_data_dir
+    proc = subprocess.run([sys.executable, "snapshot.py", "export", str(data_dir / "snap")], cwd=SIDECAR_DIR,
+                          capture_output=True, text=True, env={**os.environ, "DEEPSEARCHER_DATA_DIR": str(data_dir)})
+    assert proc.returncode == 1
+    assert f"a sidecar (pid {pid}) is using" in proc.stderr
+    assert not (data_dir / "snap").exists()
+
+@pytest.fixture
+def indexed(store, tmp_path):
+    from conftest import write_html
+    jobs = [write_html(tmp_path / "legal", f"Supreme Court/G.R. No. {n}, May 1, 2001.html",
+                       f"petitioner appeal dismissal case {n} citing G.R. No. {n + 1}") for n in (201, 202, 203)]
+    store.sync_index(jobs)
+    return store, jobs
+
+def contents(server):
+    got = server.get_collection().get(include=["embeddings", "documents", "metadatas"])
+    order = sorted(range(len(got["ids"])), key=got["ids"].__getitem__)
+    return ([got["ids"][i] for i in order], np.asarray(got["embeddings"])[order],
+            [got["documents"][i] for i in order], [got["metadatas"][i] for i in order])
+
+def manifest(server):
+    conn = server._state_db()
+    try:
+        return conn.execute("SELECT rel_path, mtime_ns, size, sha256, chunk_count, embed_model FROM manifest "
+                            "ORDER BY rel_path").fetchall()
+    finally:
+        conn.close()
+
+def move_data_dir(server, monkeypatch, data_dir):
+    """Point the sidecar at another, empty data directory (a replica)."""
+    for name, sub in (("CHROMA_DB_PATH", "chroma_db"), ("LEXICAL_INDEX_DIR", "lexical_index"),
+                      ("COMPACT_STORE_DIR", "compact_store"), ("EMBED_CACHE_DIR", "embed_cache"),
+                      ("STATE_DB_PATH", "deepsearcher_state.db")):
+        monkeypatch.setattr(server, name, str(data_dir / sub))
+    for name in ("_chroma_client", "_collection", "_lexical", "_compact_store", "_embed_cache", "_citation_counts"):
+        monkeypatch.setattr(server, name, None)
+
+@pytest.mark.parametrize("dtype, tol", [("float32", 0), ("float16", 1e-3)])
+def test_round_trip_into_a_fresh_data_dir(indexed, tmp_path, monkeypatch, dtype, tol):
+    server, jobs = indexed
+    ids, vecs, docs, metas = contents(server)
+    rows = manifest(server)
+    info = server.export_snapshot(str(tmp_path / "snap"), shard_rows=2, dtype=dtype)
+    assert (info["rows"], info["documents"], info["dtype"]) == (len(ids), 3, dtype)
+    assert len(info["shards"]) == (len(ids) + 1) // 2
+    assert not (tmp_path / "snap.partial").exists()
+
+    move_data_dir(server, monkeypatch, tmp_path / "replica")
+    assert server.get_collection().count() == 0
+    server.import_snapshot(str(tmp_path / "snap"))
+    got_ids, got_vecs, got_docs, got_metas = contents(server)
+    assert (got_ids, got_docs, got_metas) == (ids, docs, metas)
+    np.testing.assert_allclose(got_vecs, vecs, atol=tol)
+    assert manifest(server) == rows
+    assert server.get_lexical_index().search("dismissal", 10)
+    assert server.citation_counts()
+    # The replica's next sync only touches files that changed
+    assert server.summarize_plan(server.plan_index(jobs))["unchanged"] == 3
+
+def test_import_refuses_a_live_collection_unless_replacing(indexed, tmp_path):
+    from snapshot import SnapshotError
+    server, jobs = indexed
+    ids, _, docs, _ = contents(server)
+    server.export_snapshot(str(tmp_path / "snap"))
+    with pytest.raises(SnapshotError, match="is not empty"):
+        server.import_snapshot(str(tmp_path / "snap"))
+    server.remove_documents([(jobs[0][1], 1, "supreme_court")])
+    server.import_snapshot(str(tmp_path / "snap"), replace=True)
+    assert contents(server)[0] == ids and contents(server)[2] == docs
+
+def test_corrupt_snapshot_is_rejected_before_anything_is_written(indexed, tmp_path):
+    from snapshot import SnapshotError, verify
+    server, _ = indexed
+    before = contents(server)[0]
+    snap = tmp_path / "snap"
+    server.export_snapshot(str(snap))
+    shard = snap / "rows-00000.jsonl.gz"
+    data = bytearray(shard.read_bytes())
+    data[-5] ^= 0xFF
+    shard.write_bytes(bytes(data))
+    with pytest.raises(SnapshotError, match="rows-00000.jsonl.gz does not match its checksum"):
+        verify(str(snap))
+    with pytest.raises(SnapshotError, match="does not match its checksum"):
+        server.import_snapshot(str(snap), replace=True)
+    shard.unlink()
+    with pytest.raises(SnapshotError, match="rows-00000.jsonl.gz is missing"):
+        server.import_snapshot(str(snap), replace=True)
+    assert contents(server)[0] == before
+
+def test_snapshot_of_another_model_is_rejected(indexed, tmp_path):
+    import json
+    from snapshot import SnapshotError
+    server, _ = indexed
+    snap = tmp_path / "snap"
+    server.export_snapshot(str(snap))
+    info = json.loads((snap / "snapshot.json").read_text())
+    (snap / "snapshot.json").write_text(json.dumps({**info, "embed_model": "BAAI/bge-m3", "embed_dim": 1024}))
+    with pytest.raises(SnapshotError, match="snapshot vectors are BAAI/bge-m3"):
+        server.import_snapshot(str(snap), replace=True)
+
+def test_failed_import_leaves_the_live_collection(indexed, tmp_path, monkeypatch):
+    import snapshot
+    server, _ = indexed
+    before, rows = contents(server)[0], manifest(server)
+    server.export_snapshot(str(tmp_path / "snap"), shard_rows=1)
+    shards = snapshot.iter_shards
+
+    def dies_after_one_shard(path):
+        for shard in shards(path):
+            yield shard
+            raise snapshot.SnapshotError("disk died")
+    monkeypatch.setattr(snapshot, "iter_shards", dies_after_one_shard)
+    with pytest.raises(snapshot.SnapshotError, match="disk died"):
+        server.import_snapshot(str(tmp_path / "snap"), replace=True)
+    assert contents(server)[0] == before and manifest(server) == rows
+    assert [c.name for c in server._chroma_client.list_collections()] == [server.COLLECTION]
+    assert not Path(server.LEXICAL_INDEX_DIR + ".staging").exists()
+
+def test_export_never_overwrites(indexed, tmp_path):
+    from snapshot import SnapshotError
+    server, _ = indexed
+    (tmp_path / "snap").mkdir()
+    with pytest.raises(SnapshotError, match="already exists"):
+        server.export_snapshot(str(tmp_path / "snap"))
+    assert not (tmp_path / "snap.partial").exists()